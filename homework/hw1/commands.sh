@@ -1,3 +1,7 @@
+# The image also needs the helper modules shared with pipeline/scripts_ingest
+# (same as: docker compose --profile ingest build)
+docker build --build-context pipeline_scripts=../../pipeline/scripts_ingest -t taxi_ingest:v002 .
+
 docker run --rm --network=homework_default taxi_ingest:v002 \
   scripts_ingest/ingest_green_parquet.py \
   --user root --password root --host pgdatabase --port 5432 --db ny_taxi \
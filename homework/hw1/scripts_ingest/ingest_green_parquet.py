@@ -1,14 +1,40 @@
 import argparse
+import io
 import math
 import os
 import re
 import sys
 import time
+from pathlib import Path
 from typing import Optional
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from sqlalchemy import create_engine, text
 
+# Helper modules shared with the pipeline ingest live in pipeline/scripts_ingest.
+# The Docker image copies them next to this script (see Dockerfile); in a
+# checkout they are imported from the pipeline directly.
+PIPELINE_SCRIPTS = (Path(__file__).resolve().parent / "../../../pipeline/scripts_ingest").resolve()
+if PIPELINE_SCRIPTS.is_dir():
+    sys.path.append(str(PIPELINE_SCRIPTS))
+
+try:
+    from chunk_sizing import AdaptiveChunkSizer, chunk_nbytes, parse_size, rebatch  # noqa: E402
+    from fast_load import (  # noqa: E402
+        build_indexes, drop_staging, finish_fast_load, set_unlogged, staging_table_name, table_exists
+    )
+    from ingest_metrics import IngestMetrics, payload_size  # noqa: E402
+    from row_filters import RowFilter, parse_columns  # noqa: E402
+except ModuleNotFoundError as e:
+    if e.name not in ("chunk_sizing", "fast_load", "ingest_metrics", "row_filters"):
+        raise
+    raise SystemExit(
+        f"{e.name}.py comes from pipeline/scripts_ingest: run this script from a checkout of the whole "
+        "repository, or build the image with the pipeline_scripts build context (see README.md)"
+    ) from None
+
 
 def safe_table_name(name: str) -> str:
     # allow letters, digits, underscore only
@@ -36,9 +62,13 @@ def wait_for_postgres(engine, timeout_s: int = 60) -> None:
     raise RuntimeError(f"Postgres not reachable within {timeout_s}s. Last error: {last_err}")
 
 
+def normalize_column_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9]+", "_", name).strip("_").lower()
+
+
 def normalize_green_columns(df: pd.DataFrame) -> pd.DataFrame:
     # Normalize column names to snake_case and lower
-    df.columns = [re.sub(r"[^a-zA-Z0-9]+", "_", c).strip("_").lower() for c in df.columns]
+    df.columns = [normalize_column_name(c) for c in df.columns]
 
     # Common TLC green schema columns sometimes appear with different casing
     # Ensure datetime columns are parsed when present
@@ -56,6 +86,220 @@ def normalize_green_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
+def serialize_csv(df: pd.DataFrame) -> io.StringIO:
+    # \N marks NULLs so empty strings survive
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False, na_rep="\\N")
+    buf.seek(0)
+    return buf
+
+
+def copy_insert(conn, table_name: str, df: pd.DataFrame, buf: Optional[io.StringIO] = None) -> None:
+    # COPY FROM STDIN with CSV text; pass buf to reuse a chunk already rendered by serialize_csv
+    if buf is None:
+        buf = serialize_csv(df)
+
+    cols = ",".join([f'"{c}"' for c in df.columns])
+    sql = f"COPY {table_name} ({cols}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')"
+    cur = conn.connection.cursor()
+    try:
+        cur.copy_expert(sql, buf)
+    finally:
+        cur.close()
+
+
+def plan_projection(
+    schema: pa.Schema, columns: Optional[list[str]], row_filter: Optional[RowFilter]
+) -> tuple[list[str], Optional[list[str]], Optional[RowFilter]]:
+    """
+    Map --columns / --where names (as in the file or normalized) to the file's
+    columns. Returns the columns to keep, the columns to read (None = all) and
+    the filter in file column names.
+    """
+    by_name = {normalize_column_name(c): c for c in schema.names}
+
+    def resolve(name: str) -> str:
+        if name in schema.names:
+            return name
+        if normalize_column_name(name) in by_name:
+            return by_name[normalize_column_name(name)]
+        raise ValueError(f"Unknown column {name!r}; the file has: {', '.join(schema.names)}")
+
+    keep = [resolve(c) for c in columns] if columns else list(schema.names)
+    if row_filter:
+        row_filter = row_filter.rename({c: resolve(c) for c in row_filter.columns})
+    if not columns:
+        return keep, None, row_filter
+    read = keep + [c for c in (row_filter.columns if row_filter else []) if c not in keep]
+    return keep, read, row_filter
+
+
+# Tables go to the default schema; fast_load.py qualifies names with it
+SCHEMA = "public"
+
+# Columns indexed after the load, for typical queries
+INDEX_COLUMNS = ["lpep_pickup_datetime", "pulocationid", "dolocationid"]
+
+
+def create_table(df: pd.DataFrame, engine, table_name: str, if_exists: str, unlogged: bool = False) -> None:
+    # Only the schema is written here; rows go through write_chunk
+    df.head(0).to_sql(name=table_name, con=engine, if_exists=if_exists, index=False)
+    if unlogged:
+        with engine.begin() as conn:
+            set_unlogged(conn, SCHEMA, table_name)
+
+
+def write_chunk(chunk: pd.DataFrame, engine, table_name: str, insert_method: str, metrics: IngestMetrics) -> tuple[int, float]:
+    """Write one chunk; returns (serialized bytes, seconds spent loading)."""
+    payload_bytes = 0
+    t0 = time.perf_counter()
+    if insert_method == "copy":
+        with metrics.stage("serialize"):
+            buf = serialize_csv(chunk)
+        payload_bytes = payload_size(buf)
+        metrics.count("bytes_out", payload_bytes)
+        t0 = time.perf_counter()
+        with metrics.stage("load"), engine.begin() as conn:
+            copy_insert(conn, table_name, chunk, buf)
+    elif insert_method == "multi":
+        with metrics.stage("load"):
+            chunk.to_sql(
+                name=table_name,
+                con=engine,
+                if_exists="append",
+                index=False,
+                method="multi",
+                chunksize=20_000,
+            )
+    else:  # "default"
+        with metrics.stage("load"):
+            chunk.to_sql(
+                name=table_name,
+                con=engine,
+                if_exists="append",
+                index=False,
+                chunksize=20_000,
+            )
+    load_seconds = time.perf_counter() - t0
+    metrics.chunk_done(len(chunk))
+    return payload_bytes, load_seconds
+
+
+def ingest_full(
+    engine,
+    path: str,
+    table_name: str,
+    chunksize: int,
+    if_exists: str,
+    insert_method: str,
+    metrics: IngestMetrics,
+    unlogged: bool = False,
+    columns: Optional[list[str]] = None,
+    row_filter: Optional[RowFilter] = None,
+) -> tuple[int, list[str]]:
+    # Read parquet (whole file) then push in chunks to Postgres
+    with metrics.stage("parse"):
+        source = metrics.open(path) if metrics.enabled else path
+        schema = pq.read_schema(source)
+        if metrics.enabled:
+            source.seek(0)
+        keep, read, row_filter = plan_projection(schema, columns, row_filter)
+        # The reader skips unread columns and, with a filter, row groups ruled out by their statistics
+        table = pq.read_table(
+            source, columns=read, filters=row_filter.expression(schema) if row_filter else None
+        )
+        df = normalize_green_columns(table.select(keep).to_pandas())
+
+    total_rows = len(df)
+    if total_rows == 0:
+        return 0, list(df.columns)
+
+    n_chunks = math.ceil(total_rows / chunksize)
+    print(f"Loaded parquet rows={total_rows}. Writing to table={table_name} in {n_chunks} chunk(s).")
+
+    create_table(df, engine, table_name, if_exists, unlogged)
+    for i in range(n_chunks):
+        start = i * chunksize
+        end = min((i + 1) * chunksize, total_rows)
+        chunk = df.iloc[start:end].copy()
+
+        t0 = time.time()
+        write_chunk(chunk, engine, table_name, insert_method, metrics)
+        dt = time.time() - t0
+        print(f"Chunk {i+1}/{n_chunks} rows {start}:{end} written ({end-start} rows) in {dt:.1f}s")
+
+    return total_rows, list(df.columns)
+
+
+def ingest_streaming(
+    engine,
+    path: str,
+    table_name: str,
+    chunksize: int,
+    if_exists: str,
+    insert_method: str,
+    metrics: IngestMetrics,
+    unlogged: bool = False,
+    sizer: Optional[AdaptiveChunkSizer] = None,
+    columns: Optional[list[str]] = None,
+    row_filter: Optional[RowFilter] = None,
+) -> tuple[int, list[str]]:
+    # Iterate record batches so only one chunk is ever materialized in pandas
+    pf = pq.ParquetFile(metrics.open(path) if metrics.enabled else path)
+    total_rows = pf.metadata.num_rows
+    keep, read, row_filter = plan_projection(pf.schema_arrow, columns, row_filter)
+
+    # Create the table from the file schema, not from the first batch, so a column
+    # that happens to be all-null in batch 1 still gets its real type
+    empty = normalize_green_columns(pf.schema_arrow.empty_table().select(keep).to_pandas())
+    if total_rows == 0:
+        return 0, list(empty.columns)
+    create_table(empty, engine, table_name, if_exists, unlogged)
+
+    # Row groups whose statistics rule the filter out are never read
+    row_groups = list(range(pf.metadata.num_row_groups))
+    if row_filter:
+        row_groups = [i for i in row_groups if row_filter.row_group_matches(pf.metadata.row_group(i))]
+        total_rows = sum(pf.metadata.row_group(i).num_rows for i in row_groups)
+        print(f"Reading {len(row_groups)} of {pf.metadata.num_row_groups} row group(s) that may match --where")
+
+    n_chunks = "?" if sizer or row_filter else math.ceil(total_rows / chunksize)
+    print(
+        f"Streaming parquet rows={total_rows} ({len(row_groups)} row group(s)). "
+        f"Writing to table={table_name} in {n_chunks} chunk(s)."
+    )
+
+    if sizer:
+        # Read small batches and regroup them at whatever size the sizer asks for
+        batch_size = min(chunksize, sizer.min_rows * 10)
+        batches = rebatch(pf.iter_batches(batch_size=batch_size, row_groups=row_groups, columns=read), chunksize, sizer)
+    else:
+        batches = pf.iter_batches(batch_size=chunksize, row_groups=row_groups, columns=read)
+
+    expression = row_filter.expression(pf.schema_arrow) if row_filter else None
+    start = 0
+    t0 = time.time()
+    for i, batch in enumerate(metrics.timed_iter(batches, "parse")):
+        with metrics.stage("parse"):
+            if expression is not None:
+                batch = batch.filter(expression)
+            chunk = normalize_green_columns(batch.select(keep).to_pandas())
+        end = start + len(chunk)
+
+        payload_bytes, load_seconds = write_chunk(chunk, engine, table_name, insert_method, metrics)
+        if sizer:
+            sizer.observe(len(chunk), chunk_nbytes(chunk), payload_bytes, load_seconds)
+        dt = time.time() - t0
+        print(f"Chunk {i+1}/{n_chunks} rows {start}:{end} written ({end-start} rows) in {dt:.1f}s")
+
+        start = end
+        t0 = time.time()
+
+    if sizer:
+        print(sizer.summary())
+    return total_rows, list(empty.columns)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Ingest green tripdata parquet into Postgres")
     parser.add_argument("--user", required=True)
@@ -66,6 +310,59 @@ def main():
     parser.add_argument("--table_name", required=True)
     parser.add_argument("--file", required=True, help="Path to parquet file")
     parser.add_argument("--chunksize", type=int, default=200_000)
+    parser.add_argument(
+        "--memory_budget",
+        "--memory-budget",
+        default=None,
+        help="stream mode: adapt the chunk size to stay under this much memory (e.g. 1G); --chunksize is the starting size",
+    )
+    parser.add_argument(
+        "--read_mode",
+        choices=["stream", "full"],
+        default="stream",
+        help="stream = read the parquet file batch by batch (memory ~ one chunk), full = load the whole file first",
+    )
+    parser.add_argument(
+        "--insert_method",
+        "--insert-method",
+        choices=["copy", "multi", "default"],
+        default="copy",
+        help="copy = COPY FROM STDIN (fastest), multi = pandas multi-row INSERT, default = pandas executemany",
+    )
+    parser.add_argument(
+        "--if_exists",
+        "--if-exists",
+        choices=["replace", "append", "fail"],
+        default="replace",
+        help="What to do when the target table already exists",
+    )
+    parser.add_argument(
+        "--fast_load",
+        "--fast-load",
+        action="store_true",
+        help="Load into an UNLOGGED side table, build indexes in parallel, then swap it in (implies replace)",
+    )
+    parser.add_argument(
+        "--columns",
+        default=None,
+        help="Comma-separated columns to load (file or normalized names); the others are never decoded",
+    )
+    parser.add_argument(
+        "--where",
+        default=None,
+        help='Load only rows matching this filter, e.g. "fare_amount > 0 and payment_type in (1, 2)"; '
+        "row groups whose statistics rule it out are skipped",
+    )
+    parser.add_argument(
+        "--metrics_jsonl",
+        "--metrics-jsonl",
+        default=None,
+        help="Append per-chunk stage timings and a summary as JSON lines to this file ('-' = stdout)",
+    )
+    parser.add_argument("--metrics_prom", "--metrics-prom", default=None, help="Write Prometheus text metrics to this file")
+    parser.add_argument(
+        "--metrics_port", "--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port at /metrics"
+    )
     args = parser.parse_args()
 
     table_name = safe_table_name(args.table_name)
@@ -76,45 +373,54 @@ def main():
     engine = create_engine(make_pg_url(args.user, args.password, args.host, args.port, args.db))
     wait_for_postgres(engine)
 
-    # Read parquet (whole file) then push in chunks to Postgres
-    df = pd.read_parquet(args.file)
-    df = normalize_green_columns(df)
+    if args.fast_load and args.if_exists == "append":
+        raise ValueError("--fast_load replaces the target table; use --if_exists replace or fail")
 
-    total_rows = len(df)
-    if total_rows == 0:
-        print("No rows found in parquet. Exiting.")
-        return
+    # With --fast_load the rows go to a side table; readers keep the old one until the swap
+    # (see pipeline/scripts_ingest/fast_load.py)
+    load_table = staging_table_name(table_name) if args.fast_load else table_name
+    if args.fast_load:
+        if args.if_exists == "fail":
+            with engine.connect() as conn:
+                if table_exists(conn, SCHEMA, table_name):
+                    raise ValueError(f"Table {table_name} already exists")
+        drop_staging(engine, SCHEMA, load_table)
 
-    n_chunks = math.ceil(total_rows / args.chunksize)
-    print(f"Loaded parquet rows={total_rows}. Writing to table={table_name} in {n_chunks} chunk(s).")
+    extra = {}
+    if args.memory_budget:
+        if args.read_mode != "stream":
+            raise ValueError("--memory_budget needs --read_mode stream")
+        extra["sizer"] = AdaptiveChunkSizer(parse_size(args.memory_budget), initial_rows=args.chunksize)
 
-    # Write first chunk with replace to create table, then append
-    for i in range(n_chunks):
-        start = i * args.chunksize
-        end = min((i + 1) * args.chunksize, total_rows)
-        chunk = df.iloc[start:end].copy()
+    if args.columns:
+        extra["columns"] = parse_columns(args.columns)
+    if args.where:
+        extra["row_filter"] = RowFilter.parse(args.where)
 
-        if_exists = "replace" if i == 0 else "append"
-        t0 = time.time()
-        chunk.to_sql(
-            name=table_name,
-            con=engine,
-            if_exists=if_exists,
-            index=False,
-            method="multi",
-            chunksize=20_000,
+    ingest = ingest_streaming if args.read_mode == "stream" else ingest_full
+    with IngestMetrics(args.file, table_name, args.metrics_jsonl, args.metrics_prom, args.metrics_port) as metrics:
+        total_rows, columns = ingest(
+            engine,
+            args.file,
+            load_table,
+            args.chunksize,
+            args.if_exists,
+            args.insert_method,
+            metrics,
+            unlogged=args.fast_load,
+            **extra,
         )
-        dt = time.time() - t0
-        print(f"Chunk {i+1}/{n_chunks} rows {start}:{end} written ({end-start} rows) in {dt:.1f}s")
 
-    # Useful indexes for typical queries
-    with engine.begin() as conn:
-        if "lpep_pickup_datetime" in df.columns:
-            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_pickup_dt ON {table_name} (lpep_pickup_datetime)"))
-        if "pulocationid" in df.columns:
-            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_pulocationid ON {table_name} (pulocationid)"))
-        if "dolocationid" in df.columns:
-            conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table_name}_dolocationid ON {table_name} (dolocationid)"))
+        if total_rows == 0:
+            print("No rows found in parquet. Exiting.")
+            return
+
+        index_columns = [c for c in INDEX_COLUMNS if c in columns]
+        with metrics.stage("finalize"):
+            if args.fast_load:
+                finish_fast_load(engine, SCHEMA, load_table, table_name, index_columns, len(index_columns))
+            else:
+                build_indexes(engine, SCHEMA, table_name, index_columns, workers=1)
 
     print("Done.")
 
@@ -1,4 +1,5 @@
 import argparse
+import io
 import os
 import re
 import sys
@@ -34,6 +35,21 @@ def wait_for_postgres(engine, timeout_s: int = 60) -> None:
     raise RuntimeError(f"Postgres not reachable within {timeout_s}s. Last error: {last_err}")
 
 
+def copy_insert(conn, table_name: str, df: pd.DataFrame) -> None:
+    # COPY FROM STDIN with CSV text; \N marks NULLs so empty strings survive
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False, na_rep="\\N")
+    buf.seek(0)
+
+    cols = ",".join([f'"{c}"' for c in df.columns])
+    sql = f"COPY {table_name} ({cols}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')"
+    cur = conn.connection.cursor()
+    try:
+        cur.copy_expert(sql, buf)
+    finally:
+        cur.close()
+
+
 def main():
     parser = argparse.ArgumentParser(description="Ingest taxi_zone_lookup csv into Postgres")
     parser.add_argument("--user", required=True)
@@ -43,6 +59,20 @@ def main():
     parser.add_argument("--db", required=True)
     parser.add_argument("--table_name", required=True)
     parser.add_argument("--file", required=True, help="Path to CSV file")
+    parser.add_argument(
+        "--insert_method",
+        "--insert-method",
+        choices=["copy", "multi", "default"],
+        default="copy",
+        help="copy = COPY FROM STDIN (fastest), multi = pandas multi-row INSERT, default = pandas executemany",
+    )
+    parser.add_argument(
+        "--if_exists",
+        "--if-exists",
+        choices=["replace", "append", "fail"],
+        default="replace",
+        help="What to do when the target table already exists",
+    )
     args = parser.parse_args()
 
     table_name = safe_table_name(args.table_name)
@@ -60,14 +90,19 @@ def main():
     if "locationid" in df.columns:
         df["locationid"] = pd.to_numeric(df["locationid"], errors="coerce")
 
-    df.to_sql(
-        name=table_name,
-        con=engine,
-        if_exists="replace",
-        index=False,
-        method="multi",
-        chunksize=10_000,
-    )
+    df.head(0).to_sql(name=table_name, con=engine, if_exists=args.if_exists, index=False)
+    if args.insert_method == "copy":
+        with engine.begin() as conn:
+            copy_insert(conn, table_name, df)
+    else:
+        df.to_sql(
+            name=table_name,
+            con=engine,
+            if_exists="append",
+            index=False,
+            method="multi" if args.insert_method == "multi" else None,
+            chunksize=10_000,
+        )
 
     with engine.begin() as conn:
         if "locationid" in df.columns:
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Incremental sync for load_yellow_taxi_data.py: which months to skip, and
+whether an upload arrived intact.
+
+GCS reports the size, CRC32C and (except for composite objects) MD5 of every
+object, base64-encoded. A month is skipped when its object already matches:
+
+    disk mode    the local file is hashed in one pass and compared with the
+                 object listed for it (size and CRC32C, MD5 when both have one)
+    stream mode  there is no local file; the object carries the ETag of the
+                 URL it came from (`source-etag` metadata), and a HEAD request
+                 shows whether the source still has that ETag and size. A
+                 plain-MD5 ETag also compares with the object's MD5
+
+After an upload, the hashes in the upload response are compared with the
+local ones the same way, with no extra request.
+"""
+
+import base64
+import hashlib
+import os
+import re
+import time
+import urllib.request
+
+import google_crc32c  # installed with google-cloud-storage
+from google.cloud import storage
+
+SOURCE_ETAG_KEY = "source-etag"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+_MD5_ETAG = re.compile(r'^(?:W/)?"?([0-9a-fA-F]{32})"?$')
+
+
+class Checksums:
+    """Running MD5 and CRC32C of a byte stream, base64-encoded like GCS object metadata."""
+
+    def __init__(self):
+        self._md5 = hashlib.md5()
+        self._crc32c = google_crc32c.Checksum()
+        self.size = 0
+
+    def update(self, data: bytes) -> None:
+        self._md5.update(data)
+        self._crc32c.update(data)
+        self.size += len(data)
+
+    @property
+    def md5(self) -> str:
+        return base64.b64encode(self._md5.digest()).decode()
+
+    @property
+    def crc32c(self) -> str:
+        return base64.b64encode(self._crc32c.digest()).decode()
+
+    @property
+    def crc32c_value(self) -> int:
+        return int.from_bytes(self._crc32c.digest(), "big")
+
+
+def file_checksums(file_path: str) -> Checksums:
+    sums = Checksums()
+    with open(file_path, "rb") as f:
+        while block := f.read(HASH_BLOCK_SIZE):
+            sums.update(block)
+    return sums
+
+
+def list_existing_blobs(client: storage.Client, bucket: storage.Bucket, prefix: str) -> dict[str, storage.Blob]:
+    """Metadata (size, hashes) of every object under `prefix`, in one listing."""
+    return {blob.name: blob for blob in client.list_blobs(bucket, prefix=prefix)}
+
+
+def verify_gcs_upload(blob: storage.Blob, sums) -> bool:
+    """
+    Compare the object's server-side hashes with the local ones. Composite
+    objects have no MD5, so CRC32C must match and MD5 only when both sides have one.
+    """
+    return (
+        blob.size == sums.size
+        and blob.crc32c == sums.crc32c
+        and (blob.md5_hash is None or sums.md5 is None or blob.md5_hash == sums.md5)
+    )
+
+
+def head_source(url: str, timeout: float) -> tuple[str | None, int | None, bool]:
+    """ETag, length and Range support of a source URL."""
+    with urllib.request.urlopen(urllib.request.Request(url, method="HEAD"), timeout=timeout) as resp:
+        length = resp.headers.get("Content-Length")
+        return resp.headers.get("ETag"), int(length) if length else None, resp.headers.get("Accept-Ranges") == "bytes"
+
+
+def source_unchanged(existing: storage.Blob, etag: str | None, length: int | None) -> bool:
+    same_etag = etag is not None and etag == (existing.metadata or {}).get(SOURCE_ETAG_KEY)
+    # Objects uploaded from disk have no stored ETag, but a plain-MD5 ETag compares with md5Hash
+    md5 = _MD5_ETAG.match(etag or "")
+    same_md5 = md5 is not None and existing.md5_hash == base64.b64encode(bytes.fromhex(md5.group(1))).decode()
+    return (same_etag or same_md5) and length is not None and length == existing.size
+
+
+def upload_to_gcs(
+    client: storage.Client,
+    bucket: storage.Bucket,
+    file_path: str,
+    existing: storage.Blob | None = None,
+    chunk_size: int = 8 * 1024 * 1024,
+    max_retries: int = 3,
+    retry_sleep_sec: float = 5,
+) -> None:
+    """Upload a local file under its base name, unless `existing` already has the same content."""
+    blob_name = os.path.basename(file_path)
+    blob = bucket.blob(blob_name)
+    blob.chunk_size = chunk_size
+
+    sums = file_checksums(file_path)
+    if existing is not None and verify_gcs_upload(existing, sums):
+        print(f"Unchanged, skipping: gs://{bucket.name}/{blob_name} (crc32c {sums.crc32c})")
+        return
+
+    for attempt in range(max_retries):
+        try:
+            print(
+                f"Uploading {file_path} to gs://{bucket.name}/ (Attempt {attempt + 1}/{max_retries})..."
+            )
+            # The upload response carries the object's metadata, hashes included
+            blob.upload_from_filename(file_path, checksum="crc32c")
+            print(f"Uploaded: gs://{bucket.name}/{blob_name}")
+
+            if verify_gcs_upload(blob, sums):
+                print(f"Verification successful for {blob_name} (crc32c {sums.crc32c})")
+                return
+
+            print(
+                f"Verification failed for {blob_name} (server crc32c {blob.crc32c}, md5 {blob.md5_hash}; "
+                f"local {sums.crc32c}, {sums.md5}), retrying..."
+            )
+        except Exception as e:
+            print(f"Failed to upload {file_path}: {e}")
+
+        time.sleep(retry_sleep_sec)
+
+    print(f"Giving up on {file_path} after {max_retries} attempts.")
@@ -1,39 +1,37 @@
 import os
+import shutil
 import sys
-import time
-import urllib.request
 from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING
 
 import google.auth
 from google.auth import impersonated_credentials
+from google.auth.credentials import AnonymousCredentials
 from google.cloud import storage
 
-# ----------------------------
-# Required environment vars
-# ----------------------------
-# Export these from Terraform outputs before running:
-#   export BUCKET_NAME="$(terraform output -raw bucket_name)"
-#   export TARGET_SERVICE_ACCOUNT="$(terraform output -raw target_service_account)"
-#   export GCP_PROJECT="$(terraform output -raw project_id)"
-PROJECT_ID = os.environ["GCP_PROJECT"]
-BUCKET_NAME = os.environ["BUCKET_NAME"]
-TARGET_SERVICE_ACCOUNT = os.environ["TARGET_SERVICE_ACCOUNT"]
-
-# ----------------------------
-# Download settings
-# ----------------------------
-BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data/yellow_tripdata_2024-"
+from gcs_sync import list_existing_blobs, upload_to_gcs
+from parquet_layout import format_report, optimize_parquet
+from parallel_transfer import MonthTransfer, TransferScheduler, plan_transfer, transfer_slices
+from settings import Settings
+from stream_transfer import stream_to_gcs
+
+if TYPE_CHECKING:
+    from download_cache import DownloadCache
+
+# The download cache lives with the ingest scripts; sharing the module (and the
+# cache directory) keeps eviction coordinated between the two. Only disk mode
+# uses it, so it is imported there (see open_download_cache)
+PIPELINE_SCRIPTS = (Path(__file__).resolve().parent / "../../pipeline/scripts_ingest").resolve()
+
 MONTHS = [f"{i:02d}" for i in range(1, 7)]
 DOWNLOAD_DIR = "."
+OPTIMIZED_DIR = os.path.join(DOWNLOAD_DIR, "optimized")
 CHUNK_SIZE = 8 * 1024 * 1024
-MAX_WORKERS = int(os.environ.get("MAX_WORKERS", "4"))
-MAX_RETRIES = int(os.environ.get("MAX_RETRIES", "3"))
-RETRY_SLEEP_SECONDS = int(os.environ.get("RETRY_SLEEP_SECONDS", "5"))
+BLOB_PREFIX = "yellow_tripdata_2024-"
 
-os.makedirs(DOWNLOAD_DIR, exist_ok=True)
 
-
-def make_impersonated_storage_client() -> storage.Client:
+def make_impersonated_storage_client(settings: Settings) -> storage.Client:
     """
     Creates a Google Cloud Storage client using Service Account impersonation.
     Requires:
@@ -46,21 +44,55 @@ def make_impersonated_storage_client() -> storage.Client:
 
     target_creds = impersonated_credentials.Credentials(
         source_credentials=source_creds,
-        target_principal=TARGET_SERVICE_ACCOUNT,
+        target_principal=settings.target_service_account,
         target_scopes=["https://www.googleapis.com/auth/cloud-platform"],
         lifetime=3600,
     )
 
-    return storage.Client(project=PROJECT_ID, credentials=target_creds)
+    return storage.Client(project=settings.project_id, credentials=target_creds)
+
+
+def make_storage_client(settings: Settings) -> storage.Client:
+    if settings.storage_emulator_host:
+        # The client sends its requests to STORAGE_EMULATOR_HOST by itself
+        print(f"Using storage emulator at {settings.storage_emulator_host}")
+        return storage.Client(project=settings.project_id, credentials=AnonymousCredentials())
+    return make_impersonated_storage_client(settings)
 
 
-def download_file(month: str) -> str | None:
-    url = f"{BASE_URL}{month}.parquet"
-    file_path = os.path.join(DOWNLOAD_DIR, f"yellow_tripdata_2024-{month}.parquet")
+def open_download_cache(settings: Settings) -> "DownloadCache":
+    sys.path.append(str(PIPELINE_SCRIPTS))
+    try:
+        from download_cache import DownloadCache
+    except ModuleNotFoundError as e:
+        if e.name != "download_cache":
+            raise
+        raise SystemExit(
+            "TRANSFER_MODE=disk uses download_cache.py from pipeline/scripts_ingest: run this script from a "
+            "checkout of the whole repository, or use TRANSFER_MODE=stream or parallel (see README.md)"
+        ) from None
+    # Shared with pipeline/scripts_ingest (TLC_CACHE_DIR): re-runs revalidate instead of re-downloading
+    return DownloadCache(
+        max_bytes=settings.cache_max_bytes,
+        retries=settings.max_retries,
+        backoff_sec=settings.retry_sleep_sec,
+    )
+
+
+def download_file(cache: "DownloadCache", base_url: str, month: str) -> str | None:
+    url = f"{base_url}{month}.parquet"
+    file_path = os.path.join(DOWNLOAD_DIR, f"{BLOB_PREFIX}{month}.parquet")
 
     try:
         print(f"Downloading {url}...")
-        urllib.request.urlretrieve(url, file_path)
+        cached_path = cache.fetch(url)
+        # Hard link when possible so the cache and DOWNLOAD_DIR share one copy
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        try:
+            os.link(cached_path, file_path)
+        except OSError:
+            shutil.copyfile(cached_path, file_path)
         print(f"Downloaded: {file_path}")
         return file_path
     except Exception as e:
@@ -68,67 +100,172 @@ def download_file(month: str) -> str | None:
         return None
 
 
-def verify_gcs_upload(client: storage.Client, bucket: storage.Bucket, blob_name: str) -> bool:
-    return storage.Blob(bucket=bucket, name=blob_name).exists(client)
+def optimize_file(settings: Settings, file_path: str) -> tuple[str, dict | None]:
+    """
+    Rewrite a downloaded month into OPTIMIZED_DIR; the upload keeps the same
+    object name. If the rewrite fails, the original file is returned (with no
+    report) so the month is still uploaded, as it came from the source.
+    """
+    os.makedirs(OPTIMIZED_DIR, exist_ok=True)
+    out_path = os.path.join(OPTIMIZED_DIR, os.path.basename(file_path))
+    try:
+        report = optimize_parquet(
+            file_path,
+            out_path,
+            row_group_bytes=settings.row_group_bytes,
+            compression_level=settings.zstd_level,
+        )
+        print(f"Optimized {format_report(os.path.basename(file_path), report)}")
+        return out_path, report
+    except Exception as e:
+        print(f"Failed to optimize {file_path}, uploading the original: {e}")
+        return file_path, None
 
 
-def upload_to_gcs(
+def stream_file(
+    settings: Settings,
     client: storage.Client,
     bucket: storage.Bucket,
-    file_path: str,
-    max_retries: int = MAX_RETRIES,
+    url: str,
+    blob_name: str,
+    existing: storage.Blob | None = None,
 ) -> None:
-    blob_name = os.path.basename(file_path)
-    blob = bucket.blob(blob_name)
-    blob.chunk_size = CHUNK_SIZE
+    stream_to_gcs(
+        client,
+        bucket,
+        url,
+        blob_name,
+        existing,
+        chunk_size=CHUNK_SIZE,
+        prefetch_chunks=settings.prefetch_chunks,
+        timeout=settings.http_timeout_sec,
+        max_retries=settings.max_retries,
+        retry_sleep_sec=settings.retry_sleep_sec,
+    )
 
-    for attempt in range(max_retries):
-        try:
-            print(
-                f"Uploading {file_path} to gs://{bucket.name}/ (Attempt {attempt + 1}/{max_retries})..."
+
+def run_parallel(settings: Settings, client: storage.Client, bucket: storage.Bucket) -> None:
+    existing = list_existing_blobs(client, bucket, BLOB_PREFIX) if settings.sync else {}
+
+    def plan(month: str) -> MonthTransfer | None:
+        blob_name = f"{BLOB_PREFIX}{month}.parquet"
+        return plan_transfer(
+            bucket,
+            f"{settings.base_url}{month}.parquet",
+            blob_name,
+            existing.get(blob_name),
+            settings.slice_bytes,
+            settings.http_timeout_sec,
+        )
+
+    with ThreadPoolExecutor(max_workers=settings.max_workers) as executor:
+        transfers = [t for t in executor.map(plan, MONTHS) if t is not None]
+    sliced = {t.blob_name: t for t in transfers if t.ranges}
+    scheduler = TransferScheduler({name: t.ranges for name, t in sliced.items()}, settings.slice_workers)
+
+    with ThreadPoolExecutor(max_workers=settings.slice_workers + settings.max_workers) as executor:
+        # Sources without Range support are streamed whole, next to the slice workers
+        futures = [
+            executor.submit(stream_file, settings, client, bucket, t.url, t.blob_name)
+            for t in transfers
+            if not t.ranges
+        ]
+        futures += [
+            executor.submit(
+                transfer_slices,
+                client,
+                bucket,
+                scheduler,
+                sliced,
+                settings.http_timeout_sec,
+                settings.max_retries,
+                settings.retry_sleep_sec,
+            )
+            for _ in range(settings.slice_workers)
+        ]
+        for f in futures:
+            f.result()
+
+    print(scheduler.summary())
+
+
+def run_stream(settings: Settings, client: storage.Client, bucket: storage.Bucket) -> None:
+    # Download and upload overlap within each month, and months run in parallel
+    with ThreadPoolExecutor(max_workers=settings.max_workers) as executor:
+        existing = list_existing_blobs(client, bucket, BLOB_PREFIX) if settings.sync else {}
+        futures = []
+        for month in MONTHS:
+            blob_name = f"{BLOB_PREFIX}{month}.parquet"
+            url = f"{settings.base_url}{month}.parquet"
+            futures.append(
+                executor.submit(stream_file, settings, client, bucket, url, blob_name, existing.get(blob_name))
             )
-            blob.upload_from_filename(file_path)
-            print(f"Uploaded: gs://{bucket.name}/{blob_name}")
+        for f in futures:
+            f.result()
 
-            if verify_gcs_upload(client, bucket, blob_name):
-                print(f"Verification successful for {blob_name}")
-                return
 
-            print(f"Verification failed for {blob_name}, retrying...")
-        except Exception as e:
-            print(f"Failed to upload {file_path}: {e}")
+def run_disk(settings: Settings, client: storage.Client, bucket: storage.Bucket) -> None:
+    os.makedirs(DOWNLOAD_DIR, exist_ok=True)
+    cache = open_download_cache(settings)
+    with ThreadPoolExecutor(max_workers=settings.max_workers) as executor:
+        file_paths = list(executor.map(lambda m: download_file(cache, settings.base_url, m), MONTHS))
 
-        time.sleep(RETRY_SLEEP_SECONDS)
+    if settings.optimize:
+        # One month at a time: a rewrite holds the whole month in memory (see parquet_layout.py)
+        optimized = [optimize_file(settings, fp) for fp in filter(None, file_paths)]
+        file_paths = [path for path, _ in optimized]
+        reports = [report for _, report in optimized if report]
+        if reports:
+            before = sum(r["before"]["bytes"] for r in reports)
+            after = sum(r["after"]["bytes"] for r in reports)
+            print(
+                f"Optimized {len(reports)} file(s): {sum(r['after']['rows'] for r in reports):,} rows, "
+                f"{before / 1024**2:.1f} MB -> {after / 1024**2:.1f} MB ({(before - after) / 1024**2:.1f} MB saved)"
+            )
 
-    print(f"Giving up on {file_path} after {max_retries} attempts.")
+    existing = list_existing_blobs(client, bucket, BLOB_PREFIX) if settings.sync else {}
+    with ThreadPoolExecutor(max_workers=settings.max_workers) as executor:
+        futures = [
+            executor.submit(
+                upload_to_gcs,
+                client,
+                bucket,
+                fp,
+                existing.get(os.path.basename(fp)),
+                chunk_size=CHUNK_SIZE,
+                max_retries=settings.max_retries,
+                retry_sleep_sec=settings.retry_sleep_sec,
+            )
+            for fp in filter(None, file_paths)
+        ]
+        # Ensure exceptions surface
+        for f in futures:
+            f.result()
 
 
 def main() -> int:
-    client = make_impersonated_storage_client()
+    try:
+        settings = Settings()
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 1
+
+    client = make_storage_client(settings)
 
     # Terraform already created the bucket. Do not create it here.
-    bucket = client.bucket(BUCKET_NAME)
+    bucket = client.bucket(settings.bucket_name)
 
     # Optional: quick existence check (fails fast if BUCKET_NAME is wrong)
     try:
-        client.get_bucket(BUCKET_NAME)
-        print(f"Using existing bucket: gs://{BUCKET_NAME}/")
+        client.get_bucket(settings.bucket_name)
+        print(f"Using existing bucket: gs://{settings.bucket_name}/")
     except Exception as e:
-        print(f"Bucket not accessible or does not exist: gs://{BUCKET_NAME}/")
+        print(f"Bucket not accessible or does not exist: gs://{settings.bucket_name}/")
         print(f"Details: {e}")
         return 1
 
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        file_paths = list(executor.map(download_file, MONTHS))
-
-    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = []
-        for fp in filter(None, file_paths):
-            futures.append(executor.submit(upload_to_gcs, client, bucket, fp))
-
-        # Ensure exceptions surface
-        for f in futures:
-            f.result()
+    run = {"disk": run_disk, "stream": run_stream, "parallel": run_parallel}[settings.transfer_mode]
+    run(settings, client, bucket)
 
     print("All files processed and verified.")
     print(f"Bucket used: gs://{bucket.name}/")
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Building blocks for TRANSFER_MODE=parallel in load_yellow_taxi_data.py.
+
+A large month is split into byte ranges (slices). Each slice is fetched with
+an HTTP Range request and uploaded as its own object. When all slices of a
+month are up, they are joined with GCS compose. Slices of every month go
+through one shared pool of workers:
+
+    order        the next slice comes from the month with the most bytes
+                 left, so the biggest file does not finish last on its own
+    concurrency  starts low and, after every window of completed slices,
+                 compares the aggregate throughput with the previous window:
+                 one more worker while it improves by more than 5%, one less
+                 when it drops by more than 10%
+
+A composite object has no MD5, only a CRC32C, so the CRC32C of the whole file
+is combined from the slice CRC32Cs to check it.
+
+load_yellow_taxi_data.py plans one MonthTransfer per month (plan_transfer)
+and runs transfer_slices on every worker thread; the worker that finishes
+the last slice of a month composes and verifies it (finish_transfer).
+"""
+
+import base64
+import re
+import threading
+import time
+import urllib.request
+
+from google.cloud import storage
+
+from gcs_sync import SOURCE_ETAG_KEY, Checksums, head_source, source_unchanged, verify_gcs_upload
+
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+_CRC32C_POLY = 0x82F63B78  # reflected Castagnoli polynomial
+
+# GCS compose takes at most 32 source objects per request
+MAX_COMPOSE_SOURCES = 32
+# Slices of a file being composed are uploaded under <prefix><object name>/
+SLICE_PREFIX = "_slices/"
+
+
+def _gf2_times(matrix: list[int], vector: int) -> int:
+    total = 0
+    i = 0
+    while vector:
+        if vector & 1:
+            total ^= matrix[i]
+        vector >>= 1
+        i += 1
+    return total
+
+
+def _gf2_square(matrix: list[int]) -> list[int]:
+    return [_gf2_times(matrix, row) for row in matrix]
+
+
+def crc32c_combine(crc1: int, crc2: int, len2: int) -> int:
+    """CRC32C of A + B from crc(A), crc(B) and len(B), as zlib's crc32_combine does it."""
+    if len2 <= 0:
+        return crc1
+    odd = [_CRC32C_POLY] + [1 << n for n in range(31)]  # one zero bit
+    even = _gf2_square(odd)  # two zero bits
+    odd = _gf2_square(even)  # four zero bits
+    while True:
+        # Apply len2 zero bytes to crc1, one bit of len2 at a time
+        even = _gf2_square(odd)
+        if len2 & 1:
+            crc1 = _gf2_times(even, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+        odd = _gf2_square(even)
+        if len2 & 1:
+            crc1 = _gf2_times(odd, crc1)
+        len2 >>= 1
+        if not len2:
+            break
+    return crc1 ^ crc2
+
+
+def slice_ranges(size: int, slice_size: int) -> list[tuple[int, int]]:
+    """Inclusive (start, end) byte ranges covering `size` bytes."""
+    return [(start, min(start + slice_size, size) - 1) for start in range(0, size, slice_size)]
+
+
+def fetch_range(url: str, start: int, end: int, etag: str | None, timeout: float) -> bytes:
+    """
+    GET bytes start..end (inclusive). With If-Range, a file that changed since
+    the HEAD request comes back whole (200) instead of mixing two versions.
+    """
+    headers = {"Range": f"bytes={start}-{end}"}
+    if etag:
+        headers["If-Range"] = etag
+    with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=timeout) as resp:
+        if resp.status != 206:
+            raise OSError(f"{url}: expected 206 for bytes {start}-{end}, got {resp.status} (file changed?)")
+        m = _CONTENT_RANGE.match(resp.headers.get("Content-Range", ""))
+        if not m or (int(m.group(1)), int(m.group(2))) != (start, end):
+            raise OSError(f"{url}: unexpected Content-Range {resp.headers.get('Content-Range')!r}")
+        data = resp.read()
+    if len(data) != end - start + 1:
+        raise OSError(f"{url}: got {len(data)} bytes for bytes {start}-{end}")
+    return data
+
+
+class TransferScheduler:
+    """Hands out (file, slice index) pairs to a shared pool of worker threads."""
+
+    GROW_ABOVE = 1.05
+    SHRINK_BELOW = 0.9
+
+    def __init__(self, slices: dict[str, list[tuple[int, int]]], max_workers: int, initial_workers: int = 2):
+        self.max_workers = max(1, max_workers)
+        self.limit = max(1, min(initial_workers, self.max_workers))
+        self.peak = self.limit
+        self._cond = threading.Condition()
+        self._pending = {name: list(range(len(ranges))) for name, ranges in slices.items()}
+        self._remaining_bytes = {
+            name: sum(end - start + 1 for start, end in ranges) for name, ranges in slices.items()
+        }
+        self._unfinished = {name: len(ranges) for name, ranges in slices.items()}
+        self._sizes = {name: [end - start + 1 for start, end in ranges] for name, ranges in slices.items()}
+        self._active = 0
+        self._window_start = time.perf_counter()
+        self._window_bytes = 0
+        self._window_slices = 0
+        self._last_rate = None
+
+    def acquire(self):
+        """Block until a slice may start; None once there is nothing left to hand out."""
+        with self._cond:
+            while True:
+                waiting = [name for name, pending in self._pending.items() if pending]
+                if not waiting:
+                    return None
+                if self._active < self.limit:
+                    name = max(waiting, key=self._remaining_bytes.__getitem__)
+                    index = self._pending[name].pop(0)
+                    self._remaining_bytes[name] -= self._sizes[name][index]
+                    self._active += 1
+                    return name, index
+                self._cond.wait()
+
+    def release(self, name: str, nbytes: int) -> bool:
+        """Record a finished slice (nbytes=0 if it failed); True if it was the file's last one."""
+        with self._cond:
+            self._active -= 1
+            self._unfinished[name] -= 1
+            self._window_bytes += nbytes
+            self._window_slices += 1
+            if self._window_slices >= self.limit:
+                self._adapt()
+            self._cond.notify_all()
+            return self._unfinished[name] == 0
+
+    def cancel(self, name: str) -> None:
+        """Drop the slices of a file that has failed that were not started yet."""
+        with self._cond:
+            self._unfinished[name] -= len(self._pending[name])
+            self._pending[name] = []
+            self._cond.notify_all()
+
+    def _adapt(self) -> None:
+        now = time.perf_counter()
+        rate = self._window_bytes / max(now - self._window_start, 1e-6)
+        if self._last_rate is None or rate > self._last_rate * self.GROW_ABOVE:
+            self.limit = min(self.limit + 1, self.max_workers)
+        elif rate < self._last_rate * self.SHRINK_BELOW:
+            self.limit = max(self.limit - 1, 1)
+        self.peak = max(self.peak, self.limit)
+        self._last_rate = rate
+        self._window_start = now
+        self._window_bytes = 0
+        self._window_slices = 0
+
+    def summary(self) -> str:
+        rate = f", last window {self._last_rate / 1024**2:.1f} MB/s" if self._last_rate else ""
+        return f"Transfer concurrency: {self.limit} of {self.max_workers} workers (peak {self.peak}{rate})"
+
+
+class ComposedChecksums:
+    """Checksums of an object composed from parts: CRC32C combined from theirs, no MD5 (like GCS)."""
+
+    md5 = None
+
+    def __init__(self, parts: list[Checksums]):
+        value = 0
+        self.size = 0
+        for part in parts:
+            value = crc32c_combine(value, part.crc32c_value, part.size)
+            self.size += part.size
+        self.crc32c = base64.b64encode(value.to_bytes(4, "big")).decode()
+
+
+class MonthTransfer:
+    """One month in parallel mode: its source, byte ranges and the checksums of the uploaded slices."""
+
+    def __init__(
+        self, url: str, blob_name: str, etag: str | None, size: int | None, ranges_supported: bool, slice_size: int
+    ):
+        self.url = url
+        self.blob_name = blob_name
+        self.etag = etag
+        # Empty when the source cannot be fetched in ranges; the month is streamed then
+        self.ranges = slice_ranges(size, slice_size) if size and ranges_supported else []
+        self.parts = [None] * len(self.ranges)
+        self.failed = False
+        self.started = None
+
+    @property
+    def slice_prefix(self) -> str:
+        return f"{SLICE_PREFIX}{self.blob_name}/"
+
+    def part_name(self, index: int) -> str:
+        # A month that fits in one slice is uploaded under its final name
+        return self.blob_name if len(self.ranges) == 1 else f"{self.slice_prefix}{index:05d}"
+
+
+def plan_transfer(
+    bucket: storage.Bucket,
+    url: str,
+    blob_name: str,
+    existing: storage.Blob | None,
+    slice_size: int,
+    timeout: float,
+) -> MonthTransfer | None:
+    """HEAD the source; None if it cannot be reached or `existing` already holds it."""
+    try:
+        etag, length, ranges_supported = head_source(url, timeout)
+    except Exception as e:
+        print(f"Failed to check {url}: {e}")
+        return None
+    if existing is not None and source_unchanged(existing, etag, length):
+        print(f"Unchanged, skipping: gs://{bucket.name}/{existing.name} (source ETag {etag})")
+        return None
+    return MonthTransfer(url, blob_name, etag, length, ranges_supported, slice_size)
+
+
+def upload_slice(
+    client: storage.Client,
+    bucket: storage.Bucket,
+    transfer: MonthTransfer,
+    index: int,
+    timeout: float,
+    max_retries: int,
+    retry_sleep_sec: float,
+) -> Checksums | None:
+    start, end = transfer.ranges[index]
+    blob = bucket.blob(transfer.part_name(index))
+    if len(transfer.ranges) == 1 and transfer.etag:
+        blob.metadata = {SOURCE_ETAG_KEY: transfer.etag}
+
+    for attempt in range(max_retries):
+        try:
+            data = fetch_range(transfer.url, start, end, transfer.etag, timeout)
+            sums = Checksums()
+            sums.update(data)
+            blob.upload_from_string(data, content_type="application/octet-stream", client=client, checksum="crc32c")
+            if verify_gcs_upload(blob, sums):
+                return sums
+            print(f"Verification failed for {blob.name} (server crc32c {blob.crc32c}, local {sums.crc32c})")
+        except Exception as e:
+            print(f"Failed bytes {start}-{end} of {transfer.url} (Attempt {attempt + 1}/{max_retries}): {e}")
+        time.sleep(retry_sleep_sec)
+    return None
+
+
+def finish_transfer(client: storage.Client, bucket: storage.Bucket, transfer: MonthTransfer) -> None:
+    """Compose the slices of a month into its object, verify it and delete the slices."""
+    try:
+        if transfer.failed:
+            print(f"Giving up on {transfer.url}: some byte ranges failed on every attempt.")
+            return
+
+        target = bucket.blob(transfer.blob_name)
+        if len(transfer.ranges) > 1:
+            target.content_type = "application/octet-stream"
+            if transfer.etag:
+                target.metadata = {SOURCE_ETAG_KEY: transfer.etag}
+            sources = [bucket.blob(transfer.part_name(i)) for i in range(len(transfer.ranges))]
+            level = 0
+            # Compose takes up to 32 sources: join groups into intermediate objects first
+            while len(sources) > MAX_COMPOSE_SOURCES:
+                groups = [sources[i : i + MAX_COMPOSE_SOURCES] for i in range(0, len(sources), MAX_COMPOSE_SOURCES)]
+                sources = []
+                for j, group in enumerate(groups):
+                    intermediate = bucket.blob(f"{transfer.slice_prefix}compose-{level}-{j:05d}")
+                    intermediate.compose(group, client=client)
+                    sources.append(intermediate)
+                level += 1
+            target.compose(sources, client=client)
+        else:
+            target.reload(client=client)
+
+        sums = ComposedChecksums(transfer.parts)
+        seconds = time.perf_counter() - transfer.started
+        print(
+            f"Uploaded: gs://{bucket.name}/{transfer.blob_name} ({sums.size / 1024**2:.1f} MB in {seconds:.1f}s, "
+            f"{len(transfer.ranges)} slice(s))"
+        )
+        if verify_gcs_upload(target, sums):
+            print(f"Verification successful for {transfer.blob_name} (crc32c {sums.crc32c})")
+        else:
+            print(
+                f"Verification failed for {transfer.blob_name} (server {target.size} bytes, crc32c {target.crc32c}; "
+                f"slices {sums.size} bytes, crc32c {sums.crc32c})"
+            )
+    finally:
+        if len(transfer.ranges) > 1:
+            leftovers = list(client.list_blobs(bucket, prefix=transfer.slice_prefix))
+            bucket.delete_blobs(leftovers, on_error=lambda blob: None, client=client)
+
+
+def transfer_slices(
+    client: storage.Client,
+    bucket: storage.Bucket,
+    scheduler: TransferScheduler,
+    transfers: dict[str, MonthTransfer],
+    timeout: float = 60,
+    max_retries: int = 3,
+    retry_sleep_sec: float = 5,
+) -> None:
+    """Worker loop: take slices from any month until none are left."""
+    while (task := scheduler.acquire()) is not None:
+        name, index = task
+        transfer = transfers[name]
+        if transfer.started is None:
+            transfer.started = time.perf_counter()
+        sums = (
+            None
+            if transfer.failed
+            else upload_slice(client, bucket, transfer, index, timeout, max_retries, retry_sleep_sec)
+        )
+        if sums is None:
+            transfer.failed = True
+            scheduler.cancel(name)
+        transfer.parts[index] = sums
+        if scheduler.release(name, sums.size if sums else 0):
+            finish_transfer(client, bucket, transfer)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Parquet re-layout for OPTIMIZE=1 in load_yellow_taxi_data.py.
+
+The CloudFront files come with the row groups and compression they were
+written with, so a BigQuery scan filtered on pickup time still reads every
+row group of the month. optimize_parquet rewrites a month so that:
+
+    - rows are sorted by pickup time, so each row group covers a narrow
+      time range and its min/max statistics let the engine skip it
+    - row groups hold about `row_group_bytes` of (uncompressed) data
+    - columns are dictionary encoded and zstd compressed, with statistics
+      and a page index on every column, and the sort order recorded in the
+      file metadata
+
+The sort needs the whole month: the source table is read into memory, and
+only the sort permutation and one output row group are built next to it
+(row groups are gathered one at a time and written out as they are ready).
+That is about 0.75 GB for a month of 3 million yellow trips, so
+load_yellow_taxi_data.py rewrites one month at a time.
+"""
+
+import os
+
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+DEFAULT_ROW_GROUP_BYTES = 64 * 1024**2
+
+
+def optimize_parquet(
+    src: str,
+    dst: str,
+    sort_column: str = "tpep_pickup_datetime",
+    row_group_bytes: int = DEFAULT_ROW_GROUP_BYTES,
+    compression_level: int = 3,
+) -> dict:
+    """Rewrite `src` to `dst` and return the layout before and after."""
+    source = pq.ParquetFile(src)
+    before = {
+        "rows": source.metadata.num_rows,
+        "row_groups": source.metadata.num_row_groups,
+        "bytes": os.path.getsize(src),
+    }
+
+    table = source.read()
+    # Rows with no pickup time go last (the default null placement)
+    order = pc.sort_indices(table, sort_keys=[(sort_column, "ascending")])
+    bytes_per_row = table.nbytes / max(table.num_rows, 1)
+    rows_per_group = max(1, int(row_group_bytes / max(bytes_per_row, 1)))
+
+    tmp = f"{dst}.tmp"
+    with pq.ParquetWriter(
+        tmp,
+        table.schema,
+        compression="zstd",
+        compression_level=compression_level,
+        use_dictionary=True,
+        write_statistics=True,
+        write_page_index=True,
+        sorting_columns=[pq.SortingColumn(table.schema.get_field_index(sort_column))],
+    ) as writer:
+        for start in range(0, table.num_rows, rows_per_group):
+            writer.write_table(table.take(order[start : start + rows_per_group]), row_group_size=rows_per_group)
+    del table, order
+
+    written = pq.ParquetFile(tmp).metadata
+    if written.num_rows != before["rows"]:
+        os.remove(tmp)
+        raise ValueError(f"{src}: rewrote {written.num_rows} rows instead of {before['rows']}")
+    os.replace(tmp, dst)
+
+    after = {"rows": written.num_rows, "row_groups": written.num_row_groups, "bytes": os.path.getsize(dst)}
+    return {"before": before, "after": after}
+
+
+def format_report(name: str, report: dict) -> str:
+    before, after = report["before"], report["after"]
+    saved = before["bytes"] - after["bytes"]
+    return (
+        f"{name}: {after['rows']:,} rows, {before['row_groups']} -> {after['row_groups']} row groups, "
+        f"{before['bytes'] / 1024**2:.1f} MB -> {after['bytes'] / 1024**2:.1f} MB "
+        f"({saved / 1024**2:.1f} MB saved, {100 * saved / max(before['bytes'], 1):.1f}%)"
+    )
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Settings of load_yellow_taxi_data.py, read from the environment.
+
+They are read when the script runs, not when a module is imported, so the
+transfer modules can be imported (by tests, or another script) without a
+bucket or credentials. Settings() raises ValueError for a missing or
+invalid variable; the script prints it and exits with status 1.
+"""
+
+import os
+from collections.abc import Mapping
+
+DEFAULT_BASE_URL = "https://d37ci6vzurychx.cloudfront.net/trip-data/yellow_tripdata_2024-"
+TRANSFER_MODES = ("disk", "stream", "parallel")
+
+
+class Settings:
+    """One run's configuration; the attributes mirror the environment variables."""
+
+    def __init__(self, environ: Mapping[str, str] | None = None):
+        env = os.environ if environ is None else environ
+
+        def required(name: str) -> str:
+            if not env.get(name):
+                raise ValueError(f"{name} is not set; export it from the Terraform outputs (see README.md)")
+            return env[name]
+
+        def number(name: str, default: str, kind=int):
+            try:
+                return kind(env.get(name, default))
+            except ValueError:
+                raise ValueError(f"{name} must be a number, got {env[name]!r}") from None
+
+        # Export these from Terraform outputs before running:
+        #   export BUCKET_NAME="$(terraform output -raw bucket_name)"
+        #   export TARGET_SERVICE_ACCOUNT="$(terraform output -raw target_service_account)"
+        #   export GCP_PROJECT="$(terraform output -raw project_id)"
+        self.project_id = required("GCP_PROJECT")
+        self.bucket_name = required("BUCKET_NAME")
+        # Set to a fake-gcs-server address (e.g. http://localhost:4443) to test without GCP;
+        # no credentials or service account are needed then
+        self.storage_emulator_host = env.get("STORAGE_EMULATOR_HOST")
+        self.target_service_account = (
+            env.get("TARGET_SERVICE_ACCOUNT") if self.storage_emulator_host else required("TARGET_SERVICE_ACCOUNT")
+        )
+
+        # Download settings
+        self.base_url = env.get("BASE_URL", DEFAULT_BASE_URL)
+        self.max_workers = number("MAX_WORKERS", "4")
+        self.max_retries = number("MAX_RETRIES", "3")
+        self.retry_sleep_sec = number("RETRY_SLEEP_SECONDS", "5")
+        self.http_timeout_sec = number("HTTP_TIMEOUT_SECONDS", "60")
+        # The download cache directory is TLC_CACHE_DIR, as in pipeline/scripts_ingest
+        self.cache_max_bytes = int(number("CACHE_MAX_GB", "20", float) * 1024**3)
+
+        # "disk": download every month, then upload them. "stream": pipe each month from
+        # the HTTP response into a resumable upload; nothing is written locally.
+        # "parallel": fetch byte ranges of every month concurrently, upload them as
+        # slices and compose them in GCS; nothing is written locally either.
+        self.transfer_mode = env.get("TRANSFER_MODE", "disk")
+        if self.transfer_mode not in TRANSFER_MODES:
+            raise ValueError(f"TRANSFER_MODE must be 'disk', 'stream' or 'parallel', got {self.transfer_mode!r}")
+        # Chunks read ahead of the upload in stream mode (memory: about CHUNK_SIZE * (depth + 2) per month)
+        self.prefetch_chunks = number("PREFETCH_CHUNKS", "2")
+        # Parallel mode: slice size, and the most slices in flight across all months
+        # (memory: about SLICE_MB per slice in flight)
+        self.slice_bytes = number("SLICE_MB", "16") * 1024**2
+        self.slice_workers = number("SLICE_WORKERS", str(2 * self.max_workers))
+
+        # Rewrite every month before uploading it (disk mode): sorted by pickup time, row
+        # groups of about ROW_GROUP_MB, zstd and dictionary encoding. See parquet_layout.py.
+        self.optimize = env.get("OPTIMIZE", "0") == "1"
+        if self.optimize and self.transfer_mode != "disk":
+            raise ValueError("OPTIMIZE=1 rewrites the downloaded files, so it needs TRANSFER_MODE=disk")
+        self.row_group_bytes = number("ROW_GROUP_MB", "64") * 1024**2
+        self.zstd_level = number("ZSTD_LEVEL", "3")
+
+        # Skip months whose object in the bucket already has the same content; SYNC=0 uploads everything
+        self.sync = env.get("SYNC", "1") != "0"
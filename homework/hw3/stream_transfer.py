@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+TRANSFER_MODE=stream in load_yellow_taxi_data.py: one month goes from the
+HTTP response straight into a GCS resumable upload, with nothing on disk.
+
+Blob.upload_from_file reads the source one chunk at a time and sends it
+before reading the next. PrefetchingReader puts a thread in front of the
+response that keeps the next chunks downloading meanwhile, so the download
+and the upload of a month overlap. The bytes are hashed as they pass, and
+the object is checked against those hashes (gcs_sync.verify_gcs_upload).
+"""
+
+import os
+import queue
+import threading
+import time
+import urllib.request
+
+from google.cloud import storage
+
+from gcs_sync import SOURCE_ETAG_KEY, Checksums, head_source, source_unchanged, verify_gcs_upload
+
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+DEFAULT_PREFETCH_CHUNKS = 2
+
+
+class PrefetchingReader:
+    """
+    Read-only file object over an HTTP response, for Blob.upload_from_file.
+
+    A thread reads the response ahead, at most `depth` blocks, so the next
+    chunk is downloading while the current one uploads. The upload reads
+    forward, one chunk at a time, and only seeks back when the server asks to
+    resend part of the chunk it just read. So only that chunk is kept.
+    """
+
+    def __init__(self, resp, block_size: int = DEFAULT_CHUNK_SIZE, depth: int = DEFAULT_PREFETCH_CHUNKS):
+        self._resp = resp
+        self._queue = queue.Queue(maxsize=max(1, depth))
+        self._closed = threading.Event()
+        self._error = None
+        self._eof = False
+        # Bytes from self._start on: the chunk last read plus what is read ahead of it
+        self._window = b""
+        self._start = 0
+        self._pos = 0
+        # Every byte is hashed once, the first time it is read
+        self.checksums = Checksums()
+        self._thread = threading.Thread(target=self._fill, args=(block_size,), daemon=True)
+        self._thread.start()
+
+    def _fill(self, block_size: int) -> None:
+        try:
+            while not self._closed.is_set():
+                block = self._resp.read(block_size)
+                if not block:
+                    break
+                self._queue.put(block)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._queue.put(None)
+
+    def read(self, size: int = -1) -> bytes:
+        # A new read means the previous chunk was accepted
+        self._window = self._window[self._pos - self._start :]
+        self._start = self._pos
+        blocks = [self._window]
+        have = len(self._window)
+        while not self._eof and (size < 0 or have < size):
+            block = self._queue.get()
+            if block is None:
+                self._eof = True
+                if self._error is not None:
+                    raise self._error
+                break
+            blocks.append(block)
+            have += len(block)
+        self._window = b"".join(blocks)
+        data = self._window if size < 0 else self._window[:size]
+        if self._pos + len(data) > self.checksums.size:
+            self.checksums.update(data[self.checksums.size - self._pos :])
+        self._pos += len(data)
+        return data
+
+    def tell(self) -> int:
+        return self._pos
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        if whence == os.SEEK_END or not self._start <= offset <= self._start + len(self._window):
+            raise OSError(f"cannot seek to {offset} in a stream (buffered {self._start}..{self._pos})")
+        self._pos = offset
+        return offset
+
+    def close(self) -> None:
+        self._closed.set()
+        # Unblock the reader thread if it is waiting for room in the queue
+        while self._thread.is_alive():
+            try:
+                self._queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._resp.close()
+
+
+def stream_to_gcs(
+    client: storage.Client,
+    bucket: storage.Bucket,
+    url: str,
+    blob_name: str,
+    existing: storage.Blob | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    prefetch_chunks: int = DEFAULT_PREFETCH_CHUNKS,
+    timeout: float = 60,
+    max_retries: int = 3,
+    retry_sleep_sec: float = 5,
+) -> None:
+    """
+    Copy `url` to the object `blob_name` without touching local disk.
+
+    The source ETag is stored on the object, so a re-run can tell an unchanged
+    month from a HEAD request instead of downloading it to hash it.
+    """
+    if existing is not None:
+        try:
+            etag, length, _ = head_source(url, timeout)
+            if source_unchanged(existing, etag, length):
+                print(f"Unchanged, skipping: gs://{bucket.name}/{blob_name} (source ETag {etag})")
+                return
+        except Exception as e:
+            print(f"Could not check {url} ({e}); uploading it again")
+
+    for attempt in range(max_retries):
+        try:
+            print(f"Streaming {url} to gs://{bucket.name}/{blob_name} (Attempt {attempt + 1}/{max_retries})...")
+            t0 = time.perf_counter()
+            # Every attempt is a new download and a new resumable upload session
+            blob = bucket.blob(blob_name, chunk_size=chunk_size)
+            resp = urllib.request.urlopen(url, timeout=timeout)
+            length = resp.headers.get("Content-Length")
+            if resp.headers.get("ETag"):
+                blob.metadata = {SOURCE_ETAG_KEY: resp.headers["ETag"]}
+            reader = PrefetchingReader(resp, chunk_size, prefetch_chunks)
+            try:
+                blob.upload_from_file(
+                    reader,
+                    size=int(length) if length else None,
+                    content_type="application/octet-stream",
+                    client=client,
+                    checksum="crc32c",
+                )
+            finally:
+                reader.close()
+
+            streamed = reader.tell()
+            seconds = time.perf_counter() - t0
+            print(
+                f"Uploaded: gs://{bucket.name}/{blob_name} "
+                f"({streamed / 1024**2:.1f} MB in {seconds:.1f}s, {streamed / 1024**2 / max(seconds, 1e-6):.1f} MB/s)"
+            )
+
+            sums = reader.checksums
+            if verify_gcs_upload(blob, sums):
+                print(f"Verification successful for {blob_name} (crc32c {sums.crc32c})")
+                return
+
+            print(
+                f"Verification failed for {blob_name} (server {blob.size} bytes, crc32c {blob.crc32c}; "
+                f"streamed {sums.size} bytes, crc32c {sums.crc32c}), retrying..."
+            )
+        except Exception as e:
+            print(f"Failed to stream {url}: {e}")
+
+        time.sleep(retry_sleep_sec)
+
+    print(f"Giving up on {url} after {max_retries} attempts.")
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The transfer modules are imported by name, as load_yellow_taxi_data.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,61 @@
+import os
+
+import google_crc32c
+import pytest
+
+from gcs_sync import Checksums
+from parallel_transfer import ComposedChecksums, TransferScheduler, crc32c_combine, slice_ranges
+
+DATA = os.urandom(100_003)
+
+
+def checksums(data: bytes) -> Checksums:
+    sums = Checksums()
+    sums.update(data)
+    return sums
+
+
+@pytest.mark.parametrize("split", [0, 1, 7, 4096, 50_000, len(DATA) - 1, len(DATA)])
+def test_crc32c_combine_matches_the_whole(split):
+    head, tail = DATA[:split], DATA[split:]
+    combined = crc32c_combine(google_crc32c.value(head), google_crc32c.value(tail), len(tail))
+    assert combined == google_crc32c.value(DATA)
+
+
+def test_composed_checksums_match_the_file():
+    parts = [checksums(DATA[start : end + 1]) for start, end in slice_ranges(len(DATA), 8192)]
+    composed = ComposedChecksums(parts)
+    whole = checksums(DATA)
+    assert (composed.size, composed.crc32c, composed.md5) == (whole.size, whole.crc32c, None)
+
+
+@pytest.mark.parametrize(
+    "size, slice_size, ranges",
+    [
+        (10, 4, [(0, 3), (4, 7), (8, 9)]),
+        (8, 4, [(0, 3), (4, 7)]),
+        (3, 4, [(0, 2)]),
+        (0, 4, []),
+    ],
+)
+def test_slice_ranges(size, slice_size, ranges):
+    assert slice_ranges(size, slice_size) == ranges
+
+
+def test_scheduler_serves_the_file_with_most_bytes_left():
+    scheduler = TransferScheduler({"a": slice_ranges(30, 10), "b": slice_ranges(15, 10)}, max_workers=1)
+    order = []
+    while (job := scheduler.acquire()) is not None:
+        order.append(job)
+        scheduler.release(job[0], 10)
+    assert order == [("a", 0), ("a", 1), ("b", 0), ("a", 2), ("b", 1)]
+
+
+def test_scheduler_reports_the_last_slice_and_cancel():
+    scheduler = TransferScheduler({"a": slice_ranges(30, 10)}, max_workers=2)
+    first = scheduler.acquire()
+    second = scheduler.acquire()
+    scheduler.cancel("a")
+    assert scheduler.acquire() is None
+    assert scheduler.release(first[0], 0) is False
+    assert scheduler.release(second[0], 0) is True
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Ingest benchmark: sweeps insert methods, parsers, chunk sizes and row counts
+against a local Postgres (pipeline/docker-compose.yaml) using seeded fixture
+files from generate_trips.py, and writes the results as JSON.
+
+    python benchmark.py --rows 100000,1000000 --output results.json
+    python benchmark.py --output results.json --baseline baseline.json
+
+Each case runs in a fresh process so its peak RSS is its own. With --baseline,
+cases whose rows/sec dropped by more than --tolerance are reported and the
+command exits non-zero.
+"""
+
+import json
+import os
+import platform
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import click
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+from generate_trips import write_trips
+from ingest_data import SQL_TYPES, open_arrow_csv_iterator, open_csv_iterator, serialize_chunk, write_chunk
+from pg_binary_copy import BinaryCopyEncoder, is_arrow
+
+BENCH_TABLE = "bench_ingest"
+
+
+def fixture_path(fixtures_dir: str, rows: int, seed: int) -> str:
+    path = os.path.join(fixtures_dir, f"yellow_bench_{rows}_seed{seed}.csv.gz")
+    if not os.path.exists(path):
+        os.makedirs(fixtures_dir, exist_ok=True)
+        print(f"Generating fixture {path}")
+        write_trips(path, "yellow", rows, 2021, 1, seed)
+    return path
+
+
+def run_case(pg_url: str, schema: str, fixture: str, insert_method: str, parser: str, chunk_size: int) -> dict:
+    """
+    Load one fixture and time each stage separately: parse (reading the next
+    chunk), serialize (building the COPY payload) and load (sending it).
+    Runs in its own process; peak RSS is read at the end.
+    """
+    engine = create_engine(pg_url)
+    open_iterator = open_arrow_csv_iterator if parser == "arrow" else open_csv_iterator
+    encoder = BinaryCopyEncoder(SQL_TYPES)
+    stages = {"parse": 0.0, "serialize": 0.0, "load": 0.0}
+    rows = 0
+
+    t_start = time.perf_counter()
+    with engine.connect() as conn:
+        trans = conn.begin()
+        # Opening counts as parsing: the Arrow reader decodes its first block up front
+        t0 = time.perf_counter()
+        it = iter(open_iterator(fixture, chunk_size=chunk_size))
+        stages["parse"] += time.perf_counter() - t0
+        first = True
+        while True:
+            t0 = time.perf_counter()
+            chunk = next(it, None)
+            t1 = time.perf_counter()
+            stages["parse"] += t1 - t0
+            if chunk is None:
+                break
+
+            if first:
+                empty = chunk.schema.empty_table().to_pandas() if is_arrow(chunk) else chunk.head(0)
+                empty.to_sql(BENCH_TABLE, conn, schema=schema, if_exists="replace", index=False, dtype=SQL_TYPES)
+                first = False
+
+            payload = serialize_chunk(chunk, insert_method, SQL_TYPES, encoder)
+            t2 = time.perf_counter()
+            write_chunk(conn, chunk, BENCH_TABLE, schema, insert_method, 2_000, SQL_TYPES, payload)
+            t3 = time.perf_counter()
+            stages["serialize"] += t2 - t1
+            stages["load"] += t3 - t2
+            rows += len(chunk)
+        trans.commit()
+    elapsed = time.perf_counter() - t_start
+
+    with engine.begin() as conn:
+        conn.execute(text(f'DROP TABLE IF EXISTS {schema}."{BENCH_TABLE}"'))
+    engine.dispose()
+
+    return {
+        "rows": rows,
+        "seconds": elapsed,
+        "rows_per_sec": rows / elapsed if elapsed else 0.0,
+        "stages": stages,
+        # ru_maxrss is in KiB on Linux
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def case_key(case: dict) -> str:
+    return f"{case['insert_method']}/{case['parser']}/chunk={case['chunk_size']}/rows={case['rows']}"
+
+
+def compare_to_baseline(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    by_key = {case_key(b): b for b in baseline}
+    regressions = []
+    print(f"\n{'case':<48} {'baseline':>12} {'current':>12} {'change':>8}")
+    for r in results:
+        b = by_key.get(case_key(r))
+        if b is None:
+            print(f"{case_key(r):<48} {'-':>12} {r['rows_per_sec']:>12,.0f} {'new':>8}")
+            continue
+        change = r["rows_per_sec"] / b["rows_per_sec"] - 1 if b["rows_per_sec"] else 0.0
+        flag = ""
+        if change < -tolerance:
+            regressions.append(case_key(r))
+            flag = "  REGRESSION"
+        print(f"{case_key(r):<48} {b['rows_per_sec']:>12,.0f} {r['rows_per_sec']:>12,.0f} {change:>+8.1%}{flag}")
+    return regressions
+
+
+def split_list(value: str, cast=str) -> list:
+    return [cast(v.strip()) for v in value.split(",") if v.strip()]
+
+
+@click.command()
+@click.option("--pg-host", default="localhost", show_default=True)
+@click.option("--pg-port", type=int, default=5432, show_default=True)
+@click.option("--pg-db", default="ny_taxi", show_default=True)
+@click.option("--pg-user", default="root", show_default=True)
+@click.option("--pg-pass", default="root", show_default=True)
+@click.option("--schema", default="public", show_default=True)
+@click.option("--methods", default="copy,copy-binary,multi", show_default=True, help="Insert methods to sweep")
+@click.option("--parsers", default="pandas,arrow", show_default=True, help="CSV parsers to sweep")
+@click.option("--chunk-sizes", default="50000,100000,200000", show_default=True)
+@click.option("--rows", "row_counts", default="100000,500000", show_default=True, help="Fixture sizes")
+@click.option("--seed", type=int, default=42, show_default=True)
+@click.option("--repeat", type=int, default=3, show_default=True, help="Runs per case; the median is kept")
+@click.option("--fixtures-dir", default="bench_fixtures", show_default=True)
+@click.option("--output", default="bench_results.json", show_default=True)
+@click.option("--baseline", default=None, help="Previous results file to compare against")
+@click.option("--tolerance", type=float, default=0.10, show_default=True, help="Allowed rows/sec drop vs baseline")
+def main(
+    pg_host, pg_port, pg_db, pg_user, pg_pass, schema,
+    methods, parsers, chunk_sizes, row_counts, seed, repeat,
+    fixtures_dir, output, baseline, tolerance
+):
+    pg_url = f"postgresql://{pg_user}:{pg_pass}@{pg_host}:{pg_port}/{pg_db}"
+    with create_engine(pg_url).connect() as conn:
+        server_version = conn.execute(text("SHOW server_version")).scalar()
+
+    results = []
+    for rows in split_list(row_counts, int):
+        fixture = fixture_path(fixtures_dir, rows, seed)
+        for method in split_list(methods):
+            for parser in split_list(parsers):
+                for chunk_size in split_list(chunk_sizes, int):
+                    runs = []
+                    for _ in range(repeat):
+                        # Fresh process per run so peak RSS is not inherited
+                        with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as ex:
+                            runs.append(
+                                ex.submit(run_case, pg_url, schema, fixture, method, parser, chunk_size).result()
+                            )
+                    median = sorted(runs, key=lambda r: r["seconds"])[len(runs) // 2]
+                    case = {
+                        "insert_method": method,
+                        "parser": parser,
+                        "chunk_size": chunk_size,
+                        "rows": rows,
+                        "seconds": median["seconds"],
+                        "rows_per_sec": median["rows_per_sec"],
+                        "stages": median["stages"],
+                        "peak_rss_mb": max(r["peak_rss_mb"] for r in runs),
+                        "runs": [r["seconds"] for r in runs],
+                    }
+                    results.append(case)
+                    stages = " ".join(f"{k}={v:.2f}s" for k, v in case["stages"].items())
+                    print(
+                        f"{case_key(case):<48} {case['rows_per_sec']:>12,.0f} rows/s  "
+                        f"{stages}  rss={case['peak_rss_mb']:.0f}MB"
+                    )
+
+    report = {
+        "meta": {
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "host": platform.node(),
+            "cpu_count": os.cpu_count(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "postgres": server_version,
+            "seed": seed,
+        },
+        "results": results,
+    }
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            regressions = compare_to_baseline(results, json.load(f)["results"], tolerance)
+        if regressions:
+            raise click.ClickException(f"{len(regressions)} case(s) regressed by more than {tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
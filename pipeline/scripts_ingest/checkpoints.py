@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Row-offset checkpoints for ingest_data --commit-every.
+
+Every commit writes the number of source rows already stored for
+(source_url, target_table) in the same transaction as the rows themselves,
+so the checkpoint can never get ahead of or fall behind the data.
+A finished load removes its checkpoint.
+
+A resumed file is reopened with skip_data_rows(): the committed rows are passed
+over by counting newlines in the decompressed bytes, not handed to the CSV
+parser to be tokenized and thrown away.
+"""
+
+import io
+
+from sqlalchemy import text
+
+CHECKPOINT_TABLE = "ingest_checkpoints"
+BLOCK_SIZE = 1024 * 1024
+
+
+def ensure_checkpoint_table(conn, schema: str) -> None:
+    conn.execute(
+        text(
+            f"""
+            CREATE TABLE IF NOT EXISTS {schema}.{CHECKPOINT_TABLE} (
+                source_url     text        NOT NULL,
+                target_table   text        NOT NULL,
+                rows_committed bigint      NOT NULL,
+                updated_at     timestamptz NOT NULL DEFAULT now(),
+                PRIMARY KEY (source_url, target_table)
+            )
+            """
+        )
+    )
+
+
+def read_checkpoint(conn, schema: str, source_url: str, target_table: str) -> int:
+    rows = conn.execute(
+        text(
+            f"SELECT rows_committed FROM {schema}.{CHECKPOINT_TABLE} "
+            "WHERE source_url = :url AND target_table = :table"
+        ),
+        {"url": source_url, "table": target_table},
+    ).scalar()
+    return rows or 0
+
+
+def save_checkpoint(conn, schema: str, source_url: str, target_table: str, rows_committed: int) -> None:
+    conn.execute(
+        text(
+            f"""
+            INSERT INTO {schema}.{CHECKPOINT_TABLE} (source_url, target_table, rows_committed)
+            VALUES (:url, :table, :rows)
+            ON CONFLICT (source_url, target_table)
+            DO UPDATE SET rows_committed = EXCLUDED.rows_committed, updated_at = now()
+            """
+        ),
+        {"url": source_url, "table": target_table, "rows": rows_committed},
+    )
+
+
+def clear_checkpoint(conn, schema: str, source_url: str, target_table: str) -> None:
+    conn.execute(
+        text(
+            f"DELETE FROM {schema}.{CHECKPOINT_TABLE} "
+            "WHERE source_url = :url AND target_table = :table"
+        ),
+        {"url": source_url, "table": target_table},
+    )
+
+
+class _SkippedRows(io.RawIOBase):
+    def __init__(self, head: bytes, stream):
+        self._head = head
+        self._stream = stream
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        if self._head:
+            n = min(len(b), len(self._head))
+            b[:n] = self._head[:n]
+            self._head = self._head[n:]
+            return n
+        data = self._stream.read(len(b))
+        b[: len(data)] = data
+        return len(data)
+
+    def close(self) -> None:
+        if not self.closed:
+            self._stream.close()
+        super().close()
+
+
+def skip_data_rows(stream, rows: int, block_size: int = BLOCK_SIZE) -> io.BufferedReader:
+    """
+    Wrap the decompressed binary CSV `stream` so that it reads as the header
+    line followed by everything after the first `rows` data lines. The skipped
+    lines are only scanned for newlines; TLC files have no quoted line breaks,
+    so a line is a row. Closing the result closes `stream`.
+    """
+    try:
+        buf = b""
+        while b"\n" not in buf:
+            block = stream.read(block_size)
+            if not block:
+                break
+            buf += block
+        header, newline, rest = buf.partition(b"\n")
+        header += newline
+
+        left = rows
+        while left:
+            found = rest.count(b"\n")
+            if found >= left:
+                pos = -1
+                for _ in range(left):
+                    pos = rest.index(b"\n", pos + 1)
+                rest = rest[pos + 1 :]
+                break
+            left -= found
+            rest = stream.read(block_size)
+            if not rest:
+                break  # fewer rows than committed: nothing left to load
+    except BaseException:
+        stream.close()
+        raise
+    return io.BufferedReader(_SkippedRows(header + rest, stream), buffer_size=block_size)
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Adaptive chunk sizing for --memory-budget.
+
+A fixed --chunk-size is either too small to amortize COPY round-trips or big
+enough to run a container out of memory. AdaptiveChunkSizer picks the size of
+the next chunk from what the previous ones cost:
+
+    memory      bytes per row of the parsed chunk plus its serialized payload,
+                times a safety factor and the number of chunks in flight, must
+                fit in the budget left after the process's baseline RSS. If the
+                RSS still gets close to the budget, the size is halved.
+    throughput  starting from the initial size, the chunk size doubles while
+                COPY rows/sec keeps improving by more than 5%. If it stops
+                improving, the size stays. If it gets clearly worse, the size
+                returns to the best one seen.
+
+homework/hw1/scripts_ingest imports this module from here; its Docker image
+copies it in from the pipeline_scripts build context.
+"""
+
+import re
+import resource
+
+import pyarrow as pa
+
+_SIZE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*$", re.IGNORECASE)
+_UNITS = {"": 1, "k": 1024, "m": 1024**2, "g": 1024**3, "t": 1024**4}
+
+
+def parse_size(value: str) -> int:
+    """'512MB', '2G', '1.5GiB' or a plain byte count -> bytes."""
+    m = _SIZE.match(str(value))
+    if not m:
+        raise ValueError(f"expected a size like 512MB or 2G, got {value!r}")
+    return int(float(m.group(1)) * _UNITS[m.group(2).lower()])
+
+
+def current_rss() -> int:
+    """Resident set size of this process in bytes (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def check_memory_budget(memory_budget: int) -> int:
+    """Raise ValueError unless `memory_budget` is above the current RSS, which is returned."""
+    rss = current_rss()
+    if memory_budget <= rss:
+        raise ValueError(
+            f"memory budget of {memory_budget / 1024**2:.0f} MB is below the "
+            f"{rss / 1024**2:.0f} MB the process already uses"
+        )
+    return rss
+
+
+def chunk_nbytes(chunk) -> int:
+    if isinstance(chunk, (pa.Table, pa.RecordBatch)):
+        return chunk.nbytes
+    return int(chunk.memory_usage(deep=True).sum())
+
+
+class AdaptiveChunkSizer:
+    # Parser buffers and temporaries on top of the chunk and its payload
+    SAFETY_FACTOR = 2.0
+    # Halve the chunk size when RSS goes above this share of the budget
+    RSS_HIGH_WATER = 0.9
+
+    def __init__(
+        self,
+        memory_budget: int,
+        initial_rows: int = 50_000,
+        min_rows: int = 1_000,
+        max_rows: int = 5_000_000,
+        inflight: int = 1,
+    ):
+        self.memory_budget = memory_budget
+        self.baseline_rss = check_memory_budget(memory_budget)
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.inflight = max(1, inflight)
+
+        self.chunk_size = max(min_rows, min(initial_rows, max_rows))
+        self.bytes_per_row = None
+        self.growing = True
+        self.best = None  # (chunk size, rows/sec)
+
+    def memory_cap(self) -> int:
+        if not self.bytes_per_row:
+            return self.max_rows
+        available = self.memory_budget - self.baseline_rss
+        return int(available / (self.bytes_per_row * self.SAFETY_FACTOR * self.inflight))
+
+    def observe(self, rows: int, chunk_bytes: int, payload_bytes: int, seconds: float) -> int:
+        """Record one loaded chunk and return the size for the next one."""
+        if rows <= 0:
+            return self.chunk_size
+
+        bpr = (chunk_bytes + payload_bytes) / rows
+        self.bytes_per_row = bpr if self.bytes_per_row is None else 0.7 * self.bytes_per_row + 0.3 * bpr
+        rate = rows / seconds if seconds > 0 else float("inf")
+
+        size = self.chunk_size
+        if current_rss() > self.RSS_HIGH_WATER * self.memory_budget:
+            size //= 2
+            self.growing = False
+        elif rows != size:
+            pass  # last chunk, or read ahead at an earlier size: says nothing about this one
+        elif self.best is None or rate > self.best[1] * 1.05:
+            self.best = (size, rate)
+            if self.growing:
+                size *= 2
+        elif rate < self.best[1] * 0.9:
+            # Bigger chunks made COPY slower: go back to the best size and stay
+            size = self.best[0]
+            self.growing = False
+        else:
+            self.growing = False
+
+        self.chunk_size = max(self.min_rows, min(size, self.memory_cap(), self.max_rows))
+        return self.chunk_size
+
+    def summary(self) -> str:
+        best = f", best COPY rate {self.best[1]:,.0f} rows/s at {self.best[0]} rows" if self.best else ""
+        bpr = f"{self.bytes_per_row:,.0f}" if self.bytes_per_row else "?"
+        return (
+            f"Adaptive chunk size: {self.chunk_size} rows ({bpr} bytes/row, cap {self.memory_cap()} rows "
+            f"for a {self.memory_budget / 1024**2:.0f} MB budget{best})"
+        )
+
+
+def rebatch(batches, chunk_size: int, sizer: AdaptiveChunkSizer | None = None):
+    """
+    Regroup Arrow record batches into Tables of `chunk_size` rows, or of
+    `sizer.chunk_size` rows as it changes.
+    """
+    pending = []
+    pending_rows = 0
+    for batch in batches:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= (size := sizer.chunk_size if sizer else chunk_size):
+            table = pa.Table.from_batches(pending)
+            yield table.slice(0, size)
+            rest = table.slice(size)
+            pending = rest.to_batches()
+            pending_rows = rest.num_rows
+    if pending_rows:
+        yield pa.Table.from_batches(pending)
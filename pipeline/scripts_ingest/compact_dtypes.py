@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Compact column types for `ingest_data --compact-dtypes`.
+
+The default schema reads every code column (VendorID, RatecodeID, payment_type,
+the location IDs, ...) as Int64 / BIGINT and store_and_fwd_flag as a string /
+VARCHAR, although their values are tiny. In compact mode each parsed chunk is
+validated and downcast: codes to Int8, location IDs to Int16 and the flag to a
+categorical (int8 / int16 / dictionary for Arrow chunks). The table gets
+SMALLINT and CHAR(1) columns, since Postgres has no 1-byte integer.
+
+Validation runs on every chunk. If a chunk holds a value that does not fit (a
+code above 127, a flag longer than one character), that column falls back to
+its default type for the rest of the load. Before that chunk is written, the
+table column is widened with ALTER TABLE. Fallbacks only ever widen, so a
+chunk is never narrower than the table it goes to.
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy import text
+from sqlalchemy.types import CHAR, SmallInteger
+
+from pg_binary_copy import is_arrow
+
+FLAG_COLUMN = "store_and_fwd_flag"
+
+# column -> (pandas dtype, Arrow type, SQL type, Postgres data_type)
+COMPACT_TYPES = {
+    "VendorID": ("Int8", pa.int8(), SmallInteger(), "smallint"),
+    "passenger_count": ("Int8", pa.int8(), SmallInteger(), "smallint"),
+    "RatecodeID": ("Int8", pa.int8(), SmallInteger(), "smallint"),
+    "payment_type": ("Int8", pa.int8(), SmallInteger(), "smallint"),
+    "trip_type": ("Int8", pa.int8(), SmallInteger(), "smallint"),
+    "PULocationID": ("Int16", pa.int16(), SmallInteger(), "smallint"),
+    "DOLocationID": ("Int16", pa.int16(), SmallInteger(), "smallint"),
+    FLAG_COLUMN: ("category", pa.dictionary(pa.int32(), pa.string()), CHAR(1), "character"),
+}
+
+
+def is_compact(chunk, col: str) -> bool:
+    if is_arrow(chunk):
+        arrow_type = chunk.schema.field(col).type
+        return pa.types.is_dictionary(arrow_type) if col == FLAG_COLUMN else arrow_type == COMPACT_TYPES[col][1]
+    return str(chunk[col].dtype) == COMPACT_TYPES[col][0]
+
+
+def _fits(values, col: str) -> bool:
+    if col == FLAG_COLUMN:
+        if isinstance(values, pa.ChunkedArray):
+            longest = pc.max(pc.utf8_length(values)).as_py()
+        else:
+            longest = values.str.len().max()
+        return longest is None or pd.isna(longest) or longest <= 1
+
+    info = np.iinfo(COMPACT_TYPES[col][0].lower())
+    if isinstance(values, pa.ChunkedArray):
+        lo, hi = pc.min_max(values).as_py().values()
+    else:
+        lo, hi = values.min(), values.max()
+    if lo is None or pd.isna(lo):
+        return True  # all NULL
+    return info.min <= lo and hi <= info.max
+
+
+def _downcast(values, col: str):
+    pandas_dtype, arrow_type, _, _ = COMPACT_TYPES[col]
+    if isinstance(values, pa.ChunkedArray):
+        return values.dictionary_encode() if col == FLAG_COLUMN else values.cast(arrow_type)
+    return values.astype(pandas_dtype)
+
+
+class CompactSchema:
+    """Per-load state: which columns still use compact types, in the chunks and in the table."""
+
+    def __init__(self, sql_types: dict):
+        self.default_sql_types = sql_types
+        self.columns = [c for c in COMPACT_TYPES if c in sql_types]
+        # Columns that got a value too wide for the compact type
+        self.fallback = set()
+        # Column -> whether the load table currently has the compact type
+        self.table_types = {}
+
+    def apply(self, chunk):
+        """Validate a parsed chunk and downcast the columns whose values fit."""
+        for col in self.columns:
+            if col in self.fallback:
+                continue
+            values = chunk[col]
+            if _fits(values, col):
+                values = _downcast(values, col)
+                if is_arrow(chunk):
+                    chunk = chunk.set_column(chunk.schema.get_field_index(col), col, values)
+                else:
+                    chunk[col] = values
+            else:
+                self.fallback.add(col)
+                print(f"{col}: values do not fit {COMPACT_TYPES[col][2].compile()}; using the default type from now on")
+        return chunk
+
+    def sql_types(self, chunk) -> dict:
+        """The SQL types matching this chunk's columns."""
+        types = dict(self.default_sql_types)
+        types.update({c: COMPACT_TYPES[c][2] for c in self.columns if is_compact(chunk, c)})
+        return types
+
+    def sync(self, conn, schema: str, table: str) -> None:
+        """Read the column types of an existing table; columns it has widened are not downcast again."""
+        rows = conn.execute(
+            text(
+                "SELECT column_name, data_type FROM information_schema.columns "
+                "WHERE table_schema = :schema AND table_name = :table"
+            ),
+            {"schema": schema, "table": table},
+        )
+        self.table_types = {}
+        for name, data_type in rows:
+            if name in self.columns:
+                self.table_types[name] = data_type == COMPACT_TYPES[name][3]
+                if not self.table_types[name]:
+                    self.fallback.add(name)
+
+    def widen(self, conn, schema: str, table: str, chunk) -> None:
+        """ALTER table columns that are compact while this chunk's are not."""
+        for col in self.columns:
+            if self.table_types.get(col) and not is_compact(chunk, col):
+                sql_type = self.default_sql_types[col].compile(dialect=conn.dialect)
+                print(f"Widening {schema}.{table}.{col} to {sql_type}")
+                conn.execute(text(f'ALTER TABLE {schema}."{table}" ALTER COLUMN "{col}" TYPE {sql_type}'))
+                self.table_types[col] = False
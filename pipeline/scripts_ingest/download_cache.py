@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Content-addressed on-disk cache for the TLC source files.
+
+    <root>/objects/<sha256><ext>   downloaded files, named by their content hash
+    <root>/urls/<key>.json         url -> object, plus ETag / Last-Modified
+    <root>/partial/<key>.part      interrupted downloads (+ .json with validators)
+    <root>/locks/<key>.lock        one downloader per url across processes
+    <root>/locks/objects.lock      eviction (exclusive) vs. handing out a path (shared)
+
+A cached file is revalidated with If-None-Match / If-Modified-Since, so a repeat
+load of the same month costs one small request, and the cached copy is still
+used when the server cannot be reached. Interrupted downloads resume with a Range request
+guarded by If-Range. Every download is checked against the server-reported
+length and, when the ETag is a plain MD5, against that too. The cache is kept
+under `max_bytes` by evicting the least recently used objects.
+
+Several processes share one cache directory: backfill workers, and the hw3
+loader, which imports this module from here and uses the same default
+directory. An object's mtime is its LRU clock; fetch() touches it under a
+shared lock, and evict() holds that lock exclusively and skips objects touched
+within `grace_sec`. A path returned by fetch() therefore stays on disk at least
+that long, enough for the caller to open it (an open file survives eviction).
+"""
+
+import fcntl
+import hashlib
+import json
+import os
+import re
+import time
+import urllib.error
+import urllib.request
+from contextlib import contextmanager
+
+DEFAULT_CACHE_DIR = os.environ.get("TLC_CACHE_DIR", os.path.expanduser("~/.cache/nyc-tlc"))
+DEFAULT_MAX_BYTES = 20 * 1024**3
+# Objects fetched more recently than this are never evicted
+DEFAULT_GRACE_SEC = 15 * 60
+OBJECTS_LOCK = "objects"
+BLOCK_SIZE = 1024 * 1024
+
+_MD5_ETAG = re.compile(r'^(?:W/)?"?([0-9a-fA-F]{32})"?$')
+_CONTENT_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+
+class ChecksumError(Exception):
+    pass
+
+
+def _url_key(url: str) -> str:
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+
+def _suffix(url: str) -> str:
+    # Keep the extension(s) so readers can infer compression / format
+    name = url.rsplit("/", 1)[-1].split("?", 1)[0]
+    parts = name.split(".")
+    return "." + ".".join(parts[1:]) if len(parts) > 1 else ""
+
+
+def _read_json(path: str) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class DownloadCache:
+    def __init__(
+        self,
+        root: str = DEFAULT_CACHE_DIR,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        retries: int = 3,
+        backoff_sec: int = 2,
+        timeout: int = 60,
+        grace_sec: int = DEFAULT_GRACE_SEC,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.grace_sec = grace_sec
+        self.retries = retries
+        self.backoff_sec = backoff_sec
+        self.timeout = timeout
+        for sub in ("objects", "urls", "partial", "locks"):
+            os.makedirs(os.path.join(root, sub), exist_ok=True)
+
+    # ------------------------------------------------------------------ paths
+
+    def _object_path(self, name: str) -> str:
+        return os.path.join(self.root, "objects", name)
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.root, "urls", f"{key}.json")
+
+    def _partial_path(self, key: str) -> str:
+        return os.path.join(self.root, "partial", f"{key}.part")
+
+    @contextmanager
+    def _lock(self, key: str, shared: bool = False):
+        with open(os.path.join(self.root, "locks", f"{key}.lock"), "w") as f:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    # ------------------------------------------------------------------ public
+
+    def fetch(self, url: str, sha256: str | None = None) -> str:
+        """
+        Return a local path with the content of `url`, downloading or
+        revalidating as needed. `sha256` optionally pins the expected content.
+        """
+        key = _url_key(url)
+        while True:
+            path = self._fetch_locked(url, key, sha256)
+            # An object revalidated with a 304 may be old enough to be evicted
+            # before it is touched; the objects lock makes the check and the
+            # touch atomic with respect to evict()
+            with self._lock(OBJECTS_LOCK, shared=True):
+                if os.path.exists(path):
+                    os.utime(path)  # LRU clock, and the start of the grace period
+                    break
+            print(f"Cached copy of {url} was evicted meanwhile; fetching it again")
+        self.evict()
+        return path
+
+    def _fetch_locked(self, url: str, key: str, sha256: str | None) -> str:
+        with self._lock(key):
+            meta = _read_json(self._meta_path(key))
+            cached = self._object_path(meta["object"]) if meta else None
+            if cached and not os.path.exists(cached):
+                meta = cached = None
+            if cached and sha256 and meta["sha256"] != sha256:
+                meta = cached = None
+
+            last_err = None
+            for attempt in range(1, self.retries + 1):
+                try:
+                    path = self._download(url, key, meta)
+                    break
+                except urllib.error.HTTPError as e:
+                    if e.code < 500 and e.code != 429:
+                        raise
+                    last_err = e
+                except (OSError, ChecksumError) as e:
+                    last_err = e
+                if attempt < self.retries:
+                    time.sleep(self.backoff_sec * attempt)
+            else:
+                if cached:
+                    # Server unreachable: the cached copy is better than nothing
+                    print(f"Using cached copy of {url} without revalidation: {last_err}")
+                    path = cached
+                else:
+                    raise last_err
+
+            if sha256 and _read_json(self._meta_path(key))["sha256"] != sha256:
+                raise ChecksumError(f"{url}: content does not match the expected sha256 {sha256}")
+            return path
+
+    def evict(self) -> list[str]:
+        """
+        Delete least recently used objects until the cache fits in max_bytes.
+        Objects touched within grace_sec are kept even if the cache stays over
+        the limit, since another process may be about to open them.
+        """
+        objects_dir = os.path.join(self.root, "objects")
+        with self._lock(OBJECTS_LOCK):
+            entries = []
+            for name in os.listdir(objects_dir):
+                path = os.path.join(objects_dir, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            in_use_after = time.time() - self.grace_sec
+            removed = []
+            for mtime, size, path in sorted(entries):
+                if total <= self.max_bytes or mtime >= in_use_after:
+                    # Sorted by mtime: everything after this is newer still
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed.append(path)
+        return removed
+
+    # --------------------------------------------------------------- internals
+
+    def _download(self, url: str, key: str, meta: dict | None) -> str:
+        partial = self._partial_path(key)
+        partial_meta = _read_json(f"{partial}.json") or {}
+        offset = os.path.getsize(partial) if os.path.exists(partial) else 0
+
+        headers = {}
+        if meta:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+        elif offset:
+            validator = partial_meta.get("etag") or partial_meta.get("last_modified")
+            if validator:
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = validator
+            else:
+                offset = 0
+
+        try:
+            resp = urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=self.timeout)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and meta:
+                return self._object_path(meta["object"])
+            if e.code == 416:
+                # Partial file is stale or already complete; start over on retry
+                os.remove(partial)
+                raise OSError(f"{url}: range not satisfiable, restarting download") from e
+            raise
+
+        with resp:
+            etag = resp.headers.get("ETag")
+            last_modified = resp.headers.get("Last-Modified")
+            if resp.status == 206:
+                m = _CONTENT_RANGE.match(resp.headers.get("Content-Range", ""))
+                if not m or int(m.group(1)) != offset:
+                    raise OSError(f"{url}: unexpected Content-Range {resp.headers.get('Content-Range')!r}")
+                total = int(m.group(3)) if m.group(3) != "*" else None
+                mode = "ab"
+            else:
+                length = resp.headers.get("Content-Length")
+                total = int(length) if length else None
+                offset = 0
+                mode = "wb"
+
+            _write_json(f"{partial}.json", {"url": url, "etag": etag, "last_modified": last_modified})
+            with open(partial, mode) as out:
+                while True:
+                    block = resp.read(BLOCK_SIZE)
+                    if not block:
+                        break
+                    out.write(block)
+
+        return self._commit(url, key, partial, total, etag, last_modified)
+
+    def _commit(self, url, key, partial, total, etag, last_modified) -> str:
+        size = os.path.getsize(partial)
+        if total is not None and size != total:
+            raise OSError(f"{url}: incomplete download ({size} of {total} bytes)")
+
+        sha = hashlib.sha256()
+        md5 = hashlib.md5()
+        with open(partial, "rb") as f:
+            while True:
+                block = f.read(BLOCK_SIZE)
+                if not block:
+                    break
+                sha.update(block)
+                md5.update(block)
+
+        m = _MD5_ETAG.match(etag or "")
+        if m and m.group(1).lower() != md5.hexdigest():
+            os.remove(partial)
+            raise ChecksumError(f"{url}: MD5 {md5.hexdigest()} does not match ETag {etag}")
+
+        name = sha.hexdigest() + _suffix(url)
+        os.replace(partial, self._object_path(name))
+        try:
+            os.remove(f"{partial}.json")
+        except FileNotFoundError:
+            pass
+
+        _write_json(
+            self._meta_path(key),
+            {
+                "url": url,
+                "object": name,
+                "sha256": sha.hexdigest(),
+                "size": size,
+                "etag": etag,
+                "last_modified": last_modified,
+                "fetched_at": time.time(),
+            },
+        )
+        print(f"Cached {url} ({size} bytes)")
+        return self._object_path(name)
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+DuckDB target for `ingest_data --target duckdb:<path>`.
+
+Chunks go to DuckDB as they come out of the parser: the Arrow table
+(--parser arrow) or pandas DataFrame is registered as a view and appended with
+`INSERT INTO ... BY NAME SELECT * FROM chunk`. DuckDB scans the Arrow buffers
+or NumPy arrays in place, so no CSV or binary COPY payload is built.
+
+A month is loaded in one transaction, as on Postgres. With if_exists="replace"
+the first chunk recreates the table (CREATE OR REPLACE TABLE ... AS), and
+readers keep seeing the previous table until the commit. Column types follow
+the chunks (BIGINT, DOUBLE, VARCHAR, TIMESTAMP); zone names, which are
+categoricals / dictionaries in memory, are stored as VARCHAR, not ENUM.
+
+A DuckDB file has a single writer, so a --months backfill loads the months
+one after another over one connection; DuckDB parallelizes each INSERT itself.
+"""
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+TARGET_PREFIX = "duckdb:"
+
+
+def parse_target(value: str) -> str | None:
+    """'postgres' -> None, 'duckdb:<path>' -> path."""
+    if value == "postgres":
+        return None
+    if value.startswith(TARGET_PREFIX) and value[len(TARGET_PREFIX):]:
+        return value[len(TARGET_PREFIX):]
+    raise ValueError(f"expected 'postgres' or 'duckdb:<path>', got {value!r}")
+
+
+def duckdb_schema(schema: str) -> str:
+    # --schema defaults to Postgres' public; DuckDB's default schema is main
+    return "main" if schema == "public" else schema
+
+
+def connect(path: str, schema: str = "main") -> duckdb.DuckDBPyConnection:
+    con = duckdb.connect(path)
+    con.execute(f'CREATE SCHEMA IF NOT EXISTS "{schema}"')
+    return con
+
+
+def table_exists(con, schema: str, table_name: str) -> bool:
+    return con.execute(
+        "SELECT count(*) FROM information_schema.tables WHERE table_schema = ? AND table_name = ?",
+        [schema, table_name],
+    ).fetchone()[0] > 0
+
+
+def _dictionary_columns(chunk) -> list[str]:
+    if isinstance(chunk, (pa.Table, pa.RecordBatch)):
+        return [f.name for f in chunk.schema if pa.types.is_dictionary(f.type)]
+    return [c for c, t in chunk.dtypes.items() if isinstance(t, pd.CategoricalDtype)]
+
+
+def append_chunk(con, schema: str, table_name: str, chunk, create: str | None = None) -> None:
+    """
+    Append one pandas or Arrow chunk. `create` is None to insert into the
+    existing table, "replace" or "create" to (re)create it from this chunk.
+    """
+    target = f'"{schema}"."{table_name}"'
+    con.register("chunk", chunk)
+    try:
+        if create:
+            as_text = ", ".join(f'CAST("{c}" AS VARCHAR) AS "{c}"' for c in _dictionary_columns(chunk))
+            select = f"SELECT * REPLACE ({as_text}) FROM chunk" if as_text else "SELECT * FROM chunk"
+            verb = "CREATE OR REPLACE TABLE" if create == "replace" else "CREATE TABLE"
+            con.execute(f"{verb} {target} AS {select}")
+        else:
+            con.execute(f"INSERT INTO {target} BY NAME SELECT * FROM chunk")
+    finally:
+        con.unregister("chunk")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Fast-load helpers used by ingest_data --fast-load.
+
+The month is loaded into an UNLOGGED side table with no indexes, so COPY
+writes no WAL and maintains no index pages. Afterwards:
+
+    1. all indexes are built in parallel, one connection per index
+    2. ANALYZE refreshes planner statistics
+    3. ALTER TABLE ... SET LOGGED makes the table crash-safe again
+    4. one short transaction drops the old table and renames the new one
+       (and its indexes) into place; the caller can add its own statements
+       to it (on_swap), to publish them together with the rows
+
+Readers keep querying the previous version until step 4.
+
+homework/hw1/scripts_ingest imports this module from here; its Docker image
+copies it in from the pipeline_scripts build context.
+"""
+
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+
+
+def staging_table_name(table_name: str) -> str:
+    return f"{table_name}__load"
+
+
+# Postgres truncates longer identifiers (NAMEDATALEN - 1 bytes)
+MAX_IDENTIFIER_BYTES = 63
+
+
+def index_name(table_name: str, column: str) -> str:
+    """
+    idx_<table>_<column>. A name over 63 bytes is cut short and ends with a
+    hash of the full name, so that two long names do not truncate to the same.
+    """
+    name = f"idx_{table_name}_{column.lower()}"
+    if len(name.encode()) <= MAX_IDENTIFIER_BYTES:
+        return name
+    digest = hashlib.md5(name.encode()).hexdigest()[:8]
+    head = name.encode()[: MAX_IDENTIFIER_BYTES - len(digest) - 1].decode(errors="ignore")
+    return f"{head}_{digest}"
+
+
+def quoted(schema: str, table_name: str) -> str:
+    return f'{schema}."{table_name}"'
+
+
+def table_exists(conn, schema: str, table_name: str) -> bool:
+    return conn.execute(
+        text("SELECT to_regclass(:name) IS NOT NULL"),
+        {"name": quoted(schema, table_name)},
+    ).scalar()
+
+
+def drop_staging(engine, schema: str, staging: str) -> None:
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {quoted(schema, staging)}"))
+
+
+def set_unlogged(conn, schema: str, table_name: str) -> None:
+    # Cheap while the table is still empty
+    conn.execute(text(f"ALTER TABLE {quoted(schema, table_name)} SET UNLOGGED"))
+
+
+def build_indexes(engine, schema: str, table_name: str, columns: list[str], workers: int) -> None:
+    """
+    CREATE INDEX for every column, each on its own connection. Several
+    CREATE INDEX statements on one table only take SHARE locks, so they run
+    side by side. Indexes that already exist (a table appended to) are kept.
+    """
+
+    def build(column: str) -> tuple[str, float]:
+        t0 = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    f'CREATE INDEX IF NOT EXISTS {index_name(table_name, column)} '
+                    f'ON {quoted(schema, table_name)} ("{column}")'
+                )
+            )
+        return column, time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for column, elapsed in executor.map(build, columns):
+            print(f"Built index on {table_name}.{column} in {elapsed:.1f}s")
+
+
+def swap_into_place(engine, schema: str, staging: str, target: str, columns: list[str], on_swap=None) -> None:
+    """
+    Replace `target` with `staging` in a single transaction. Index names follow
+    the table so the next reload can reuse the staging names. on_swap(conn),
+    if given, runs last in the same transaction.
+    """
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP TABLE IF EXISTS {quoted(schema, target)}"))
+        conn.execute(text(f'ALTER TABLE {quoted(schema, staging)} RENAME TO "{target}"'))
+        for column in columns:
+            conn.execute(
+                text(
+                    f"ALTER INDEX {schema}.{index_name(staging, column)} "
+                    f"RENAME TO {index_name(target, column)}"
+                )
+            )
+        if on_swap:
+            on_swap(conn)
+
+
+def finish_fast_load(
+    engine,
+    schema: str,
+    staging: str,
+    target: str,
+    index_columns: list[str],
+    index_workers: int,
+    on_swap=None,
+) -> None:
+    t0 = time.perf_counter()
+    build_indexes(engine, schema, staging, index_columns, index_workers)
+
+    with engine.begin() as conn:
+        conn.execute(text(f"ANALYZE {quoted(schema, staging)}"))
+        conn.execute(text(f"ALTER TABLE {quoted(schema, staging)} SET LOGGED"))
+
+    swap_into_place(engine, schema, staging, target, index_columns, on_swap)
+    print(f"Fast-load finalize for {schema}.{target} took {time.perf_counter() - t0:.1f}s")
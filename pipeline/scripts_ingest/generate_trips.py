@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Synthetic yellow / green trip files for load and scale testing without the
+real TLC downloads.
+
+Rows follow the ingest_data.py schemas (column order as in the published CSVs)
+with TLC-like distributions: a daily pickup-time profile, log-normal trip
+durations and speeds, a fare formula with tips on card payments, skewed zone
+popularity, and the block of fields that is empty on ~5% of real rows.
+Everything is drawn with NumPy a batch at a time and streamed to gzip CSV or
+parquet (one row group per batch), so memory stays flat at any row count:
+
+    python generate_trips.py --color yellow --rows 100000000 --output yellow_tripdata_2021-01.csv.gz
+    python generate_trips.py --color green --rows 5000000 --output green_tripdata_2021-01.parquet
+
+The same seed always produces the same file.
+"""
+
+import calendar
+import gzip
+import os
+import time
+
+import click
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+from ingest_data import TAXI_SCHEMAS, arrow_column_types
+
+# Column order of the published files
+COLUMNS = {
+    "yellow": [
+        "VendorID", "tpep_pickup_datetime", "tpep_dropoff_datetime", "passenger_count", "trip_distance",
+        "RatecodeID", "store_and_fwd_flag", "PULocationID", "DOLocationID", "payment_type", "fare_amount",
+        "extra", "mta_tax", "tip_amount", "tolls_amount", "improvement_surcharge", "total_amount",
+        "congestion_surcharge",
+    ],
+    "green": [
+        "VendorID", "lpep_pickup_datetime", "lpep_dropoff_datetime", "store_and_fwd_flag", "RatecodeID",
+        "PULocationID", "DOLocationID", "passenger_count", "trip_distance", "fare_amount", "extra", "mta_tax",
+        "tip_amount", "tolls_amount", "ehail_fee", "improvement_surcharge", "total_amount", "payment_type",
+        "trip_type", "congestion_surcharge",
+    ],
+}
+
+# Fields that are empty together on a share of real rows (street-hail data
+# sent without the meter's trip record)
+NULL_BLOCK = {
+    "yellow": ["VendorID", "passenger_count", "RatecodeID", "store_and_fwd_flag", "payment_type", "congestion_surcharge"],
+    "green": [
+        "VendorID", "passenger_count", "RatecodeID", "store_and_fwd_flag", "payment_type", "trip_type",
+        "congestion_surcharge",
+    ],
+}
+
+# Share of pickups per hour of day, midnight first
+HOURLY_PROFILE = np.array(
+    [2.4, 1.7, 1.2, 0.9, 0.8, 1.0, 2.2, 3.7, 4.6, 4.7, 4.6, 4.8,
+     5.1, 5.1, 5.5, 5.6, 5.2, 5.9, 6.6, 6.3, 5.6, 5.3, 4.9, 3.6]
+)
+HOURLY_PROFILE = HOURLY_PROFILE / HOURLY_PROFILE.sum()
+
+VENDOR_P = {"yellow": [0.32, 0.68], "green": [0.15, 0.85]}
+PASSENGERS_P = [0.02, 0.72, 0.14, 0.04, 0.02, 0.04, 0.02]  # 0..6
+RATECODE_P = [0.97, 0.02, 0.002, 0.003, 0.005]  # 1..5
+PAYMENT_P = [0.72, 0.26, 0.01, 0.01]  # card, cash, no charge, dispute
+TIP_SHARES = np.array([0.0, 0.15, 0.2, 0.25, 0.3])
+TIP_SHARES_P = [0.12, 0.2, 0.4, 0.2, 0.08]
+EXTRA_VALUES = np.array([0.0, 0.5, 1.0, 2.5])
+EXTRA_P = [0.4, 0.3, 0.2, 0.1]
+JFK_FLAT_FARE = 52.0
+
+
+def load_zone_ids(path: str | None) -> np.ndarray:
+    """LocationIDs from a taxi_zone_lookup.csv (path or URL); 1..265 without one."""
+    if path is None:
+        return np.arange(1, 266)
+    return np.sort(pd.read_csv(path, usecols=["LocationID"])["LocationID"].to_numpy())
+
+
+def zone_popularity(zone_ids: np.ndarray, rng: np.random.Generator, skew: float = 1.1) -> np.ndarray:
+    # Zipf-like: a few zones get most pickups; which ones is decided by the seed
+    ranks = rng.permutation(len(zone_ids)) + 1
+    weights = 1.0 / ranks**skew
+    return weights / weights.sum()
+
+
+def trip_batch(
+    rng: np.random.Generator,
+    color: str,
+    n: int,
+    year: int,
+    month: int,
+    zone_ids: np.ndarray,
+    zone_p: np.ndarray,
+    null_rate: float,
+) -> pa.Table:
+    prefix = "tpep" if color == "yellow" else "lpep"
+    days = calendar.monthrange(year, month)[1]
+
+    # Pickups spread over the month with a daily profile, second resolution
+    start = np.datetime64(f"{year:04d}-{month:02d}-01T00:00:00", "s").astype(np.int64)
+    pickup = (
+        start
+        + rng.integers(0, days, n) * 86_400
+        + rng.choice(24, n, p=HOURLY_PROFILE) * 3_600
+        + rng.integers(0, 3_600, n)
+    )
+    duration = np.clip(rng.lognormal(np.log(660), 0.6, n), 60, 3 * 3_600).astype(np.int64)
+    dropoff = pickup + duration
+    speed_mph = rng.lognormal(np.log(11), 0.35, n)
+    distance = np.round(duration / 3_600 * speed_mph, 2)
+
+    ratecode = rng.choice(5, n, p=RATECODE_P) + 1
+    payment = rng.choice(4, n, p=PAYMENT_P) + 1
+    fare = np.round(2.5 + 2.5 * distance + 0.35 * duration / 60, 1)
+    fare = np.where(ratecode == 2, JFK_FLAT_FARE, fare)
+    tip = np.where(payment == 1, np.round(fare * rng.choice(TIP_SHARES, n, p=TIP_SHARES_P), 2), 0.0)
+    tolls = np.where(rng.random(n) < 0.05, 6.55, 0.0)
+    extra = rng.choice(EXTRA_VALUES, n, p=EXTRA_P)
+    mta_tax = np.full(n, 0.5)
+    improvement = np.full(n, 0.3)
+    congestion = np.where(rng.random(n) < (0.9 if color == "yellow" else 0.15), 2.5, 0.0)
+
+    columns = {
+        "VendorID": rng.choice(2, n, p=VENDOR_P[color]) + 1,
+        f"{prefix}_pickup_datetime": pickup.astype("datetime64[s]"),
+        f"{prefix}_dropoff_datetime": dropoff.astype("datetime64[s]"),
+        "passenger_count": rng.choice(7, n, p=PASSENGERS_P),
+        "trip_distance": distance,
+        "RatecodeID": ratecode,
+        "store_and_fwd_flag": np.where(rng.random(n) < 0.01, "Y", "N"),
+        "PULocationID": rng.choice(zone_ids, n, p=zone_p),
+        "DOLocationID": rng.choice(zone_ids, n, p=zone_p),
+        "payment_type": payment,
+        "fare_amount": fare,
+        "extra": extra,
+        "mta_tax": mta_tax,
+        "tip_amount": tip,
+        "tolls_amount": tolls,
+        "improvement_surcharge": improvement,
+        "total_amount": np.round(fare + extra + mta_tax + tip + tolls + improvement + congestion, 2),
+        "congestion_surcharge": congestion,
+    }
+    if color == "green":
+        columns["ehail_fee"] = np.full(n, np.nan)
+        columns["trip_type"] = np.where(rng.random(n) < 0.02, 2, 1)
+
+    missing = rng.random(n) < null_rate
+    masks = {c: missing for c in NULL_BLOCK[color]}
+    if color == "green":
+        masks["ehail_fee"] = np.ones(n, dtype=bool)
+
+    dtype, parse_dates, _ = TAXI_SCHEMAS[color]
+    types = arrow_column_types(dtype, parse_dates)
+    arrays = [pa.array(columns[c], type=types[c], mask=masks.get(c)) for c in COLUMNS[color]]
+    return pa.Table.from_arrays(arrays, names=COLUMNS[color])
+
+
+def write_trips(
+    path: str,
+    color: str,
+    rows: int,
+    year: int,
+    month: int,
+    seed: int = 42,
+    batch_rows: int = 1_000_000,
+    zone_ids: np.ndarray | None = None,
+    null_rate: float = 0.05,
+    compress_level: int = 1,
+) -> None:
+    """
+    Stream `rows` synthetic trips to `path`: gzip CSV for *.csv.gz / *.csv,
+    parquet for *.parquet. Written to a temp file and renamed when complete.
+    """
+    rng = np.random.default_rng(seed)
+    zone_ids = load_zone_ids(None) if zone_ids is None else zone_ids
+    zone_p = zone_popularity(zone_ids, rng)
+    is_parquet = path.endswith(".parquet")
+
+    dtype, parse_dates, _ = TAXI_SCHEMAS[color]
+    types = arrow_column_types(dtype, parse_dates)
+    schema = pa.schema([(c, types[c]) for c in COLUMNS[color]])
+    if not is_parquet:
+        # The published CSVs have second-resolution timestamps
+        schema = pa.schema([(f.name, pa.timestamp("s") if f.name in parse_dates else f.type) for f in schema])
+
+    tmp = f"{path}.tmp"
+    if is_parquet:
+        writer = pq.ParquetWriter(tmp, schema, compression="snappy")
+    else:
+        # zlib through gzip.GzipFile: Arrow's gzip stream always uses level 9,
+        # which is several times slower than generating the rows
+        raw = sink = open(tmp, "wb")
+        if path.endswith(".gz"):
+            sink = gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=compress_level, mtime=0)
+        sink.write((",".join(schema.names) + "\n").encode())
+        writer = pa_csv.CSVWriter(
+            pa.PythonFile(sink, mode="w"),
+            schema,
+            write_options=pa_csv.WriteOptions(include_header=False, quoting_style="none"),
+        )
+
+    try:
+        written = 0
+        while written < rows:
+            n = min(batch_rows, rows - written)
+            writer.write_table(trip_batch(rng, color, n, year, month, zone_ids, zone_p, null_rate).cast(schema))
+            written += n
+    finally:
+        writer.close()
+        if not is_parquet:
+            sink.close()
+            raw.close()
+    os.replace(tmp, path)
+
+
+@click.command()
+@click.option("--color", type=click.Choice(sorted(COLUMNS)), default="yellow", show_default=True)
+@click.option("--rows", type=int, required=True, help="Number of trips to generate")
+@click.option("--year", type=int, default=2021, show_default=True)
+@click.option("--month", type=int, default=1, show_default=True)
+@click.option("--output", required=True, help="*.csv.gz, *.csv or *.parquet")
+@click.option("--seed", type=int, default=42, show_default=True)
+@click.option("--batch-rows", type=int, default=1_000_000, show_default=True, help="Rows generated and written at a time")
+@click.option("--zones", default=None, help="taxi_zone_lookup.csv (path or URL) to draw LocationIDs from  [default: 1-265]")
+@click.option("--null-rate", type=float, default=0.05, show_default=True, help="Share of rows with the empty field block")
+@click.option("--compress-level", type=click.IntRange(1, 9), default=1, show_default=True, help="gzip level for .csv.gz")
+def main(color, rows, year, month, output, seed, batch_rows, zones, null_rate, compress_level):
+    if not (output.endswith(".parquet") or output.endswith(".csv") or output.endswith(".csv.gz")):
+        raise click.BadParameter("expected a .csv.gz, .csv or .parquet file name", param_hint="--output")
+
+    t0 = time.perf_counter()
+    write_trips(output, color, rows, year, month, seed, batch_rows, load_zone_ids(zones), null_rate, compress_level)
+    elapsed = time.perf_counter() - t0
+    size_mb = os.path.getsize(output) / 1024**2
+    print(f"Wrote {rows} {color} trips to {output} ({size_mb:.1f} MB) in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,46 @@
 # coding: utf-8
 
 import io
+import itertools
+import os
+import tempfile
+import threading
 import time
+import urllib.request
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import ExitStack, nullcontext
+from functools import partial
 import pandas as pd
+import psycopg2
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from tqdm.auto import tqdm
-from sqlalchemy import create_engine
-from sqlalchemy.types import BigInteger, Float, String, DateTime
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.types import BigInteger, Float, String, DateTime, Text
 import click
 
-PREFIX = "https://github.com/DataTalksClub/nyc-tlc-data/releases/download/yellow/"
+from chunk_sizing import AdaptiveChunkSizer, check_memory_budget, chunk_nbytes, parse_size, rebatch
+from download_cache import DEFAULT_CACHE_DIR, DownloadCache
+from compact_dtypes import CompactSchema
+from checkpoints import clear_checkpoint, ensure_checkpoint_table, read_checkpoint, save_checkpoint, skip_data_rows
+from duckdb_target import (
+    append_chunk, connect as duckdb_connect, duckdb_schema, parse_target, table_exists as duckdb_table_exists
+)
+from fast_load import drop_staging, finish_fast_load, set_unlogged, staging_table_name, table_exists
+from ingest_metrics import IngestMetrics, payload_size
+from parallel_copy import append_staging, copy_parallel, replace_with_staging
+from partitions import attach_month, attach_staging_name
+from pg_binary_copy import BinaryCopyEncoder, column_names, copy_binary, is_arrow
+from pipelining import format_stage_report, pipelined
+from rollups import MEASURE_COLUMNS, HourlyZoneRollup, ensure_rollup_table, rebuild_rollup, rollup_table_name
+from row_filters import RowFilter, parse_columns, select_columns
+from row_ids import HASH_COLUMNS, ROW_ID_COLUMN, add_row_ids
+from zone_enrichment import LOCATION_COLUMNS, ZONE_SQL_TYPES, ZONES_URL, ZoneLookup
+
+RELEASES_URL = "https://github.com/DataTalksClub/nyc-tlc-data/releases/download"
+PREFIX = f"{RELEASES_URL}/yellow/"
 
 PANDAS_DTYPE = {
     "VendorID": "Int64",
@@ -53,17 +85,155 @@ SQL_TYPES = {
     "tpep_dropoff_datetime": DateTime(),
 }
 
-def open_csv_iterator(url: str, chunk_size: int, retries: int = 3, backoff_sec: int = 2):
+GREEN_PANDAS_DTYPE = {
+    "VendorID": "Int64",
+    "store_and_fwd_flag": "string",
+    "RatecodeID": "Int64",
+    "PULocationID": "Int64",
+    "DOLocationID": "Int64",
+    "passenger_count": "Int64",
+    "trip_distance": "float64",
+    "fare_amount": "float64",
+    "extra": "float64",
+    "mta_tax": "float64",
+    "tip_amount": "float64",
+    "tolls_amount": "float64",
+    "ehail_fee": "float64",
+    "improvement_surcharge": "float64",
+    "total_amount": "float64",
+    "payment_type": "Int64",
+    "trip_type": "Int64",
+    "congestion_surcharge": "float64",
+}
+
+GREEN_PARSE_DATES = ["lpep_pickup_datetime", "lpep_dropoff_datetime"]
+
+GREEN_SQL_TYPES = {
+    "VendorID": BigInteger(),
+    "store_and_fwd_flag": String(),
+    "RatecodeID": BigInteger(),
+    "PULocationID": BigInteger(),
+    "DOLocationID": BigInteger(),
+    "passenger_count": BigInteger(),
+    "trip_distance": Float(),
+    "fare_amount": Float(),
+    "extra": Float(),
+    "mta_tax": Float(),
+    "tip_amount": Float(),
+    "tolls_amount": Float(),
+    "ehail_fee": Float(),
+    "improvement_surcharge": Float(),
+    "total_amount": Float(),
+    "payment_type": BigInteger(),
+    "trip_type": BigInteger(),
+    "congestion_surcharge": Float(),
+    "lpep_pickup_datetime": DateTime(),
+    "lpep_dropoff_datetime": DateTime(),
+}
+
+# color -> (pandas dtypes, datetime columns, SQL types)
+TAXI_SCHEMAS = {
+    "yellow": (PANDAS_DTYPE, PARSE_DATES, SQL_TYPES),
+    "green": (GREEN_PANDAS_DTYPE, GREEN_PARSE_DATES, GREEN_SQL_TYPES),
+}
+
+# Indexes built by --fast-load and --partitioned once the data is in
+INDEX_COLUMNS = {
+    "yellow": ["tpep_pickup_datetime", "PULocationID", "DOLocationID"],
+    "green": ["lpep_pickup_datetime", "PULocationID", "DOLocationID"],
+}
+
+# Range partition key of the --partitioned parent table
+PARTITION_COLUMNS = {
+    "yellow": "tpep_pickup_datetime",
+    "green": "lpep_pickup_datetime",
+}
+
+def source_url(color: str, year: int, month: int) -> str:
+    return f"{RELEASES_URL}/{color}/{color}_tripdata_{year}-{month:02d}.csv.gz"
+
+def parse_month_range(value: str) -> list[tuple[int, int]]:
+    """
+    Parse "YYYY-MM" or "YYYY-MM:YYYY-MM" (inclusive) into a list of (year, month).
+    """
+    start, _, end = value.partition(":")
+    end = end or start
+    try:
+        start_year, start_month = (int(p) for p in start.split("-"))
+        end_year, end_month = (int(p) for p in end.split("-"))
+    except ValueError:
+        raise click.BadParameter(f"expected YYYY-MM or YYYY-MM:YYYY-MM, got {value!r}")
+    if not (1 <= start_month <= 12 and 1 <= end_month <= 12):
+        raise click.BadParameter(f"month out of range in {value!r}")
+
+    first = start_year * 12 + start_month - 1
+    last = end_year * 12 + end_month - 1
+    if last < first:
+        raise click.BadParameter(f"range end is before range start in {value!r}")
+    return [(i // 12, i % 12 + 1) for i in range(first, last + 1)]
+
+def open_source(
+    url: str,
+    cache: DownloadCache | None = None,
+    metrics: IngestMetrics | None = None,
+    skip_rows: int = 0,
+):
+    """
+    What the CSV readers should open: the URL, the cached local copy, or, when
+    metrics are being collected, a stream that times download/read and
+    decompression separately from parsing. With `skip_rows`, a decompressed
+    stream with the header and then the rows after the first `skip_rows`
+    (see checkpoints.skip_data_rows).
+    """
+    cache = cache if "://" in url else None  # local files are read in place
+    timed = metrics is not None and metrics.enabled
+    if cache:
+        with metrics.stage("download") if timed else nullcontext():
+            url = cache.fetch(url)
+    if skip_rows:
+        return skip_data_rows((metrics or IngestMetrics(url, "")).open(url), skip_rows)
+    return metrics.open(url) if timed else url
+
+def open_csv_iterator(
+    url: str,
+    chunk_size: int,
+    retries: int = 3,
+    backoff_sec: int = 2,
+    dtype: dict = PANDAS_DTYPE,
+    parse_dates: list = PARSE_DATES,
+    skip_rows: int = 0,
+    cache: DownloadCache | None = None,
+    metrics: IngestMetrics | None = None,
+    sizer: AdaptiveChunkSizer | None = None,
+    columns: list[str] | None = None,
+    handles: ExitStack | None = None,
+):
+    """
+    Open a chunked reader over the file. `skip_rows` data rows after the header
+    are skipped (used to resume from a checkpoint). With a `cache`, the file is
+    read from the local download cache instead of being streamed over HTTP.
+    With a `sizer`, every chunk is read at the sizer's current chunk size.
+    With `columns`, the other columns are not parsed at all.
+    The reader and the streams under it are registered on `handles`, so the
+    caller can close them even while a chunk is being read.
+    """
+    handles = handles if handles is not None else ExitStack()
     last_err = None
     for attempt in range(1, retries + 1):
         try:
-            return pd.read_csv(
-                url,
-                dtype=PANDAS_DTYPE,
-                parse_dates=PARSE_DATES,
+            source = open_source(url, cache, metrics, skip_rows)
+            if not isinstance(source, str):
+                handles.callback(source.close)
+            reader = pd.read_csv(
+                source,
+                dtype=dtype,
+                parse_dates=parse_dates,
+                usecols=columns,
                 iterator=True,
                 chunksize=chunk_size,
             )
+            handles.callback(reader.close)
+            return _sized_chunks(reader, sizer) if sizer else reader
         except Exception as e:
             last_err = e
             if attempt < retries:
@@ -71,16 +241,104 @@ def open_csv_iterator(url: str, chunk_size: int, retries: int = 3, backoff_sec:
             else:
                 raise last_err
 
-def copy_insert(conn, full_table_name: str, df: pd.DataFrame):
+def _sized_chunks(reader, sizer: AdaptiveChunkSizer):
+    # get_chunk takes a new size on every call
+    with reader:
+        while True:
+            try:
+                yield reader.get_chunk(sizer.chunk_size)
+            except StopIteration:
+                return
+
+# pandas dtype -> Arrow type, for --parser arrow
+ARROW_TYPES = {
+    "Int64": pa.int64(),
+    "float64": pa.float64(),
+    "string": pa.string(),
+}
+
+def arrow_column_types(dtype: dict, parse_dates: list) -> dict:
+    """The PANDAS_DTYPE / PARSE_DATES schema expressed as Arrow types."""
+    types = {col: ARROW_TYPES[t] for col, t in dtype.items()}
+    types.update({col: pa.timestamp("us") for col in parse_dates})
+    return types
+
+def open_arrow_csv_iterator(
+    url: str,
+    chunk_size: int,
+    retries: int = 3,
+    backoff_sec: int = 2,
+    dtype: dict = PANDAS_DTYPE,
+    parse_dates: list = PARSE_DATES,
+    skip_rows: int = 0,
+    cache: DownloadCache | None = None,
+    metrics: IngestMetrics | None = None,
+    sizer: AdaptiveChunkSizer | None = None,
+    columns: list[str] | None = None,
+    handles: ExitStack | None = None,
+    block_size: int = 16 << 20,
+):
     """
-    Fast Postgres bulk load using COPY FROM STDIN.
-    Keeps it simple: no header, CSV format, columns in df order.
+    Same contract as open_csv_iterator, but parses with pyarrow's multithreaded
+    streaming CSV reader and yields pyarrow Tables of `chunk_size` rows.
     """
+    handles = handles if handles is not None else ExitStack()
+    read_options = pa_csv.ReadOptions(use_threads=True, block_size=block_size)
+    convert_options = pa_csv.ConvertOptions(
+        column_types=arrow_column_types(dtype, parse_dates),
+        include_columns=columns or [],
+        strings_can_be_null=True,  # empty store_and_fwd_flag is NULL, as with pandas
+    )
+
+    last_err = None
+    for attempt in range(1, retries + 1):
+        try:
+            source = open_source(url, cache, metrics, skip_rows)
+            if not isinstance(source, str):
+                handles.callback(source.close)
+                stream = pa.PythonFile(source, mode="r")
+            elif "://" in source:
+                response = urllib.request.urlopen(source)
+                handles.callback(response.close)
+                stream = pa.PythonFile(response, mode="r")
+                compression = "gzip" if source.endswith(".gz") else None
+                stream = pa.CompressedInputStream(stream, compression) if compression else stream
+            else:
+                stream = pa.input_stream(source, compression="detect")
+                handles.callback(stream.close)
+            reader = pa_csv.open_csv(stream, read_options=read_options, convert_options=convert_options)
+            break
+        except Exception as e:
+            last_err = e
+            if attempt < retries:
+                time.sleep(backoff_sec * attempt)
+            else:
+                raise last_err
+
+    return rebatch(reader, chunk_size, sizer)
+
+def serialize_csv(df) -> io.StringIO | io.BytesIO:
+    if is_arrow(df):
+        sink = pa.BufferOutputStream()
+        pa_csv.write_csv(df, sink, pa_csv.WriteOptions(include_header=False))
+        return io.BytesIO(sink.getvalue().to_pybytes())
+
     buf = io.StringIO()
     df.to_csv(buf, index=False, header=False)
     buf.seek(0)
+    return buf
 
-    cols = ",".join([f'"{c}"' for c in df.columns])  # simple quoting for column names
+def copy_insert(conn, full_table_name: str, df, buf: io.StringIO | io.BytesIO | None = None):
+    """
+    Fast Postgres bulk load using COPY FROM STDIN.
+    Keeps it simple: no header, CSV format, columns in df order.
+    Pass `buf` to reuse a chunk that was already serialized with serialize_csv.
+    `df` may be a pandas DataFrame or a pyarrow Table.
+    """
+    if buf is None:
+        buf = serialize_csv(df)
+
+    cols = ",".join([f'"{c}"' for c in column_names(df)])  # simple quoting for column names
     sql = f'COPY {full_table_name} ({cols}) FROM STDIN WITH (FORMAT CSV)'
     raw = conn.connection  # DBAPI connection (psycopg2)
     cur = raw.cursor()
@@ -89,6 +347,880 @@ def copy_insert(conn, full_table_name: str, df: pd.DataFrame):
     finally:
         cur.close()
 
+def serialize_chunk(
+    df,
+    insert_method: str,
+    sql_types: dict = SQL_TYPES,
+    encoder: BinaryCopyEncoder | None = None,
+):
+    """
+    Pre-serialize a chunk for write_chunk. Only the COPY methods have a separable
+    serialization step; pandas to_sql builds its INSERTs internally.
+    Without an `encoder`, copy-binary gets a fresh buffer so the payload can
+    outlive the next call (needed when several chunks are in flight).
+    """
+    if insert_method == "copy":
+        return serialize_csv(df)
+    if insert_method == "copy-binary":
+        return (encoder or BinaryCopyEncoder(sql_types)).encode(df, sql_types)
+    return None
+
+# Errors worth retrying from the last checkpoint: dropped downloads, truncated
+# gzip streams and lost database connections
+RETRYABLE_ERRORS = (OSError, EOFError, zlib.error, OperationalError, psycopg2.OperationalError)
+
+def write_chunk(
+    conn,
+    df,
+    table_name: str,
+    schema: str,
+    insert_method: str,
+    to_sql_chunksize: int,
+    sql_types: dict = SQL_TYPES,
+    payload=None,
+):
+    """
+    Append one chunk to an existing table using the selected insert method.
+    `payload` is the output of serialize_chunk, if it was computed ahead of time.
+    Arrow chunks go to COPY as they are; to_sql needs them converted to pandas.
+    """
+    if insert_method == "copy":
+        copy_insert(conn, f'{schema}."{table_name}"', df, payload)
+        return
+    if insert_method == "copy-binary":
+        if payload is None:
+            payload = serialize_chunk(df, insert_method, sql_types)
+        copy_binary(conn, f'{schema}."{table_name}"', column_names(df), payload)
+        return
+
+    if is_arrow(df):
+        df = df.to_pandas()
+    if insert_method == "multi":
+        # Smaller chunks are usually better than 10k for multi-row INSERT
+        df.to_sql(
+            name=table_name,
+            con=conn,
+            schema=schema,
+            if_exists="append",
+            index=False,
+            method="multi",
+            chunksize=to_sql_chunksize,
+            dtype=sql_types,
+        )
+    else:  # "default"
+        df.to_sql(
+            name=table_name,
+            con=conn,
+            schema=schema,
+            if_exists="append",
+            index=False,
+            chunksize=to_sql_chunksize,
+            dtype=sql_types,
+        )
+
+def ensure_row_id_index(conn, schema: str, table_name: str) -> None:
+    conn.execute(
+        text(
+            f'CREATE UNIQUE INDEX IF NOT EXISTS "uq_{table_name}_{ROW_ID_COLUMN}" '
+            f'ON {schema}."{table_name}" ("{ROW_ID_COLUMN}")'
+        )
+    )
+
+def write_new_rows(
+    conn,
+    df,
+    table_name: str,
+    schema: str,
+    insert_method: str,
+    sql_types: dict = SQL_TYPES,
+    payload=None,
+    rollup: HourlyZoneRollup | None = None,
+) -> int:
+    """
+    Like write_chunk, but rows whose unique_row_id is already in the table are
+    skipped: the chunk is COPYed into a temporary table and moved over with
+    INSERT ... ON CONFLICT DO NOTHING. Returns the number of rows inserted.
+    With `rollup`, the inserted rows (and only those) are added to it.
+    """
+    tmp = f"{table_name}__dedupe"
+    # Created per chunk so it follows the target's column types if they change
+    conn.execute(text(f'CREATE TEMP TABLE "{tmp}" (LIKE {schema}."{table_name}")'))
+    write_chunk(conn, df, tmp, "pg_temp", insert_method, 0, sql_types, payload)
+    cols = ",".join(f'"{c}"' for c in column_names(df))
+    insert = (
+        f'INSERT INTO {schema}."{table_name}" ({cols}) SELECT {cols} FROM pg_temp."{tmp}" '
+        f'ON CONFLICT ("{ROW_ID_COLUMN}") DO NOTHING'
+    )
+    if rollup is not None:
+        inserted = rollup.add_inserted(conn, insert)
+    else:
+        inserted = conn.execute(text(insert)).rowcount
+    conn.execute(text(f'DROP TABLE pg_temp."{tmp}"'))
+    return inserted
+
+def projected_schema(
+    color: str,
+    columns: list[str] | None = None,
+    row_filter: RowFilter | None = None,
+    required: list[str] = (),
+) -> tuple[dict, list, dict, list | None]:
+    """
+    The (pandas dtypes, datetime columns, SQL types) of `color` cut down to
+    `columns`, plus the columns to parse (None = all): the projection and the
+    row filter's columns. `required` lists columns the projection must keep.
+    """
+    dtype, parse_dates, sql_types = TAXI_SCHEMAS[color]
+    if not columns:
+        return dtype, parse_dates, sql_types, None
+    missing = [c for c in dict.fromkeys(required) if c not in columns]
+    if missing:
+        raise ValueError(f"columns must include {', '.join(missing)} for the options in use")
+    read_columns = columns + [c for c in row_filter.columns if c not in columns] if row_filter else columns
+    return (
+        {c: t for c, t in dtype.items() if c in read_columns},
+        [c for c in parse_dates if c in read_columns],
+        {c: sql_types[c] for c in columns},
+        read_columns,
+    )
+
+def check_load_options(
+    color: str,
+    if_exists: str = "replace",
+    insert_method: str = "copy",
+    max_inflight_chunks: int = 0,
+    copy_workers: int = 1,
+    fast_load: bool = False,
+    commit_every: int = 0,
+    compact_dtypes: bool = False,
+    dedupe: bool = False,
+    columns: list[str] | None = None,
+    row_filter: RowFilter | None = None,
+    partitioned: bool = False,
+    **_other_load_kwargs,
+) -> None:
+    """
+    Raise ValueError if the load options cannot be combined. run() checks the
+    command line with it before any work starts; load_month and load_partition
+    check their arguments with it. Other load_month keyword arguments are
+    accepted and ignored, so a load_kwargs dict can be passed as it is.
+    """
+    known = TAXI_SCHEMAS[color][2]
+    unknown = [c for c in (columns or []) + (row_filter.columns if row_filter else []) if c not in known]
+    if unknown:
+        raise ValueError(f"unknown {color} column(s) in --columns/--where: {', '.join(unknown)}")
+    if fast_load and if_exists == "append":
+        raise ValueError("--fast-load replaces the target table; use --if-exists replace or fail")
+    if fast_load and commit_every:
+        raise ValueError("--fast-load rebuilds the table from scratch; it cannot be combined with --commit-every")
+    if dedupe and fast_load:
+        raise ValueError("--dedupe needs the unique index during the load; it cannot be combined with --fast-load")
+    if dedupe and partitioned:
+        raise ValueError("--partitioned replaces whole months; --dedupe is not needed")
+    if dedupe and insert_method not in ("copy", "copy-binary"):
+        raise ValueError("--dedupe loads through COPY; use --insert-method copy or copy-binary")
+    if row_filter and commit_every:
+        raise ValueError("--commit-every checkpoints count rows of the file; it cannot be combined with --where")
+    if partitioned and if_exists == "append":
+        raise ValueError("--partitioned replaces the month's partition; use --if-exists replace or fail")
+    if partitioned and columns and PARTITION_COLUMNS[color] not in columns:
+        raise ValueError(f"--columns must include the partition key {PARTITION_COLUMNS[color]}")
+    if copy_workers < 1:
+        raise ValueError("--copy-workers must be at least 1")
+    if copy_workers > 1:
+        for flag, used in (
+            ("--commit-every", commit_every),
+            ("--dedupe", dedupe),
+            ("--compact-dtypes", compact_dtypes),
+            ("--pipelined", max_inflight_chunks),
+        ):
+            if used:
+                raise ValueError(f"--copy-workers cannot be combined with {flag}")
+
+class ChunkSource:
+    """
+    The chunks of one source file, prepared the same way for every target:
+    parsed with `parser`, filtered by `row_filter`, cut down to `columns`,
+    then compacted, zone-enriched and given row ids as requested. `sql_types`
+    are the column types of the chunks; `required` lists columns the
+    projection must keep besides those the options themselves need.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        color: str,
+        chunk_size: int,
+        parser: str = "pandas",
+        cache: DownloadCache | None = None,
+        metrics: IngestMetrics | None = None,
+        sizer: AdaptiveChunkSizer | None = None,
+        columns: list[str] | None = None,
+        row_filter: RowFilter | None = None,
+        zones: ZoneLookup | None = None,
+        compact_dtypes: bool = False,
+        dedupe: bool = False,
+        required: list[str] = (),
+    ):
+        required = (
+            (HASH_COLUMNS[color] if dedupe else [])
+            + (list(LOCATION_COLUMNS) if zones is not None else [])
+            + list(required)
+        )
+        self.dtype, self.parse_dates, sql_types, self.read_columns = projected_schema(
+            color, columns, row_filter, required
+        )
+        if dedupe:
+            sql_types = {ROW_ID_COLUMN: Text(), **sql_types}
+        if zones is not None:
+            sql_types = {**sql_types, **ZONE_SQL_TYPES}
+        self.sql_types = sql_types
+        self.compact = CompactSchema(sql_types) if compact_dtypes else None
+
+        self.url = url
+        self.color = color
+        self.chunk_size = chunk_size
+        self.parser = parser
+        # Retries may switch this to a local copy of the file
+        self.cache = cache
+        self.metrics = metrics or IngestMetrics(url, "")
+        self.sizer = sizer
+        self.columns = columns
+        self.row_filter = row_filter
+        self.zones = zones
+        self.dedupe = dedupe
+        self.filtered_rows = 0
+
+    def _matching_rows(self, df):
+        kept = self.row_filter.apply(df)
+        self.filtered_rows += len(df) - len(kept)
+        return kept
+
+    def open(self, skip_rows: int = 0, handles: ExitStack | None = None):
+        """
+        The file's chunks from row `skip_rows` on. The reader and the streams
+        under it are registered on `handles`.
+        """
+        open_iterator = open_arrow_csv_iterator if self.parser == "arrow" else open_csv_iterator
+        df_iter = open_iterator(
+            self.url,
+            chunk_size=self.chunk_size,
+            dtype=self.dtype,
+            parse_dates=self.parse_dates,
+            skip_rows=skip_rows,
+            cache=self.cache,
+            metrics=self.metrics,
+            sizer=self.sizer,
+            columns=self.read_columns,
+            handles=handles,
+        )
+        if self.row_filter:
+            df_iter = map(self._matching_rows, df_iter)
+        if self.columns:
+            df_iter = (select_columns(df, self.columns) for df in df_iter)
+        if self.compact:
+            df_iter = map(self.compact.apply, df_iter)
+        if self.zones is not None:
+            df_iter = map(self.zones.enrich, df_iter)
+        if self.dedupe:
+            df_iter = (add_row_ids(df, self.color) for df in df_iter)
+        return self.metrics.timed_iter(df_iter, "parse")
+
+    def summary(self) -> list[str]:
+        """Lines to print once the file is loaded."""
+        lines = []
+        if self.row_filter:
+            lines.append(f"Filtered out {self.filtered_rows} row(s) not matching the row filter")
+        if self.sizer:
+            lines.append(self.sizer.summary())
+        return lines
+
+def load_month(
+    engine,
+    url: str,
+    table_name: str,
+    schema: str,
+    chunk_size: int,
+    if_exists: str,
+    insert_method: str,
+    to_sql_chunksize: int,
+    color: str = "yellow",
+    progress: bool = True,
+    max_inflight_chunks: int = 0,
+    fast_load: bool = False,
+    index_workers: int = 0,
+    commit_every: int = 0,
+    retries: int = 3,
+    backoff_sec: int = 2,
+    cache: DownloadCache | None = None,
+    parser: str = "pandas",
+    metrics: IngestMetrics | None = None,
+    memory_budget: int = 0,
+    compact_dtypes: bool = False,
+    dedupe: bool = False,
+    zones: ZoneLookup | None = None,
+    rollup_table: str | None = None,
+    columns: list[str] | None = None,
+    row_filter: RowFilter | None = None,
+    copy_workers: int = 1,
+) -> int:
+    """
+    Stream one monthly file into schema.table_name in a single transaction.
+    With max_inflight_chunks > 0, parsing and serialization run in background
+    threads (see pipelining.py) and overlap with the database load.
+    With fast_load, rows go to an UNLOGGED side table that is indexed and
+    swapped in at the end (see fast_load.py); the target is always replaced.
+    With commit_every > 0, a transaction is committed every N chunks together
+    with a row-offset checkpoint (see checkpoints.py). A failed stream is
+    reopened after the last committed row, and so is a later run of the
+    same file into the same table.
+    parser="arrow" reads with pyarrow instead of pandas; chunks then stay Arrow
+    tables all the way into COPY.
+    Stage timings, bytes and rows are recorded in `metrics` (see ingest_metrics.py).
+    With memory_budget > 0 (bytes), chunk_size is only the starting point; the
+    size adapts to bytes per row and COPY throughput (see chunk_sizing.py).
+    With compact_dtypes, code columns and the flag are downcast in memory and
+    stored as SMALLINT / CHAR(1), widening on out-of-range values (see compact_dtypes.py).
+    With dedupe, every row gets the Kestra flows' unique_row_id (see row_ids.py)
+    and rows already in the table are skipped, so loading a file twice adds nothing.
+    With `zones`, pickup/dropoff borough and zone columns are added to every chunk
+    by indexing dense LocationID arrays (see zone_enrichment.py).
+    With `rollup_table`, hourly per-zone sums of the file are merged into that
+    table in the final transaction, keyed by table_name (see rollups.py); with
+    fast_load, that is the transaction that swaps the table in.
+    With `columns`, only those columns are parsed and the table has just them.
+    With `row_filter`, non-matching rows are dropped before serialization (see
+    row_filters.py); its columns are parsed too, but only stored if projected.
+    With copy_workers > 1, chunks are COPYed by that many connections at once
+    into a staging table, which is published in one transaction at the end
+    (see parallel_copy.py).
+    Returns the number of rows inserted by this call.
+    """
+    check_load_options(
+        color,
+        if_exists=if_exists,
+        insert_method=insert_method,
+        max_inflight_chunks=max_inflight_chunks,
+        copy_workers=copy_workers,
+        fast_load=fast_load,
+        commit_every=commit_every,
+        compact_dtypes=compact_dtypes,
+        dedupe=dedupe,
+        columns=columns,
+        row_filter=row_filter,
+    )
+    metrics = metrics or IngestMetrics(url, f"{schema}.{table_name}")
+    sizer = None
+    if memory_budget:
+        # The chunks being loaded plus the ones queued behind them
+        inflight = 3 * copy_workers + 1 if copy_workers > 1 else max_inflight_chunks + 1
+        sizer = AdaptiveChunkSizer(memory_budget, initial_rows=chunk_size, inflight=inflight)
+    source = ChunkSource(
+        url, color, chunk_size, parser, cache, metrics, sizer, columns, row_filter, zones, compact_dtypes, dedupe,
+        required=[PARTITION_COLUMNS[color], "PULocationID", *MEASURE_COLUMNS] if rollup_table else [],
+    )
+    sql_types = source.sql_types
+    compact = source.compact
+
+    def chunk_sql_types(df) -> dict:
+        return compact.sql_types(df) if compact else sql_types
+
+    def serialize(df, encoder=None):
+        with metrics.stage("serialize"):
+            payload = serialize_chunk(df, insert_method, chunk_sql_types(df), encoder)
+        metrics.count("bytes_out", payload_size(payload))
+        return payload
+
+    # Fast load and copy workers load a side table nobody reads; fast load swaps
+    # it in at the end, copy workers publish it in the final transaction
+    load_table = staging_table_name(table_name) if fast_load or copy_workers > 1 else table_name
+    publish_staging = copy_workers > 1 and not fast_load
+    if load_table != table_name:
+        if if_exists == "fail":
+            with engine.connect() as conn:
+                if table_exists(conn, schema, table_name):
+                    raise ValueError(f"Table {schema}.{table_name} already exists")
+        drop_staging(engine, schema, load_table)
+
+    checkpoint_key = f"{schema}.{table_name}"
+    committed_rows = 0
+    if commit_every:
+        with engine.begin() as conn:
+            ensure_checkpoint_table(conn, schema)
+            committed_rows = read_checkpoint(conn, schema, url, checkpoint_key)
+        if committed_rows:
+            print(f"Resuming {table_name} from checkpoint at row {committed_rows}")
+
+    rollup = None
+    if rollup_table:
+        with engine.begin() as conn:
+            ensure_rollup_table(conn, schema, rollup_table)
+        # Rows committed by an earlier run are not streamed again; the month
+        # is then re-aggregated from its table instead
+        if not committed_rows:
+            rollup = HourlyZoneRollup(PARTITION_COLUMNS[color])
+    rollup_rebuild = rollup_table and committed_rows > 0
+
+    # A resumed load appends to the table created by the earlier run
+    table_ready = committed_rows > 0
+    table_columns = []
+    inserted_rows = 0
+    skipped_rows = 0
+    stage_stats = {}
+    # Copy workers update the rollup, the sizer and the counters from several threads
+    lock = threading.Lock()
+
+    def create_table(conn, df_chunk):
+        """Create load_table with the columns of the first chunk."""
+        nonlocal table_ready, table_columns
+        empty = df_chunk.schema.empty_table().to_pandas() if is_arrow(df_chunk) else df_chunk.head(0)
+        empty.to_sql(
+            name=load_table,
+            con=conn,
+            schema=schema,
+            if_exists="fail" if load_table != table_name else if_exists,
+            index=False,
+            dtype=chunk_sql_types(df_chunk),
+        )
+        if fast_load:
+            set_unlogged(conn, schema, load_table)
+        if compact:
+            compact.sync(conn, schema, load_table)
+        if dedupe:
+            ensure_row_id_index(conn, schema, load_table)
+        table_columns = column_names(df_chunk)
+        table_ready = True
+
+    def write(conn, df_chunk, payload) -> int:
+        """Load one chunk into load_table on `conn`; returns the rows inserted."""
+        chunk_types = chunk_sql_types(df_chunk)
+        t0 = time.perf_counter()
+        with metrics.stage("load"):
+            if compact:
+                compact.widen(conn, schema, load_table, df_chunk)
+            if dedupe:
+                inserted = write_new_rows(conn, df_chunk, load_table, schema, insert_method, chunk_types, payload, rollup)
+            else:
+                write_chunk(conn, df_chunk, load_table, schema, insert_method, to_sql_chunksize, chunk_types, payload)
+                inserted = len(df_chunk)
+        elapsed = time.perf_counter() - t0
+        with lock:
+            if rollup is not None and not dedupe:
+                with metrics.stage("rollup"):
+                    rollup.add(df_chunk)
+            if sizer:
+                sizer.observe(len(df_chunk), chunk_nbytes(df_chunk), payload_size(payload), elapsed)
+        metrics.chunk_done(len(df_chunk))
+        return inserted
+
+    def write_rollup(conn):
+        with metrics.stage("rollup"):
+            if rollup_rebuild:
+                rebuild_rollup(conn, schema, rollup_table, table_name, load_table, PARTITION_COLUMNS[color])
+            else:
+                # A replaced table starts over; an appended file adds to the month
+                rollup.write(conn, schema, rollup_table, table_name, replace=if_exists != "append")
+
+    def finalize(conn):
+        """The last steps of the load, in the transaction that makes its rows visible."""
+        if publish_staging:
+            with metrics.stage("finalize"):
+                if if_exists == "append":
+                    append_staging(conn, schema, load_table, table_name, table_columns)
+                else:
+                    replace_with_staging(conn, schema, load_table, table_name)
+        # A fast load's rows become visible when the table is swapped in, below
+        if rollup_table and not fast_load:
+            write_rollup(conn)
+
+    if copy_workers > 1:
+        def write_parallel(conn, df_chunk):
+            nonlocal inserted_rows
+            inserted = write(conn, df_chunk, serialize(df_chunk))
+            with lock:
+                inserted_rows += inserted
+
+        df_iter = source.open()
+        first = next(df_iter, None)
+        if first is not None:
+            # Committed before the workers start, so that all of them see it
+            with engine.begin() as conn:
+                create_table(conn, first)
+            chunks = tqdm(itertools.chain([first], df_iter), desc=f"Loading {table_name}", disable=not progress)
+            try:
+                written = copy_parallel(engine, chunks, write_parallel, copy_workers)
+                print(f"Chunks COPYed per connection: {', '.join(map(str, written))}")
+                with engine.begin() as conn:
+                    finalize(conn)
+            except BaseException:
+                drop_staging(engine, schema, load_table)
+                raise
+
+    else:
+        # Holds the local copy retries read from, if one is made
+        with ExitStack() as cleanup:
+            for attempt in range(1, retries + 1):
+                if compact and (table_ready or if_exists == "append"):
+                    # Never send narrower chunks than the columns of the table being appended to
+                    with engine.connect() as conn:
+                        compact.sync(conn, schema, load_table)
+                # Download and decompression streams of this attempt
+                handles = ExitStack()
+                df_iter = source.open(committed_rows, handles)
+                if max_inflight_chunks > 0:
+                    chunks = pipelined(
+                        df_iter,
+                        serialize,
+                        max_inflight=max_inflight_chunks,
+                        stats=stage_stats,
+                    )
+                else:
+                    # One encoder for the whole file: its buffer is reused chunk after chunk
+                    encoder = BinaryCopyEncoder(sql_types)
+                    chunks = ((df, serialize(df, encoder)) for df in df_iter)
+
+                pending_rows = 0
+                pending_chunks = 0
+                pending_inserted = 0
+                try:
+                    with engine.connect() as conn:
+                        # Explicit transaction: COPY runs on the raw DBAPI cursor, which
+                        # SQLAlchemy would not otherwise know it has to commit
+                        trans = conn.begin()
+                        for df_chunk, payload in tqdm(chunks, desc=f"Loading {table_name}", disable=not progress):
+                            if not table_ready:
+                                with metrics.stage("load"):
+                                    create_table(conn, df_chunk)
+                            pending_inserted += write(conn, df_chunk, payload)
+                            pending_rows += len(df_chunk)
+                            pending_chunks += 1
+
+                            if commit_every and pending_chunks >= commit_every:
+                                with metrics.stage("commit"):
+                                    save_checkpoint(conn, schema, url, checkpoint_key, committed_rows + pending_rows)
+                                    trans.commit()
+                                trans = conn.begin()
+                                if rollup is not None:
+                                    rollup.commit()
+                                committed_rows += pending_rows
+                                inserted_rows += pending_inserted
+                                skipped_rows += pending_rows - pending_inserted
+                                pending_rows = pending_chunks = pending_inserted = 0
+
+                        if table_ready:
+                            finalize(conn)
+                        with metrics.stage("commit"):
+                            if commit_every:
+                                clear_checkpoint(conn, schema, url, checkpoint_key)
+                            trans.commit()
+                        committed_rows += pending_rows
+                        inserted_rows += pending_inserted
+                        skipped_rows += pending_rows - pending_inserted
+                    break
+                except RETRYABLE_ERRORS as e:
+                    # Whatever was not committed was rolled back, including a table
+                    # created in the same transaction
+                    table_ready = table_ready and committed_rows > 0
+                    if rollup is not None:
+                        rollup.rollback()
+                    if not commit_every or attempt == retries:
+                        raise
+                    if source.cache is None and "://" in url:
+                        # Retries read a local copy instead of streaming the file again;
+                        # the copy's own download resumes with Range requests
+                        spool = cleanup.enter_context(tempfile.TemporaryDirectory(prefix="ingest-spool-"))
+                        source.cache = DownloadCache(spool)
+                    print(f"Load of {table_name} failed ({e}); retrying from checkpoint row {committed_rows}")
+                    time.sleep(backoff_sec * attempt)
+                finally:
+                    chunks.close()
+                    handles.close()
+
+    for line in source.summary():
+        print(line)
+    if dedupe:
+        print(f"Skipped {skipped_rows} row(s) already in {schema}.{table_name}")
+    if stage_stats:
+        print(f"Pipeline stages for {table_name}:")
+        print(format_stage_report(list(stage_stats.values())))
+
+    if fast_load and table_ready:
+        index_columns = [c for c in INDEX_COLUMNS[color] if c in sql_types]
+        with metrics.stage("finalize"):
+            finish_fast_load(
+                engine, schema, load_table, table_name, index_columns, index_workers or len(index_columns),
+                on_swap=write_rollup if rollup_table else None,
+            )
+    if rollup_table and table_ready:
+        how = "re-aggregated from the table" if rollup_rebuild else "merged from the load"
+        print(f"Rollups for {table_name} {how} into {schema}.{rollup_table}")
+
+    return inserted_rows
+
+def load_partition(
+    engine,
+    url: str,
+    parent: str,
+    year: int,
+    month: int,
+    color: str = "yellow",
+    progress: bool = True,
+    metrics: IngestMetrics | None = None,
+    **load_kwargs,
+) -> int:
+    """
+    Load one month into a standalone table, then attach it to the range-partitioned
+    `parent` in place of the month's previous partition (see partitions.py).
+    The month is always replaced; if_exists="fail" refuses an existing partition.
+    Returns the number of rows loaded, including any outside the month that
+    were dropped before attaching.
+    Rollups are re-aggregated from the attached partition, since the stray
+    rows are only dropped after the load.
+    """
+    schema = load_kwargs["schema"]
+    rollup_table = load_kwargs.pop("rollup_table", None)
+    table_name = f"{parent}_{year}_{month:02d}"
+    staging = attach_staging_name(table_name)
+    check_load_options(color, partitioned=True, **load_kwargs)
+    columns = load_kwargs.get("columns")
+    if load_kwargs.get("if_exists") == "fail":
+        with engine.connect() as conn:
+            if table_exists(conn, schema, table_name):
+                raise ValueError(f"Partition {schema}.{table_name} already exists")
+
+    metrics = metrics or IngestMetrics(url, f"{schema}.{table_name}")
+    rows = load_month(
+        engine, url, staging, color=color, progress=progress, metrics=metrics, **{**load_kwargs, "if_exists": "replace"}
+    )
+    index_columns = [c for c in INDEX_COLUMNS[color] if not columns or c in columns]
+    with metrics.stage("finalize"):
+        attach_month(
+            engine, schema, parent, staging, table_name, PARTITION_COLUMNS[color], year, month,
+            index_columns, load_kwargs.get("index_workers") or len(index_columns),
+        )
+    if rollup_table:
+        with metrics.stage("rollup"), engine.begin() as conn:
+            ensure_rollup_table(conn, schema, rollup_table)
+            rebuild_rollup(conn, schema, rollup_table, table_name, table_name, PARTITION_COLUMNS[color])
+        print(f"Rollups for {table_name} re-aggregated from the partition into {schema}.{rollup_table}")
+    return rows
+
+def load_month_duckdb(
+    con,
+    url: str,
+    table_name: str,
+    schema: str,
+    chunk_size: int,
+    if_exists: str,
+    color: str = "yellow",
+    progress: bool = True,
+    cache: DownloadCache | None = None,
+    parser: str = "pandas",
+    metrics: IngestMetrics | None = None,
+    memory_budget: int = 0,
+    zones: ZoneLookup | None = None,
+    columns: list[str] | None = None,
+    row_filter: RowFilter | None = None,
+) -> int:
+    """
+    Stream one monthly file into a DuckDB table over connection `con`, in a
+    single transaction (see duckdb_target.py). Each parsed chunk is appended
+    as it is, with no serialization stage. if_exists, columns, row_filter and
+    zones behave as in load_month.
+    Returns the number of rows inserted.
+    """
+    check_load_options(color, if_exists=if_exists, columns=columns, row_filter=row_filter)
+    metrics = metrics or IngestMetrics(url, f"{schema}.{table_name}")
+    sizer = AdaptiveChunkSizer(memory_budget, initial_rows=chunk_size) if memory_budget else None
+    source = ChunkSource(url, color, chunk_size, parser, cache, metrics, sizer, columns, row_filter, zones)
+
+    exists = duckdb_table_exists(con, schema, table_name)
+    if exists and if_exists == "fail":
+        raise ValueError(f"Table {schema}.{table_name} already exists")
+    # The first chunk (re)creates the table, unless it is appended to an existing one
+    create = None if exists and if_exists == "append" else "replace" if exists else "create"
+
+    inserted_rows = 0
+    con.begin()
+    try:
+        with ExitStack() as handles:
+            for df_chunk in tqdm(source.open(handles=handles), desc=f"Loading {table_name}", disable=not progress):
+                t0 = time.perf_counter()
+                with metrics.stage("load"):
+                    append_chunk(con, schema, table_name, df_chunk, create)
+                create = None
+                if sizer:
+                    sizer.observe(len(df_chunk), chunk_nbytes(df_chunk), 0, time.perf_counter() - t0)
+                metrics.chunk_done(len(df_chunk))
+                inserted_rows += len(df_chunk)
+        with metrics.stage("commit"):
+            con.commit()
+    except BaseException:
+        con.rollback()
+        raise
+
+    for line in source.summary():
+        print(line)
+    return inserted_rows
+
+def connections_per_load(color: str, load_kwargs: dict, partitioned: bool = False) -> int:
+    copy_workers = max(1, load_kwargs.get("copy_workers") or 1)
+    if not (load_kwargs.get("fast_load") or partitioned):
+        return copy_workers
+    return max(copy_workers, load_kwargs.get("index_workers") or len(INDEX_COLUMNS[color]))
+
+def write_postgres_month(
+    pg_url: str,
+    color: str,
+    target_table: str,
+    load_kwargs: dict,
+    partitioned: bool,
+    pool_size: int,
+    url: str,
+    table_name: str,
+    year: int,
+    month: int,
+    metrics: IngestMetrics,
+    progress: bool,
+) -> int:
+    """
+    Month writer for --target postgres (see load_one_month).
+    The engine is created per call, so it also works inside a backfill worker
+    process, with a fixed pool of `pool_size` connections so the total number
+    of Postgres backends stays within the cap computed by run().
+    """
+    engine = create_engine(pg_url, pool_pre_ping=True, pool_size=pool_size, max_overflow=0)
+    try:
+        if partitioned:
+            return load_partition(
+                engine, url, target_table, year, month, color=color, progress=progress, metrics=metrics, **load_kwargs
+            )
+        return load_month(engine, url, table_name, color=color, progress=progress, metrics=metrics, **load_kwargs)
+    finally:
+        engine.dispose()
+
+def write_duckdb_month(
+    con,
+    color: str,
+    load_kwargs: dict,
+    url: str,
+    table_name: str,
+    year: int,
+    month: int,
+    metrics: IngestMetrics,
+    progress: bool,
+) -> int:
+    """Month writer for --target duckdb, over the open connection `con` (see load_one_month)."""
+    return load_month_duckdb(con, url, table_name, color=color, progress=progress, metrics=metrics, **load_kwargs)
+
+def load_one_month(
+    write,
+    color: str,
+    year: int,
+    month: int,
+    target_table: str,
+    schema: str,
+    source: str | None = None,
+    metrics_opts: dict | None = None,
+    progress: bool = False,
+) -> tuple[str, int, float]:
+    """
+    Load one month with `write`, a month writer with its target bound
+    (write_postgres_month or write_duckdb_month under functools.partial),
+    called as write(url, table_name, year, month, metrics, progress).
+    Returns the table name, the rows inserted and the seconds it took.
+    """
+    table_name = f"{target_table}_{year}_{month:02d}"
+    url = source or source_url(color, year, month)
+    t0 = time.perf_counter()
+    with IngestMetrics(url, f"{schema}.{table_name}", **(metrics_opts or {})) as metrics:
+        rows = write(url, table_name, year, month, metrics, progress)
+    return table_name, rows, time.perf_counter() - t0
+
+def backfill_month(*args) -> tuple[str, int, float]:
+    """
+    load_one_month for run_backfill. A failure comes back as a RuntimeError
+    carrying the original type and message: the exception has to be pickled
+    back from a pool worker, and some cannot be (an HTTPError holds the open
+    response), which would replace the real reason with a pickling error.
+    """
+    try:
+        return load_one_month(*args)
+    except Exception as e:
+        raise RuntimeError(f"{type(e).__name__}: {e}") from None
+
+def run_backfill(
+    write,
+    color: str,
+    months: list[tuple[int, int]],
+    target_table: str,
+    schema: str,
+    workers: int = 1,
+    metrics_opts: dict | None = None,
+) -> None:
+    """
+    Load `months` with the month writer `write` (see load_one_month) and print
+    an aggregate summary. With workers > 1 the months fan out over a bounded
+    process pool, so `write` must be picklable; otherwise they are loaded one
+    after another in this process.
+    """
+    print(f"Backfilling {len(months)} {color} month(s) with {workers} worker(s)")
+
+    def month_metrics_opts(year: int, month: int) -> dict:
+        opts = dict(metrics_opts or {})
+        if opts.get("prom_path"):
+            # One textfile per month; the textfile collector reads every *.prom file
+            root, ext = os.path.splitext(opts["prom_path"])
+            opts["prom_path"] = f"{root}_{target_table}_{year}_{month:02d}{ext}"
+        return opts
+
+    def results():
+        """((year, month), result of backfill_month or the error it raised), as months finish."""
+        if workers == 1:
+            for year, month in months:
+                try:
+                    yield (year, month), backfill_month(
+                        write, color, year, month, target_table, schema, None, month_metrics_opts(year, month)
+                    )
+                except Exception as e:
+                    yield (year, month), e
+            return
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(
+                    backfill_month, write, color, year, month, target_table, schema, None,
+                    month_metrics_opts(year, month),
+                ): (year, month)
+                for year, month in months
+            }
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result()
+                except Exception as e:
+                    yield futures[future], e
+
+    total_rows = 0
+    failed = []
+    t0 = time.perf_counter()
+    for (year, month), result in results():
+        if isinstance(result, Exception):
+            failed.append((year, month))
+            print(f"FAILED {year}-{month:02d}: {result}")
+            continue
+        table_name, rows, elapsed = result
+        total_rows += rows
+        print(f"Loaded {table_name}: {rows} rows in {elapsed:.1f}s ({rows / max(elapsed, 1e-9):,.0f} rows/s)")
+
+    elapsed = time.perf_counter() - t0
+    print(
+        f"Backfill done. Months: {len(months) - len(failed)}/{len(months)}. "
+        f"Rows: {total_rows}. Wall time: {elapsed:.1f}s. "
+        f"Throughput: {total_rows / max(elapsed, 1e-9):,.0f} rows/s"
+    )
+    if failed:
+        raise click.ClickException(
+            "Failed months: " + ", ".join(f"{y}-{m:02d}" for y, m in sorted(failed))
+        )
+
 @click.command()
 @click.option("--pg-host", default="localhost", show_default=True)
 @click.option("--pg-port", type=int, default=5432, show_default=True)
@@ -97,9 +1229,175 @@ def copy_insert(conn, full_table_name: str, df: pd.DataFrame):
 @click.option("--pg-pass", default="root", show_default=True)
 @click.option("--year", type=int, default=2021, show_default=True)
 @click.option("--month", type=int, default=1, show_default=True)
-@click.option("--target-table", default="yellow_taxi_data", show_default=True)
+@click.option(
+    "--color",
+    type=click.Choice(sorted(TAXI_SCHEMAS), case_sensitive=False),
+    default="yellow",
+    show_default=True,
+)
+@click.option(
+    "--source",
+    default=None,
+    help="Load this local file or URL instead of the TLC release for --year/--month (e.g. generate_trips.py output)",
+)
+@click.option(
+    "--months",
+    "month_range",
+    default=None,
+    help="Backfill a month range, e.g. 2019-01:2021-12 (overrides --year/--month)",
+)
+@click.option(
+    "--workers",
+    type=int,
+    default=4,
+    show_default=True,
+    help="Worker processes for --months backfill",
+)
+@click.option(
+    "--max-pg-connections",
+    type=int,
+    default=8,
+    show_default=True,
+    help="Upper bound on concurrent Postgres connections during backfill",
+)
+@click.option(
+    "--pipelined/--no-pipelined",
+    "use_pipeline",
+    default=False,
+    show_default=True,
+    help="Overlap CSV parsing, serialization and COPY in separate stages",
+)
+@click.option(
+    "--max-inflight-chunks",
+    type=int,
+    default=4,
+    show_default=True,
+    help="Memory cap for --pipelined: chunks held across all stages at once",
+)
+@click.option(
+    "--copy-workers",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Connections COPYing chunks of the same file at once, into a staging table published when all are done",
+)
+@click.option(
+    "--fast-load/--no-fast-load",
+    default=False,
+    show_default=True,
+    help="Load into an UNLOGGED table, build indexes in parallel, then swap it in",
+)
+@click.option(
+    "--index-workers",
+    type=int,
+    default=0,
+    help="Parallel index builds for --fast-load and --partitioned  [default: one per index]",
+)
+@click.option(
+    "--partitioned/--no-partitioned",
+    default=False,
+    show_default=True,
+    help="Attach each month as a partition of --target-table, range-partitioned on pickup time",
+)
+@click.option(
+    "--commit-every",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Commit and checkpoint every N chunks so an interrupted load resumes where it stopped (0 = one transaction)",
+)
+@click.option(
+    "--cache-dir",
+    envvar="TLC_CACHE_DIR",
+    default=None,
+    help=f"Keep downloaded files in this local cache (e.g. {DEFAULT_CACHE_DIR}); env TLC_CACHE_DIR",
+)
+@click.option(
+    "--cache-max-gb",
+    type=float,
+    default=20,
+    show_default=True,
+    help="Size limit of --cache-dir; least recently used files are evicted",
+)
+@click.option(
+    "--parser",
+    type=click.Choice(["pandas", "arrow"], case_sensitive=False),
+    default="pandas",
+    show_default=True,
+    help="arrow = pyarrow multithreaded streaming CSV reader; chunks go to COPY without pandas",
+)
+@click.option(
+    "--dedupe/--no-dedupe",
+    default=False,
+    show_default=True,
+    help=(
+        "Add the flows' unique_row_id (md5 of the trip key) and skip rows already in the table; "
+        "use with --if-exists append"
+    ),
+)
+@click.option(
+    "--enrich-zones",
+    is_flag=True,
+    default=False,
+    help="Add pickup/dropoff borough and zone columns from the zone lookup, so queries need no join",
+)
+@click.option(
+    "--zones-url",
+    default=ZONES_URL,
+    show_default=True,
+    help="taxi_zone_lookup.csv used by --enrich-zones (URL or local path)",
+)
+@click.option(
+    "--columns",
+    default=None,
+    help="Comma-separated columns to load; the others are never parsed and the table has only these  [default: all]",
+)
+@click.option(
+    "--where",
+    "where",
+    default=None,
+    help="Load only rows matching this filter, e.g. \"fare_amount > 0 and payment_type in (1, 2)\" (see row_filters.py)",
+)
+@click.option(
+    "--rollups",
+    is_flag=True,
+    default=False,
+    help="Maintain hourly per-pickup-zone trip count and sums in <target-table>_hourly_zone during the load",
+)
+@click.option(
+    "--compact-dtypes",
+    is_flag=True,
+    default=False,
+    help="Downcast code columns to Int8/Int16 and the flag to a categorical; store them as SMALLINT / CHAR(1)",
+)
+@click.option(
+    "--metrics-jsonl",
+    default=None,
+    help="Append per-chunk stage timings and a summary as JSON lines to this file ('-' = stdout)",
+)
+@click.option(
+    "--metrics-prom",
+    default=None,
+    help="Write Prometheus text metrics to this file (one file per month with --months)",
+)
+@click.option("--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port at /metrics")
+@click.option(
+    "--target",
+    default="postgres",
+    show_default=True,
+    help="postgres (the --pg-* options) or duckdb:<path> to load into a DuckDB file",
+)
+@click.option("--target-table", default=None, help="Table name prefix  [default: <color>_taxi_data]")
 @click.option("--schema", default="public", show_default=True)
 @click.option("--chunk-size", type=int, default=100_000, show_default=True)
+@click.option(
+    "--memory-budget",
+    default=None,
+    help=(
+        "Adapt the chunk size to stay under this much memory per load (e.g. 2G); "
+        "--chunk-size becomes the starting size"
+    ),
+)
 @click.option(
     "--if-exists",
     type=click.Choice(["replace", "append", "fail"], case_sensitive=False),
@@ -108,10 +1406,13 @@ def copy_insert(conn, full_table_name: str, df: pd.DataFrame):
 )
 @click.option(
     "--insert-method",
-    type=click.Choice(["copy", "multi", "default"], case_sensitive=False),
+    type=click.Choice(["copy", "copy-binary", "multi", "default"], case_sensitive=False),
     default="copy",
     show_default=True,
-    help="copy = fastest for Postgres, multi = pandas multi-row INSERT, default = pandas default executemany",
+    help=(
+        "copy = COPY with CSV text, copy-binary = COPY with NumPy-encoded binary format, "
+        "multi = pandas multi-row INSERT, default = pandas default executemany"
+    ),
 )
 @click.option(
     "--to-sql-chunksize",
@@ -122,64 +1423,131 @@ def copy_insert(conn, full_table_name: str, df: pd.DataFrame):
 )
 def run(
     pg_host, pg_port, pg_db, pg_user, pg_pass,
-    year, month, target_table, schema, chunk_size,
-    if_exists, insert_method, to_sql_chunksize
+    year, month, color, source, month_range, workers, max_pg_connections,
+    use_pipeline, max_inflight_chunks, copy_workers, fast_load, index_workers, partitioned, commit_every,
+    cache_dir, cache_max_gb, parser, dedupe, enrich_zones, zones_url, columns, where, rollups, compact_dtypes,
+    metrics_jsonl, metrics_prom, metrics_port,
+    target, target_table, schema, chunk_size, memory_budget, if_exists, insert_method, to_sql_chunksize
 ):
-    url = f"{PREFIX}yellow_tripdata_{year}-{month:02d}.csv.gz"
-    table_name = f"{target_table}_{year}_{month:02d}"
-    full_table = f'{schema}."{table_name}"'  # schema.table with basic quoting
-
-    engine = create_engine(
-        f"postgresql://{pg_user}:{pg_pass}@{pg_host}:{pg_port}/{pg_db}",
-        pool_pre_ping=True,
+    color = color.lower()
+    try:
+        memory_budget = parse_size(memory_budget) if memory_budget else 0
+        if memory_budget:
+            check_memory_budget(memory_budget)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--memory-budget")
+    try:
+        columns = parse_columns(columns) if columns else None
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--columns")
+    try:
+        row_filter = RowFilter.parse(where) if where else None
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--where")
+    try:
+        duckdb_path = parse_target(target)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--target")
+    target_table = target_table or f"{color}_taxi_data"
+    pg_url = f"postgresql://{pg_user}:{pg_pass}@{pg_host}:{pg_port}/{pg_db}"
+    cache = DownloadCache(cache_dir, max_bytes=int(cache_max_gb * 1024**3)) if cache_dir else None
+    load_kwargs = dict(
+        schema=schema,
+        chunk_size=chunk_size,
+        if_exists=if_exists,
+        insert_method=insert_method,
+        to_sql_chunksize=to_sql_chunksize,
+        max_inflight_chunks=max_inflight_chunks if use_pipeline else 0,
+        copy_workers=copy_workers,
+        fast_load=fast_load,
+        index_workers=index_workers,
+        commit_every=commit_every,
+        cache=cache,
+        parser=parser,
+        memory_budget=memory_budget,
+        compact_dtypes=compact_dtypes,
+        dedupe=dedupe,
+        # Read once here; backfill workers get a copy of the arrays
+        zones=ZoneLookup.load(zones_url, cache) if enrich_zones else None,
+        rollup_table=rollup_table_name(target_table) if rollups else None,
+        columns=columns,
+        row_filter=row_filter,
     )
+    try:
+        check_load_options(color, partitioned=partitioned, **load_kwargs)
+    except ValueError as e:
+        raise click.UsageError(str(e))
 
-    df_iter = open_csv_iterator(url, chunk_size=chunk_size)
+    if month_range and source:
+        raise click.UsageError("--source loads a single file; it cannot be combined with --months")
+    if month_range and metrics_port:
+        raise click.UsageError("--metrics-port serves a single load; use --metrics-prom with --months")
+    months = parse_month_range(month_range) if month_range else None
+    metrics_opts = dict(jsonl_path=metrics_jsonl, prom_path=metrics_prom)
 
-    first = True
-    inserted_rows = 0
+    if duckdb_path:
+        postgres_only = {
+            "--fast-load": fast_load,
+            "--partitioned": partitioned,
+            "--commit-every": commit_every,
+            "--dedupe": dedupe,
+            "--rollups": rollups,
+            "--compact-dtypes": compact_dtypes,
+            "--pipelined": use_pipeline,
+            "--copy-workers": copy_workers > 1,
+        }
+        used = [flag for flag, value in postgres_only.items() if value]
+        if used:
+            raise click.UsageError(f"{', '.join(used)}: Postgres-only, not available with --target duckdb")
+        duckdb_kwargs = {
+            k: load_kwargs[k]
+            for k in ("chunk_size", "if_exists", "cache", "parser", "memory_budget", "zones", "columns", "row_filter")
+        }
+        schema = duckdb_kwargs["schema"] = duckdb_schema(schema)
+        # A DuckDB file has a single writer: months load one after another over one connection
+        con = duckdb_connect(duckdb_path, schema)
+        try:
+            write = partial(write_duckdb_month, con, color, duckdb_kwargs)
+            if months:
+                run_backfill(write, color, months, target_table, schema, 1, metrics_opts)
+                return
+            table_name, inserted_rows, _ = load_one_month(
+                write, color, year, month, target_table, schema, source, {**metrics_opts, "prom_port": metrics_port},
+                progress=True,
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        finally:
+            con.close()
+        print(f"Done. Inserted rows: {inserted_rows}. Table: {schema}.{table_name} in {duckdb_path}")
+        return
+
+    if rollups:
+        # Created up front so backfill workers do not race to create it
+        engine = create_engine(pg_url)
+        with engine.begin() as conn:
+            ensure_rollup_table(conn, schema, load_kwargs["rollup_table"])
+        engine.dispose()
 
-    with engine.begin() as conn:
-        for df_chunk in tqdm(df_iter, desc=f"Loading {table_name}"):
-            if first:
-                df_chunk.head(0).to_sql(
-                    name=table_name,
-                    con=conn,
-                    schema=schema,
-                    if_exists=if_exists,
-                    index=False,
-                    dtype=SQL_TYPES,
-                )
-                first = False
-
-            if insert_method == "copy":
-                copy_insert(conn, full_table, df_chunk)
-            elif insert_method == "multi":
-                # Smaller chunks are usually better than 10k for multi-row INSERT
-                df_chunk.to_sql(
-                    name=table_name,
-                    con=conn,
-                    schema=schema,
-                    if_exists="append",
-                    index=False,
-                    method="multi",
-                    chunksize=to_sql_chunksize,
-                    dtype=SQL_TYPES,
-                )
-            else:  # "default"
-                df_chunk.to_sql(
-                    name=table_name,
-                    con=conn,
-                    schema=schema,
-                    if_exists="append",
-                    index=False,
-                    chunksize=to_sql_chunksize,
-                    dtype=SQL_TYPES,
-                )
-
-            inserted_rows += len(df_chunk)
-
-    print(f"Done. Inserted rows: {inserted_rows}. Table: {schema}.{table_name}. Method: {insert_method}")
+    per_load = connections_per_load(color, load_kwargs, partitioned)
+    if months:
+        workers = max(1, min(workers, max_pg_connections // per_load, len(months)))
+        write = partial(write_postgres_month, pg_url, color, target_table, load_kwargs, partitioned, per_load)
+        run_backfill(write, color, months, target_table, schema, workers, metrics_opts)
+        return
+
+    # Room for one connection per COPY worker or parallel index build
+    write = partial(write_postgres_month, pg_url, color, target_table, load_kwargs, partitioned, max(5, per_load))
+    try:
+        table_name, inserted_rows, _ = load_one_month(
+            write, color, year, month, target_table, schema, source, {**metrics_opts, "prom_port": metrics_port},
+            progress=True,
+        )
+    except ValueError as e:
+        # e.g. --if-exists fail on an existing table or partition, reported like the DuckDB target does
+        raise click.ClickException(str(e))
+    partition_of = f" (partition of {schema}.{target_table})" if partitioned else ""
+    print(f"Done. Inserted rows: {inserted_rows}. Table: {schema}.{table_name}{partition_of}. Method: {insert_method}")
 
 if __name__ == "__main__":
     run()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Per-stage timing and throughput metrics for the ingest scripts.
+
+Stages are timed with `metrics.stage(name)`. Nested stages are exclusive: time
+spent reading the gzip stream inside `parse` is booked to `decompress` (and the
+raw reads under it to `download` / `read`), not to `parse`. Timings are kept per
+thread, so stages that run in background threads (--pipelined, Arrow's reader)
+may overlap in wall-clock time.
+
+Output:
+    JSON lines   one "chunk" record per written chunk with the stage seconds and
+                 bytes since the previous chunk, and a final "summary" record
+    Prometheus   text exposition written atomically to a file after every chunk
+                 (node_exporter textfile collector) and/or served on /metrics
+
+homework/hw1/scripts_ingest imports this module from here; its Docker image
+copies it in from the pipeline_scripts build context.
+"""
+
+import gzip
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STAGES = ("download", "read", "decompress", "parse", "serialize", "load", "commit", "finalize")
+
+
+def peak_rss_bytes() -> int:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def payload_size(payload) -> int:
+    """Bytes in a serialized chunk (memoryview or file-like buffer); 0 if there is none."""
+    if payload is None:
+        return 0
+    if isinstance(payload, memoryview):
+        return payload.nbytes
+    pos = payload.tell()
+    end = payload.seek(0, os.SEEK_END)
+    payload.seek(pos)
+    return end
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _TimedReader:
+    """File-like wrapper that books read() time to a stage and counts the bytes."""
+
+    mode = "rb"  # pandas checks this to decide whether to decode
+
+    def __init__(self, raw, metrics: "IngestMetrics", stage: str, counter: str, closes=None):
+        self._raw = raw
+        self._metrics = metrics
+        self._stage = stage
+        self._counter = counter
+        self._closes = closes
+
+    def read(self, size: int = -1) -> bytes:
+        with self._metrics.stage(self._stage):
+            data = self._raw.read(size)
+        self._metrics.count(self._counter, len(data))
+        return data
+
+    def readinto(self, b) -> int:
+        with self._metrics.stage(self._stage):
+            n = self._raw.readinto(b)
+        self._metrics.count(self._counter, n or 0)
+        return n
+
+    def read1(self, size: int = -1) -> bytes:
+        # io.TextIOWrapper prefers read1; keep it on the timed path
+        return self.read(size)
+
+    def readable(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        # GzipFile(fileobj=...) leaves the stream under it open
+        self._raw.close()
+        if self._closes is not None:
+            self._closes.close()
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+
+class IngestMetrics:
+    def __init__(
+        self,
+        source: str,
+        table: str,
+        jsonl_path: str | None = None,
+        prom_path: str | None = None,
+        prom_port: int | None = None,
+    ):
+        self.source = source
+        self.table = table
+        self.jsonl_path = jsonl_path
+        self.prom_path = prom_path
+
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stage_totals = dict.fromkeys(STAGES, 0.0)
+        self._counters = {"bytes_in": 0, "bytes_decompressed": 0, "bytes_out": 0}
+        self._last_stages = dict(self._stage_totals)
+        self._last_counters = dict(self._counters)
+        self.rows = 0
+        self.chunks = 0
+        self.status = "running"
+        self._t_start = time.perf_counter()
+        self._t_last = self._t_start
+
+        self._server = None
+        if prom_port:
+            self._serve(prom_port)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.jsonl_path or self.prom_path or self._server)
+
+    # ---------------------------------------------------------------- recording
+
+    @contextmanager
+    def stage(self, name: str):
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [name, time.perf_counter(), 0.0]  # name, start, time spent in nested stages
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = time.perf_counter() - frame[1]
+            if stack:
+                stack[-1][2] += elapsed
+            with self._lock:
+                self._stage_totals[name] = self._stage_totals.get(name, 0.0) + elapsed - frame[2]
+
+    def count(self, counter: str, n: int) -> None:
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + n
+
+    def timed_iter(self, iterable, stage: str = "parse"):
+        """Yield from `iterable`, booking the time of every next() to `stage`."""
+        it = iter(iterable)
+        while True:
+            with self.stage(stage):
+                item = next(it, None)
+            if item is None:
+                return
+            yield item
+
+    def open(self, source: str):
+        """
+        Open a local path or URL as a binary stream whose raw reads are booked to
+        `download` / `read` and, for .gz files, decompression to `decompress`.
+        Closing it closes the connection or file under it too.
+        """
+        if "://" in source:
+            stream = _TimedReader(urllib.request.urlopen(source), self, "download", "bytes_in")
+        else:
+            stream = _TimedReader(open(source, "rb"), self, "read", "bytes_in")
+        if source.split("?", 1)[0].endswith(".gz"):
+            stream = _TimedReader(gzip.GzipFile(fileobj=stream), self, "decompress", "bytes_decompressed", closes=stream)
+        return stream
+
+    def chunk_done(self, rows: int) -> None:
+        now = time.perf_counter()
+        with self._lock:
+            self.rows += rows
+            self.chunks += 1
+            stages = {k: v - self._last_stages.get(k, 0.0) for k, v in self._stage_totals.items()}
+            counters = {k: v - self._last_counters.get(k, 0) for k, v in self._counters.items()}
+            self._last_stages = dict(self._stage_totals)
+            self._last_counters = dict(self._counters)
+            elapsed, self._t_last = now - self._t_last, now
+
+        self._emit(
+            {
+                "event": "chunk",
+                "chunk": self.chunks,
+                "rows": rows,
+                "rows_total": self.rows,
+                "seconds": round(elapsed, 6),
+                "rows_per_sec": round(rows / elapsed, 1) if elapsed else None,
+                "stages": {k: round(v, 6) for k, v in stages.items() if v},
+                **counters,
+                "peak_rss_bytes": peak_rss_bytes(),
+            }
+        )
+        self._write_prom()
+
+    def close(self, status: str = "ok") -> None:
+        self.status = status
+        elapsed = time.perf_counter() - self._t_start
+        self._emit(
+            {
+                "event": "summary",
+                "status": status,
+                "chunks": self.chunks,
+                "rows": self.rows,
+                "seconds": round(elapsed, 6),
+                "rows_per_sec": round(self.rows / elapsed, 1) if elapsed else None,
+                "stages": {k: round(v, 6) for k, v in self._stage_totals.items() if v},
+                **self._counters,
+                "peak_rss_bytes": peak_rss_bytes(),
+            }
+        )
+        self._write_prom()
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close("ok" if exc_type is None else "failed")
+        return False
+
+    # ------------------------------------------------------------------ output
+
+    def _emit(self, record: dict) -> None:
+        if not self.jsonl_path:
+            return
+        line = json.dumps({"ts": time.time(), "source": self.source, "table": self.table, **record}) + "\n"
+        if self.jsonl_path == "-":
+            sys.stdout.write(line)
+            sys.stdout.flush()
+            return
+        # One write per line in append mode, so several processes can share a file
+        with open(self.jsonl_path, "a", encoding="utf-8") as f:
+            f.write(line)
+
+    def render_prometheus(self) -> str:
+        labels = f'source="{_escape(self.source)}",table="{_escape(self.table)}"'
+        elapsed = time.perf_counter() - self._t_start
+        with self._lock:
+            stages = dict(self._stage_totals)
+            counters = dict(self._counters)
+
+        lines = [
+            "# HELP ingest_stage_seconds_total Time spent per ingest stage.",
+            "# TYPE ingest_stage_seconds_total counter",
+        ]
+        lines += [f'ingest_stage_seconds_total{{{labels},stage="{k}"}} {v:.6f}' for k, v in stages.items()]
+        lines += [
+            "# HELP ingest_bytes_total Bytes read from the source, after decompression, and sent to the database.",
+            "# TYPE ingest_bytes_total counter",
+        ]
+        lines += [f'ingest_bytes_total{{{labels},kind="{k[6:]}"}} {v}' for k, v in counters.items()]
+        lines += [
+            "# HELP ingest_rows_total Rows written.",
+            "# TYPE ingest_rows_total counter",
+            f"ingest_rows_total{{{labels}}} {self.rows}",
+            "# HELP ingest_chunks_total Chunks written.",
+            "# TYPE ingest_chunks_total counter",
+            f"ingest_chunks_total{{{labels}}} {self.chunks}",
+            "# HELP ingest_duration_seconds Wall time since the load started.",
+            "# TYPE ingest_duration_seconds gauge",
+            f"ingest_duration_seconds{{{labels}}} {elapsed:.6f}",
+            "# HELP ingest_rows_per_second Average throughput of the load.",
+            "# TYPE ingest_rows_per_second gauge",
+            f"ingest_rows_per_second{{{labels}}} {self.rows / elapsed if elapsed else 0:.1f}",
+            "# HELP ingest_peak_rss_bytes Peak resident set size of the process.",
+            "# TYPE ingest_peak_rss_bytes gauge",
+            f"ingest_peak_rss_bytes{{{labels}}} {peak_rss_bytes()}",
+            "# HELP ingest_success 1 if the load finished, 0 if it failed, absent while running.",
+            "# TYPE ingest_success gauge",
+        ]
+        if self.status != "running":
+            lines.append(f"ingest_success{{{labels}}} {int(self.status == 'ok')}")
+        return "\n".join(lines) + "\n"
+
+    def _write_prom(self) -> None:
+        if not self.prom_path:
+            return
+        tmp = f"{self.prom_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, self.prom_path)
+
+    def _serve(self, port: int) -> None:
+        metrics = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("", port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
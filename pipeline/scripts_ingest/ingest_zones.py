@@ -3,12 +3,17 @@
 
 import io
 import time
+from contextlib import nullcontext
 import pandas as pd
 from tqdm.auto import tqdm
 from sqlalchemy import create_engine
 from sqlalchemy.types import BigInteger, String
 import click
 
+from download_cache import DownloadCache
+from ingest_metrics import IngestMetrics, payload_size
+from pg_binary_copy import BinaryCopyEncoder, copy_binary
+
 URL = "https://github.com/DataTalksClub/nyc-tlc-data/releases/download/misc/taxi_zone_lookup.csv"
 
 PANDAS_DTYPE = {
@@ -25,12 +30,23 @@ SQL_TYPES = {
     "service_zone": String(),
 }
 
-def open_csv_iterator(url: str, chunk_size: int, retries: int = 3, backoff_sec: int = 2):
+def open_csv_iterator(
+    url: str,
+    chunk_size: int,
+    retries: int = 3,
+    backoff_sec: int = 2,
+    cache: DownloadCache | None = None,
+    metrics: IngestMetrics | None = None,
+):
     last_err = None
     for attempt in range(1, retries + 1):
         try:
+            source = url
+            if cache:
+                with metrics.stage("download") if metrics else nullcontext():
+                    source = cache.fetch(url)
             return pd.read_csv(
-                url,
+                metrics.open(source) if metrics and metrics.enabled else source,
                 dtype=PANDAS_DTYPE,
                 iterator=True,
                 chunksize=chunk_size,
@@ -42,15 +58,21 @@ def open_csv_iterator(url: str, chunk_size: int, retries: int = 3, backoff_sec:
             else:
                 raise last_err
 
-def copy_insert(conn, full_table_name: str, df: pd.DataFrame):
+def serialize_csv(df: pd.DataFrame) -> io.StringIO:
+    buf = io.StringIO()
+    df.to_csv(buf, index=False, header=False, na_rep="\\N")
+    buf.seek(0)
+    return buf
+
+def copy_insert(conn, full_table_name: str, df: pd.DataFrame, buf: io.StringIO | None = None):
     """
     Fast Postgres bulk load using COPY FROM STDIN.
     - Uses \\N for NULLs.
     - No header, CSV format, columns in df order.
+    - Pass `buf` to reuse a chunk already rendered with serialize_csv.
     """
-    buf = io.StringIO()
-    df.to_csv(buf, index=False, header=False, na_rep="\\N")
-    buf.seek(0)
+    if buf is None:
+        buf = serialize_csv(df)
 
     cols = ",".join([f'"{c}"' for c in df.columns])
     sql = f"COPY {full_table_name} ({cols}) FROM STDIN WITH (FORMAT CSV, NULL '\\N')"
@@ -69,6 +91,10 @@ def copy_insert(conn, full_table_name: str, df: pd.DataFrame):
 @click.option("--pg-user", default="root", show_default=True)
 @click.option("--pg-pass", default="root", show_default=True)
 @click.option("--target-table", default="taxi_zone_lookup", show_default=True)
+@click.option("--cache-dir", envvar="TLC_CACHE_DIR", default=None, help="Local download cache; env TLC_CACHE_DIR")
+@click.option("--metrics-jsonl", default=None, help="Append stage timings as JSON lines to this file ('-' = stdout)")
+@click.option("--metrics-prom", default=None, help="Write Prometheus text metrics to this file")
+@click.option("--metrics-port", type=int, default=None, help="Serve Prometheus metrics on this port at /metrics")
 @click.option("--schema", default="public", show_default=True)
 @click.option("--chunk-size", type=int, default=10_000, show_default=True)
 @click.option(
@@ -79,9 +105,10 @@ def copy_insert(conn, full_table_name: str, df: pd.DataFrame):
 )
 @click.option(
     "--insert-method",
-    type=click.Choice(["copy", "multi", "default"], case_sensitive=False),
+    type=click.Choice(["copy", "copy-binary", "multi", "default"], case_sensitive=False),
     default="copy",
     show_default=True,
+    help="copy = COPY with CSV text, copy-binary = COPY with binary format, multi/default = pandas to_sql",
 )
 @click.option(
     "--to-sql-chunksize",
@@ -92,8 +119,8 @@ def copy_insert(conn, full_table_name: str, df: pd.DataFrame):
 )
 def run(
     pg_host, pg_port, pg_db, pg_user, pg_pass,
-    target_table, schema, chunk_size,
-    if_exists, insert_method, to_sql_chunksize
+    target_table, cache_dir, metrics_jsonl, metrics_prom, metrics_port,
+    schema, chunk_size, if_exists, insert_method, to_sql_chunksize
 ):
     table_name = target_table
     full_table = f'{schema}."{table_name}"'
@@ -103,48 +130,64 @@ def run(
         pool_pre_ping=True,
     )
 
-    df_iter = open_csv_iterator(URL, chunk_size=chunk_size)
+    cache = DownloadCache(cache_dir) if cache_dir else None
+    metrics = IngestMetrics(URL, f"{schema}.{table_name}", metrics_jsonl, metrics_prom, metrics_port)
 
+    encoder = BinaryCopyEncoder(SQL_TYPES)
     first = True
     inserted_rows = 0
 
-    with engine.begin() as conn:
-        for df_chunk in tqdm(df_iter, desc=f"Loading {table_name}"):
-            if first:
-                df_chunk.head(0).to_sql(
-                    name=table_name,
-                    con=conn,
-                    schema=schema,
-                    if_exists=if_exists,
-                    index=False,
-                    dtype=SQL_TYPES,
-                )
-                first = False
-
-            if insert_method == "copy":
-                copy_insert(conn, full_table, df_chunk)
-            elif insert_method == "multi":
-                df_chunk.to_sql(
-                    name=table_name,
-                    con=conn,
-                    schema=schema,
-                    if_exists="append",
-                    index=False,
-                    method="multi",
-                    chunksize=to_sql_chunksize,
-                    dtype=SQL_TYPES,
-                )
-            else:  # "default"
-                df_chunk.to_sql(
-                    name=table_name,
-                    con=conn,
-                    schema=schema,
-                    if_exists="append",
-                    index=False,
-                    chunksize=to_sql_chunksize,
-                    dtype=SQL_TYPES,
-                )
-
+    with metrics, engine.begin() as conn:
+        df_iter = open_csv_iterator(URL, chunk_size=chunk_size, cache=cache, metrics=metrics)
+        for df_chunk in tqdm(metrics.timed_iter(df_iter, "parse"), desc=f"Loading {table_name}"):
+            with metrics.stage("serialize"):
+                if insert_method == "copy":
+                    payload = serialize_csv(df_chunk)
+                elif insert_method == "copy-binary":
+                    payload = encoder.encode(df_chunk)
+                else:
+                    payload = None
+            metrics.count("bytes_out", payload_size(payload))
+
+            with metrics.stage("load"):
+                if first:
+                    df_chunk.head(0).to_sql(
+                        name=table_name,
+                        con=conn,
+                        schema=schema,
+                        if_exists=if_exists,
+                        index=False,
+                        dtype=SQL_TYPES,
+                    )
+                    first = False
+
+                if insert_method == "copy":
+                    copy_insert(conn, full_table, df_chunk, payload)
+                elif insert_method == "copy-binary":
+                    copy_binary(conn, full_table, df_chunk.columns, payload)
+                elif insert_method == "multi":
+                    df_chunk.to_sql(
+                        name=table_name,
+                        con=conn,
+                        schema=schema,
+                        if_exists="append",
+                        index=False,
+                        method="multi",
+                        chunksize=to_sql_chunksize,
+                        dtype=SQL_TYPES,
+                    )
+                else:  # "default"
+                    df_chunk.to_sql(
+                        name=table_name,
+                        con=conn,
+                        schema=schema,
+                        if_exists="append",
+                        index=False,
+                        chunksize=to_sql_chunksize,
+                        dtype=SQL_TYPES,
+                    )
+
+            metrics.chunk_done(len(df_chunk))
             inserted_rows += len(df_chunk)
 
     print(f"Done. Inserted rows: {inserted_rows}. Table: {schema}.{table_name}. Method: {insert_method}")
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Intra-file parallel COPY used by ingest_data --copy-workers.
+
+A COPY runs in one Postgres backend, on one core, however many the server
+has. With --copy-workers N, the chunks of a single file are spread over N
+threads, each holding its own connection and transaction and COPYing into the
+same table at the same time. A worker takes the next chunk as soon as it is
+free, serializes it itself and sends it; psycopg2 releases the GIL while the
+payload is on the wire, so the backends really run side by side.
+
+The load is all or nothing. Transactions on N connections cannot commit
+atomically, so the workers load a staging table nobody reads:
+
+    1. the staging table is created (from the first chunk) and committed
+    2. the workers COPY into it; once the file is exhausted, each commits.
+       If any worker or the reader fails, the other workers stop and roll
+       back, and the staging table is dropped
+    3. one transaction publishes it: the target is replaced by the staging
+       table, or, with if_exists="append", the staged rows are inserted into
+       the target and the staging table is dropped
+
+Until step 3 readers see the target as it was.
+"""
+
+import queue
+import threading
+
+from sqlalchemy import text
+
+from fast_load import quoted, table_exists
+
+_DONE = object()
+
+
+def copy_parallel(engine, chunks, write, workers: int, max_queued: int = 0) -> list[int]:
+    """
+    Call write(conn, chunk) for every chunk of `chunks` on `workers` threads,
+    each with one connection and one transaction. A transaction is committed
+    only if the whole iterator was consumed and no write failed; otherwise
+    every open transaction is rolled back and the first error is raised.
+    At most `max_queued` chunks (default 2 per worker) wait for a worker.
+    Returns the number of chunks each worker wrote.
+    """
+    if workers < 1:
+        raise ValueError("workers must be >= 1")
+
+    pending = queue.Queue(maxsize=max_queued or 2 * workers)
+    failed = threading.Event()
+    finished = threading.Event()
+    errors = []
+    written = [0] * workers
+
+    def worker(i: int):
+        done = False
+        try:
+            with engine.connect() as conn:
+                trans = conn.begin()
+                while True:
+                    item = pending.get()
+                    if item is _DONE:
+                        done = True
+                        break
+                    if not failed.is_set():
+                        write(conn, item)
+                        written[i] += 1
+                # Commit only when the reader got to the end of the file
+                if failed.is_set() or not finished.is_set():
+                    trans.rollback()
+                else:
+                    trans.commit()
+        except BaseException as e:
+            errors.append(e)
+            failed.set()
+            # Keep draining so the reader never blocks on a full queue
+            while not done:
+                done = pending.get() is _DONE
+
+    threads = [threading.Thread(target=worker, args=(i,), name=f"copy-worker-{i}", daemon=True) for i in range(workers)]
+    for t in threads:
+        t.start()
+
+    try:
+        for chunk in chunks:
+            if failed.is_set():
+                break
+            pending.put(chunk)
+        else:
+            finished.set()
+    except BaseException:
+        failed.set()
+        raise
+    finally:
+        for _ in threads:
+            pending.put(_DONE)
+        for t in threads:
+            t.join()
+
+    if errors:
+        raise errors[0]
+    return written
+
+
+def append_staging(conn, schema: str, staging: str, target: str, columns: list[str]) -> None:
+    """
+    Move the rows of `staging` into `target` and drop `staging`, on the
+    caller's transaction. A missing target is replaced by the staging table.
+    """
+    if not table_exists(conn, schema, target):
+        conn.execute(text(f'ALTER TABLE {quoted(schema, staging)} RENAME TO "{target}"'))
+        return
+    cols = ", ".join(f'"{c}"' for c in columns)
+    conn.execute(text(f"INSERT INTO {quoted(schema, target)} ({cols}) SELECT {cols} FROM {quoted(schema, staging)}"))
+    conn.execute(text(f"DROP TABLE {quoted(schema, staging)}"))
+
+
+def replace_with_staging(conn, schema: str, staging: str, target: str) -> None:
+    """Drop `target` and rename `staging` into its place, on the caller's transaction."""
+    conn.execute(text(f"DROP TABLE IF EXISTS {quoted(schema, target)}"))
+    conn.execute(text(f'ALTER TABLE {quoted(schema, staging)} RENAME TO "{target}"'))
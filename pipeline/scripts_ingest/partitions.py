@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Range-partitioned target used by ingest_data --partitioned.
+
+The parent table `<target-table>` is partitioned by pickup time, one partition
+per month named `<target-table>_<year>_<month>`. A month is never loaded into
+the parent. It goes to a standalone side table, which is then prepared and
+attached:
+
+    1. rows whose pickup time falls outside the month are deleted (the TLC
+       files carry a few stray timestamps); the number is printed
+    2. a CHECK constraint matching the partition bounds is added, so ATTACH
+       PARTITION does not have to scan the table again
+    3. the partition indexes are built in parallel (unless fast load already
+       built them)
+    4. one short transaction creates the parent on first use, drops the
+       month's previous partition, renames the side table into place and
+       attaches it; the CHECK constraint is dropped afterwards
+
+Other months are never touched, and queries on the parent get partition
+pruning on the pickup time.
+"""
+
+import time
+
+from sqlalchemy import text
+
+from fast_load import build_indexes, index_name, quoted, table_exists
+
+
+def attach_staging_name(table_name: str) -> str:
+    return f"{table_name}__attach"
+
+
+def month_bounds(year: int, month: int) -> tuple[str, str]:
+    start = f"{year:04d}-{month:02d}-01"
+    end = f"{year + 1:04d}-01-01" if month == 12 else f"{year:04d}-{month + 1:02d}-01"
+    return start, end
+
+
+def column_types(conn, schema: str, table: str) -> dict:
+    rows = conn.execute(
+        text(
+            "SELECT column_name, data_type FROM information_schema.columns "
+            "WHERE table_schema = :schema AND table_name = :table"
+        ),
+        {"schema": schema, "table": table},
+    )
+    return dict(rows.all())
+
+
+def ensure_parent(conn, schema: str, parent: str, like: str, column: str, index_columns: list[str]) -> None:
+    """
+    Create the partitioned parent with the columns of `like`, plus one
+    partitioned index per index column. If the parent exists, `like` must have
+    the same columns and types (e.g. both loaded with or without --compact-dtypes).
+    """
+    if table_exists(conn, schema, parent):
+        expected, actual = column_types(conn, schema, parent), column_types(conn, schema, like)
+        if expected != actual:
+            diff = sorted(c for c in expected.keys() | actual.keys() if expected.get(c) != actual.get(c))
+            raise ValueError(
+                f"{schema}.{like} does not match the columns of {schema}.{parent}: "
+                + ", ".join(f"{c} ({actual.get(c, 'missing')} vs {expected.get(c, 'missing')})" for c in diff)
+            )
+        return
+    conn.execute(
+        text(
+            f"CREATE TABLE {quoted(schema, parent)} (LIKE {quoted(schema, like)} INCLUDING DEFAULTS) "
+            f'PARTITION BY RANGE ("{column}")'
+        )
+    )
+    for col in index_columns:
+        # Instant on an empty parent; matching partition indexes are attached, not rebuilt
+        conn.execute(text(f'CREATE INDEX {index_name(parent, col)} ON {quoted(schema, parent)} ("{col}")'))
+    print(f"Created partitioned table {schema}.{parent} (range on {column})")
+
+
+def attach_month(
+    engine,
+    schema: str,
+    parent: str,
+    staging: str,
+    target: str,
+    column: str,
+    year: int,
+    month: int,
+    index_columns: list[str],
+    index_workers: int,
+) -> None:
+    t0 = time.perf_counter()
+    start, end = month_bounds(year, month)
+    constraint = f"{target}_month_range"
+    in_range = f"\"{column}\" >= '{start}' AND \"{column}\" < '{end}'"
+
+    with engine.begin() as conn:
+        stray = conn.execute(
+            text(f'DELETE FROM {quoted(schema, staging)} WHERE "{column}" IS NULL OR NOT ({in_range})')
+        ).rowcount
+        conn.execute(text(f'ALTER TABLE {quoted(schema, staging)} ADD CONSTRAINT "{constraint}" CHECK ({in_range})'))
+        missing = [
+            col for col in index_columns
+            if not conn.execute(
+                text("SELECT to_regclass(:name) IS NOT NULL"), {"name": f"{schema}.{index_name(staging, col)}"}
+            ).scalar()
+        ]
+        conn.execute(text(f"ANALYZE {quoted(schema, staging)}"))
+    if stray:
+        print(f"Dropped {stray} row(s) with {column} outside {start} .. {end} from {target}")
+    if missing:
+        build_indexes(engine, schema, staging, missing, index_workers)
+
+    with engine.begin() as conn:
+        # Serializes workers of a backfill that attach to the same parent
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": quoted(schema, parent)})
+        ensure_parent(conn, schema, parent, staging, column, index_columns)
+        conn.execute(text(f"DROP TABLE IF EXISTS {quoted(schema, target)}"))
+        conn.execute(text(f'ALTER TABLE {quoted(schema, staging)} RENAME TO "{target}"'))
+        for col in index_columns:
+            conn.execute(text(f"ALTER INDEX {schema}.{index_name(staging, col)} RENAME TO {index_name(target, col)}"))
+        conn.execute(
+            text(
+                f"ALTER TABLE {quoted(schema, parent)} ATTACH PARTITION {quoted(schema, target)} "
+                f"FOR VALUES FROM ('{start}') TO ('{end}')"
+            )
+        )
+        conn.execute(text(f'ALTER TABLE {quoted(schema, target)} DROP CONSTRAINT "{constraint}"'))
+    print(f"Attached {schema}.{target} to {schema}.{parent} in {time.perf_counter() - t0:.1f}s")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Reader -> serializer -> loader pipeline used by ingest_data --pipelined.
+
+The reader and serializer run in background threads; the loader is whoever
+iterates over `pipelined()` (the thread that owns the DB connection).
+A semaphore caps the number of chunks alive anywhere in the pipeline, so
+memory stays at roughly `max_inflight` chunks no matter which stage is slow.
+"""
+
+import queue
+import threading
+import time
+
+_DONE = object()
+
+
+class StageStats:
+    """Busy/idle wall-clock seconds for one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.busy = 0.0
+        self.idle = 0.0
+        self.items = 0
+
+    def utilization(self) -> float:
+        total = self.busy + self.idle
+        return self.busy / total if total else 0.0
+
+
+def format_stage_report(stages: list[StageStats]) -> str:
+    lines = [f"{'stage':<10} {'chunks':>7} {'busy s':>8} {'idle s':>8} {'util':>6}"]
+    for s in stages:
+        lines.append(f"{s.name:<10} {s.items:>7} {s.busy:>8.2f} {s.idle:>8.2f} {s.utilization():>6.0%}")
+    bottleneck = max(stages, key=lambda s: s.busy)
+    lines.append(f"bottleneck: {bottleneck.name}")
+    return "\n".join(lines)
+
+
+def pipelined(source, serialize, max_inflight: int = 4, stats: dict | None = None):
+    """
+    Yield (chunk, payload) pairs where payload = serialize(chunk).
+
+    `source` is any iterator of chunks (e.g. the pandas TextFileReader).
+    Reading and serialization of the next chunks overlap with whatever the
+    caller does with the current one. A chunk's slot is released when the
+    caller asks for the next pair, i.e. after it has been loaded.
+
+    Pass a dict as `stats` to receive StageStats under "read", "serialize"
+    and "load".
+    """
+    if max_inflight < 1:
+        raise ValueError("max_inflight must be >= 1")
+
+    read_stats = StageStats("read")
+    ser_stats = StageStats("serialize")
+    load_stats = StageStats("load")
+    if stats is not None:
+        stats.update(read=read_stats, serialize=ser_stats, load=load_stats)
+
+    slots = threading.Semaphore(max_inflight)
+    stop = threading.Event()
+    parsed = queue.Queue()
+    serialized = queue.Queue()
+
+    def acquire_slot() -> bool:
+        while not stop.is_set():
+            if slots.acquire(timeout=0.1):
+                return True
+        return False
+
+    def reader():
+        it = iter(source)
+        try:
+            while True:
+                t0 = time.perf_counter()
+                if not acquire_slot():
+                    break
+                t1 = time.perf_counter()
+                try:
+                    chunk = next(it)
+                except StopIteration:
+                    slots.release()
+                    break
+                t2 = time.perf_counter()
+                read_stats.idle += t1 - t0
+                read_stats.busy += t2 - t1
+                read_stats.items += 1
+                parsed.put(chunk)
+        except BaseException as e:
+            parsed.put(e)
+            return
+        parsed.put(_DONE)
+
+    def serializer():
+        while True:
+            t0 = time.perf_counter()
+            item = parsed.get()
+            t1 = time.perf_counter()
+            ser_stats.idle += t1 - t0
+            if item is _DONE or isinstance(item, BaseException) or stop.is_set():
+                serialized.put(item)
+                return
+            try:
+                payload = serialize(item)
+            except BaseException as e:
+                serialized.put(e)
+                return
+            ser_stats.busy += time.perf_counter() - t1
+            ser_stats.items += 1
+            serialized.put((item, payload))
+
+    threads = [
+        threading.Thread(target=reader, name="ingest-reader", daemon=True),
+        threading.Thread(target=serializer, name="ingest-serializer", daemon=True),
+    ]
+    for t in threads:
+        t.start()
+
+    try:
+        while True:
+            t0 = time.perf_counter()
+            item = serialized.get()
+            t1 = time.perf_counter()
+            load_stats.idle += t1 - t0
+            if item is _DONE:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+            load_stats.busy += time.perf_counter() - t1
+            load_stats.items += 1
+            slots.release()
+    finally:
+        # The caller closes the source's handles once this returns, so wait for
+        # a reader still inside next(source). Neither thread blocks on a put
+        # (the queues are unbounded); both exit at their next check of `stop`.
+        stop.set()
+        for t in threads:
+            t.join()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Hourly per-zone rollups maintained by `ingest_data --rollups`.
+
+Every chunk is grouped by pickup hour x PULocationID as it streams through
+the load, in one vectorized groupby, into partial sums:
+
+    trip_count, total_amount, tip_amount, trip_distance
+
+The partials of a file are merged in memory and written once, when the file
+commits, as one binary COPY into a temporary table and one INSERT ... ON
+CONFLICT into `<target-table>_hourly_zone`. Rollup rows are keyed by the month table
+they came from (`source_table`), so the rollup always equals a GROUP BY over
+that table:
+
+    replace / fast load   the month's rollup rows are deleted and rewritten
+    append                the file's sums are added to the existing rows
+    dedupe                only rows that were actually inserted are counted;
+                          they are aggregated from the INSERT's RETURNING
+    resumed load          rows committed by an earlier run were never seen,
+                          so the month is re-aggregated from its table
+
+Rows with no pickup time or no PULocationID are not counted. NULL amounts
+count as 0.
+"""
+
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.types import BigInteger, DateTime, Float, Integer, Text
+
+from pg_binary_copy import BinaryCopyEncoder, copy_binary, is_arrow
+
+KEY_COLUMNS = ["pickup_hour", "PULocationID"]
+MEASURE_COLUMNS = ["total_amount", "tip_amount", "trip_distance"]
+
+# Wire types of the rollup table, for binary COPY
+ROLLUP_SQL_TYPES = {
+    "source_table": Text(),
+    "pickup_hour": DateTime(),
+    "PULocationID": Integer(),
+    "trip_count": BigInteger(),
+    **{c: Float() for c in MEASURE_COLUMNS},
+}
+
+# Partials are merged once they hold this many groups, to bound memory
+COMPACT_ROWS = 500_000
+
+
+def rollup_table_name(target_table: str) -> str:
+    return f"{target_table}_hourly_zone"
+
+
+def ensure_rollup_table(conn, schema: str, rollup_table: str) -> None:
+    conn.execute(
+        text(
+            f'CREATE TABLE IF NOT EXISTS {schema}."{rollup_table}" ('
+            "source_table TEXT NOT NULL, "
+            "pickup_hour TIMESTAMP NOT NULL, "
+            '"PULocationID" INTEGER NOT NULL, '
+            "trip_count BIGINT NOT NULL, "
+            "total_amount DOUBLE PRECISION NOT NULL, "
+            "tip_amount DOUBLE PRECISION NOT NULL, "
+            "trip_distance DOUBLE PRECISION NOT NULL, "
+            'PRIMARY KEY (source_table, pickup_hour, "PULocationID"))'
+        )
+    )
+
+
+def _aggregate_sql(pickup_column: str, source: str) -> str:
+    sums = ", ".join(f'COALESCE(SUM("{c}"), 0)' for c in MEASURE_COLUMNS)
+    return (
+        f'SELECT date_trunc(\'hour\', "{pickup_column}") AS pickup_hour, "PULocationID", COUNT(*), {sums} '
+        f"FROM {source} GROUP BY 1, 2"
+    )
+
+
+def rebuild_rollup(conn, schema: str, rollup_table: str, source_table: str, scan_table: str, pickup_column: str) -> None:
+    """Replace the rollup rows of `source_table` with a GROUP BY over `scan_table`."""
+    conn.execute(text(f'DELETE FROM {schema}."{rollup_table}" WHERE source_table = :t'), {"t": source_table})
+    grouped = _aggregate_sql(pickup_column, f'{schema}."{scan_table}"')
+    conn.execute(
+        text(
+            f'INSERT INTO {schema}."{rollup_table}" '
+            f'SELECT :t, g.* FROM ({grouped}) g WHERE g.pickup_hour IS NOT NULL AND g."PULocationID" IS NOT NULL'
+        ),
+        {"t": source_table},
+    )
+
+
+def _copy(conn, full_table_name: str, frame: pd.DataFrame) -> None:
+    payload = BinaryCopyEncoder(ROLLUP_SQL_TYPES).encode(frame)
+    copy_binary(conn, full_table_name, list(frame.columns), payload)
+
+
+class HourlyZoneRollup:
+    """Partial hourly x zone sums of one file, split into committed and pending chunks."""
+
+    def __init__(self, pickup_column: str):
+        self.pickup_column = pickup_column
+        self._committed = []
+        self._pending = []
+
+    def add(self, chunk) -> None:
+        """Group one chunk (pandas or Arrow) and keep its partial sums as pending."""
+        columns = [self.pickup_column, "PULocationID", *MEASURE_COLUMNS]
+        frame = chunk.select(columns).to_pandas() if is_arrow(chunk) else chunk[columns]
+        keys = [
+            frame[self.pickup_column].dt.floor("h").rename("pickup_hour"),
+            frame["PULocationID"].astype("Int64"),
+        ]
+        # groupby drops NULL keys; sum() skips NULL amounts
+        grouped = frame[MEASURE_COLUMNS].groupby(keys, sort=False)
+        partial = grouped.sum()
+        partial.insert(0, "trip_count", grouped.size())
+        self._append(partial)
+
+    def add_inserted(self, conn, insert_sql: str) -> int:
+        """
+        Run `insert_sql` (an INSERT without RETURNING) and add the rows it
+        inserted, aggregated in the database. Returns the number of rows inserted.
+        """
+        cols = ", ".join(f'"{c}"' for c in [self.pickup_column, "PULocationID", *MEASURE_COLUMNS])
+        grouped = _aggregate_sql(self.pickup_column, "ins")
+        rows = conn.execute(text(f"WITH ins AS ({insert_sql} RETURNING {cols}) {grouped}")).fetchall()
+        partial = pd.DataFrame(rows, columns=[*KEY_COLUMNS, "trip_count", *MEASURE_COLUMNS])
+        inserted = int(partial["trip_count"].sum())
+        partial = partial.dropna(subset=KEY_COLUMNS)
+        partial["pickup_hour"] = pd.to_datetime(partial["pickup_hour"])
+        partial["PULocationID"] = partial["PULocationID"].astype("Int64")
+        self._append(partial.set_index(KEY_COLUMNS))
+        return inserted
+
+    def _append(self, partial: pd.DataFrame) -> None:
+        self._pending.append(partial)
+        if sum(len(p) for p in self._pending) > COMPACT_ROWS:
+            self._pending = [self._merge(self._pending)]
+
+    @staticmethod
+    def _merge(partials: list[pd.DataFrame]) -> pd.DataFrame:
+        return pd.concat(partials).groupby(level=KEY_COLUMNS, sort=False).sum()
+
+    def commit(self) -> None:
+        """The pending chunks were committed with the table."""
+        self._committed.extend(self._pending)
+        self._pending = []
+
+    def rollback(self) -> None:
+        """The pending chunks were rolled back; forget them."""
+        self._pending = []
+
+    def totals(self) -> pd.DataFrame:
+        partials = self._committed + self._pending
+        if not partials:
+            return pd.DataFrame(columns=[*KEY_COLUMNS, "trip_count", *MEASURE_COLUMNS])
+        return self._merge(partials).reset_index()
+
+    def write(self, conn, schema: str, rollup_table: str, source_table: str, replace: bool) -> int:
+        """
+        Merge the file's sums into the rollup table with one COPY and one upsert.
+        With `replace`, the rows of `source_table` are deleted first and the
+        sums are COPYed straight in. Returns the number of rollup rows written.
+        """
+        target = f'{schema}."{rollup_table}"'
+        if replace:
+            conn.execute(text(f"DELETE FROM {target} WHERE source_table = :t"), {"t": source_table})
+        totals = self.totals()
+        if totals.empty:
+            return 0
+        totals.insert(0, "source_table", source_table)
+
+        if replace:
+            # Nothing left to conflict with
+            _copy(conn, target, totals)
+            return len(totals)
+
+        tmp = f"{rollup_table}__merge"
+        conn.execute(text(f'CREATE TEMP TABLE "{tmp}" (LIKE {target}) ON COMMIT DROP'))
+        _copy(conn, f'pg_temp."{tmp}"', totals)
+        added = ", ".join(f'{c} = {target}.{c} + EXCLUDED.{c}' for c in ["trip_count", *MEASURE_COLUMNS])
+        conn.execute(
+            text(
+                f'INSERT INTO {target} SELECT * FROM pg_temp."{tmp}" '
+                f'ON CONFLICT (source_table, pickup_hour, "PULocationID") DO UPDATE SET {added}'
+            )
+        )
+        conn.execute(text(f'DROP TABLE pg_temp."{tmp}"'))
+        return len(totals)
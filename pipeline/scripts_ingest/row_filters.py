@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Column projection and row filters for --columns / --where.
+
+A --where filter is a conjunction of simple comparisons:
+
+    fare_amount > 0 and payment_type in (1, 2) and store_and_fwd_flag is not null
+
+    operators   = != < <= > >=, in (...), not in (...), is null, is not null
+    values      numbers or 'quoted' strings; strings are cast to the column's
+                type, so times are written '2021-01-15' or '2021-01-15 08:30:00'
+
+As in SQL, a comparison with NULL is not true: a row with NULL in a compared
+column is dropped (unless the condition is `is null`). A parsed filter is
+applied to:
+
+    pandas chunks    one boolean mask, built column by column
+    Arrow chunks     a pyarrow.compute expression passed to Table.filter
+    Parquet files    row groups whose min/max statistics rule the filter out
+                     are skipped before they are read (row_group_matches)
+
+homework/hw1/scripts_ingest imports this module from here; its Docker image
+copies it in from the pipeline_scripts build context.
+"""
+
+import datetime
+import operator
+import re
+from typing import NamedTuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+_TOKEN = re.compile(
+    r"\s*(?:(?P<string>'(?:[^']|'')*')"
+    r"|(?P<number>[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?)"
+    r"|(?P<op><=|>=|!=|<>|==|=|<|>)"
+    r"|(?P<punct>[(),])"
+    r'|(?P<name>"[^"]+"|[A-Za-z_][A-Za-z0-9_]*))'
+)
+
+COMPARISONS = {
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+class Condition(NamedTuple):
+    column: str
+    op: str  # a COMPARISONS key, "in", "not in", "is null" or "is not null"
+    value: object = None  # a tuple for in / not in
+
+
+def parse_columns(value: str) -> list[str]:
+    """'a, b,c' -> ['a', 'b', 'c'], without duplicates."""
+    columns = [c.strip() for c in value.split(",") if c.strip()]
+    if not columns:
+        raise ValueError("no columns given")
+    return list(dict.fromkeys(columns))
+
+
+def _tokenize(text: str) -> list[tuple[str, object]]:
+    tokens = []
+    pos = 0
+    text = text.strip()
+    while pos < len(text):
+        m = _TOKEN.match(text, pos)
+        if not m or m.end() == pos:
+            raise ValueError(f"cannot parse filter at: {text[pos:]!r}")
+        kind = m.lastgroup
+        raw = m.group(kind)
+        if kind == "string":
+            tokens.append(("value", raw[1:-1].replace("''", "'")))
+        elif kind == "number":
+            tokens.append(("value", float(raw) if any(ch in raw for ch in ".eE") else int(raw)))
+        elif kind == "op":
+            tokens.append(("op", {"==": "=", "<>": "!="}.get(raw, raw)))
+        elif kind == "name" and raw.startswith('"'):
+            tokens.append(("name", raw[1:-1]))
+        elif kind == "name" and raw.lower() in ("and", "in", "not", "is", "null"):
+            tokens.append(("keyword", raw.lower()))
+        else:
+            tokens.append((kind, raw))
+        pos = m.end()
+    return tokens
+
+
+class RowFilter:
+    """A parsed --where filter."""
+
+    def __init__(self, conditions: list[Condition]):
+        self.conditions = list(conditions)
+
+    @classmethod
+    def parse(cls, text: str) -> "RowFilter":
+        tokens = _tokenize(text)
+        pos = 0
+
+        def take(kind=None, value=None):
+            nonlocal pos
+            if pos >= len(tokens):
+                raise ValueError(f"filter ends early: {text!r}")
+            token = tokens[pos]
+            if (kind and token[0] != kind) or (value is not None and token[1] != value):
+                expected = value or kind
+                raise ValueError(f"expected {expected} but got {token[1]!r} in filter {text!r}")
+            pos += 1
+            return token[1]
+
+        def peek(value) -> bool:
+            return pos < len(tokens) and tokens[pos][1] == value and tokens[pos][0] == "keyword"
+
+        conditions = []
+        while True:
+            column = take("name")
+            if peek("is"):
+                take("keyword", "is")
+                negated = peek("not")
+                if negated:
+                    take("keyword", "not")
+                take("keyword", "null")
+                conditions.append(Condition(column, "is not null" if negated else "is null"))
+            elif peek("in") or peek("not"):
+                negated = peek("not")
+                if negated:
+                    take("keyword", "not")
+                take("keyword", "in")
+                take("punct", "(")
+                values = [take("value")]
+                while tokens[pos:pos + 1] == [("punct", ",")]:
+                    take("punct", ",")
+                    values.append(take("value"))
+                take("punct", ")")
+                conditions.append(Condition(column, "not in" if negated else "in", tuple(values)))
+            else:
+                op = take("op")
+                conditions.append(Condition(column, op, take("value")))
+            if pos == len(tokens):
+                return cls(conditions)
+            take("keyword", "and")
+
+    @property
+    def columns(self) -> list[str]:
+        return list(dict.fromkeys(c.column for c in self.conditions))
+
+    def rename(self, names: dict) -> "RowFilter":
+        """The same filter with column names mapped through `names`."""
+        return RowFilter([c._replace(column=names.get(c.column, c.column)) for c in self.conditions])
+
+    def apply(self, chunk):
+        """The rows of a pandas or Arrow chunk that match."""
+        if isinstance(chunk, (pa.Table, pa.RecordBatch)):
+            return chunk.filter(self.expression(chunk.schema))
+        return chunk[self.mask(chunk)]
+
+    def mask(self, df: pd.DataFrame) -> pd.Series:
+        mask = pd.Series(True, index=df.index)
+        for cond in self.conditions:
+            values = df[cond.column]
+            if cond.op == "is null":
+                mask &= values.isna()
+                continue
+            if cond.op == "is not null":
+                mask &= values.notna()
+                continue
+            if cond.op in ("in", "not in"):
+                matched = values.isin([_pandas_value(values, v) for v in cond.value])
+                if cond.op == "not in":
+                    matched = ~matched
+            else:
+                matched = COMPARISONS[cond.op](values, _pandas_value(values, cond.value))
+            # NULLs never match, whatever the nullable dtype made of them
+            mask &= matched.fillna(False).astype(bool) & values.notna()
+        return mask
+
+    def expression(self, schema: pa.Schema) -> pc.Expression:
+        """The filter as a pyarrow.compute expression over `schema`."""
+        result = None
+        for cond in self.conditions:
+            field = pc.field(cond.column)
+            arrow_type = schema.field(cond.column).type
+            if cond.op == "is null":
+                expr = field.is_null()
+            elif cond.op == "is not null":
+                expr = field.is_valid()
+            elif cond.op in ("in", "not in"):
+                value_set = pa.array([_arrow_value(arrow_type, v) for v in cond.value])
+                expr = field.isin(value_set)
+                if cond.op == "not in":
+                    expr = ~expr & field.is_valid()
+            else:
+                expr = COMPARISONS[cond.op](field, _arrow_value(arrow_type, cond.value))
+            result = expr if result is None else result & expr
+        return result
+
+    def row_group_matches(self, row_group) -> bool:
+        """
+        False if the statistics of a Parquet row group (pyarrow RowGroupMetaData)
+        show that no row in it can match; True when they do not rule it out.
+        """
+        paths = {row_group.column(i).path_in_schema: i for i in range(row_group.num_columns)}
+        for cond in self.conditions:
+            if cond.column not in paths:
+                continue
+            stats = row_group.column(paths[cond.column]).statistics
+            if stats is None:
+                continue
+            if cond.op == "is null":
+                if stats.has_null_count and stats.null_count == 0:
+                    return False
+                continue
+            if stats.has_null_count and stats.null_count == row_group.num_rows:
+                # Only NULLs: nothing but `is null` can match
+                return False
+            if cond.op == "is not null" or not stats.has_min_max:
+                continue
+            try:
+                if not _range_may_match(cond, stats.min, stats.max):
+                    return False
+            except TypeError:
+                continue  # statistics of a type we cannot compare with
+        return True
+
+
+def _pandas_value(values: pd.Series, value):
+    if isinstance(value, str) and pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return pd.Timestamp(value)
+    return value
+
+
+def _arrow_value(arrow_type: pa.DataType, value):
+    if pa.types.is_dictionary(arrow_type):
+        arrow_type = arrow_type.value_type
+    if isinstance(value, str) and not pa.types.is_string(arrow_type) and not pa.types.is_large_string(arrow_type):
+        return pa.scalar(value).cast(arrow_type)
+    return pa.scalar(value)
+
+
+def _stat_value(bound, value):
+    if isinstance(bound, datetime.datetime) and isinstance(value, str):
+        return pd.Timestamp(value).to_pydatetime()
+    return value
+
+
+def _range_may_match(cond: Condition, lo, hi) -> bool:
+    if cond.op == "not in" or cond.op == "!=":
+        # Ruled out only when every row holds the excluded value
+        excluded = cond.value if cond.op == "not in" else (cond.value,)
+        return not (lo == hi and any(lo == _stat_value(lo, v) for v in excluded))
+    if cond.op == "in":
+        return any(lo <= _stat_value(lo, v) <= hi for v in cond.value)
+    value = _stat_value(lo, cond.value)
+    return {
+        "=": lo <= value <= hi,
+        "<": lo < value,
+        "<=": lo <= value,
+        ">": hi > value,
+        ">=": hi >= value,
+    }[cond.op]
+
+
+def select_columns(chunk, columns: list[str]):
+    """Keep `columns` of a pandas or Arrow chunk, in that order."""
+    if isinstance(chunk, (pa.Table, pa.RecordBatch)):
+        return chunk.select(columns)
+    return chunk[columns]
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+unique_row_id for ingest_data --dedupe, computed per chunk while streaming.
+
+The Kestra flows (workflow-orchestration/flows/04_postgres_taxi.yaml and
+05_postgres_taxi_scheduled.yaml) dedupe with a staging UPDATE:
+
+    md5(COALESCE(CAST(VendorID AS text), '') || COALESCE(CAST(<pickup> AS text), '') ||
+        COALESCE(CAST(<dropoff> AS text), '') || COALESCE(PULocationID, '') ||
+        COALESCE(DOLocationID, '') || COALESCE(CAST(fare_amount AS text), '') ||
+        COALESCE(CAST(trip_distance AS text), ''))
+
+Here every column is rendered to text the way Postgres casts it, using Arrow
+compute over the whole chunk. The concatenation is also done in Arrow. Only
+the md5 itself runs per row, through hashlib. Rendering rules:
+
+    integers     plain digits
+    timestamps   'YYYY-MM-DD HH:MM:SS' plus the fractional seconds, trailing
+                 zeros removed (none when they are all zero)
+    float8       shortest round-trip digits; exponent form ('1e+15', '1e-05')
+                 below 1e-4 or from 1e15 up, as in Postgres 12+
+    NULL         '' (the COALESCE)
+
+So the ids match the tables the flows built.
+"""
+
+import hashlib
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from pg_binary_copy import is_arrow
+
+ROW_ID_COLUMN = "unique_row_id"
+
+# Columns hashed into unique_row_id, in the order of the flows' md5(...)
+HASH_COLUMNS = {
+    "yellow": [
+        "VendorID", "tpep_pickup_datetime", "tpep_dropoff_datetime", "PULocationID", "DOLocationID",
+        "fare_amount", "trip_distance",
+    ],
+    "green": [
+        "VendorID", "lpep_pickup_datetime", "lpep_dropoff_datetime", "PULocationID", "DOLocationID",
+        "fare_amount", "trip_distance",
+    ],
+}
+
+
+def pg_float8_text(value: float) -> str:
+    """CAST(value AS text) for a float8, as Postgres 12+ prints it."""
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "Infinity" if value > 0 else "-Infinity"
+    sign, digits, exp = Decimal(repr(value)).normalize().as_tuple()
+    if not any(digits):
+        return "-0" if sign else "0"
+    exponent = len(digits) + exp - 1
+    minus = "-" if sign else ""
+    if -4 <= exponent < 15:
+        return minus + format(Decimal((0, digits, exp)), "f")
+    mantissa = str(digits[0]) + ("." + "".join(map(str, digits[1:])) if len(digits) > 1 else "")
+    return f"{minus}{mantissa}e{'-' if exponent < 0 else '+'}{abs(exponent):02d}"
+
+
+def _float_text(arr: pa.Array) -> pa.Array:
+    text = pc.cast(arr, pa.string())
+    # Arrow switches to exponent form at other magnitudes than Postgres; fix
+    # those (rare) values one by one
+    values = pc.fill_null(arr, 1.0).to_numpy(zero_copy_only=False)
+    odd = np.flatnonzero((np.abs(values) >= 1e6) | ((values != 0) & (np.abs(values) < 1e-3)) | ~np.isfinite(values))
+    if odd.size == 0:
+        return text
+    fixed = text.to_pylist()
+    for i in odd:
+        fixed[i] = pg_float8_text(float(values[i]))
+    return pa.array(fixed, pa.string())
+
+
+def pg_text(arr) -> pa.Array:
+    """Render an Arrow array the way CAST(... AS text) renders the column in Postgres."""
+    if isinstance(arr, pa.ChunkedArray):
+        arr = arr.combine_chunks()
+    if pa.types.is_dictionary(arr.type):
+        arr = arr.dictionary_decode()
+    if pa.types.is_timestamp(arr.type):
+        text = pc.cast(arr.cast(pa.timestamp("us", tz=arr.type.tz)), pa.string())
+        # '... HH:MM:SS.ffffff' always has 6 digits; Postgres drops trailing zeros
+        return pc.replace_substring_regex(text, r"\.?0+$", "")
+    if pa.types.is_floating(arr.type):
+        return _float_text(arr.cast(pa.float64()))
+    return pc.cast(arr, pa.string())
+
+
+def unique_row_ids(chunk, color: str) -> list[str]:
+    """md5 hex digest per row, identical to the flows' unique_row_id."""
+    parts = []
+    for col in HASH_COLUMNS[color]:
+        values = chunk[col] if is_arrow(chunk) else pa.array(chunk[col], from_pandas=True)
+        parts.append(pg_text(values))
+    joined = pc.binary_join_element_wise(*parts, "", null_handling="replace", null_replacement="")
+    md5 = hashlib.md5
+    return [md5(s.encode()).hexdigest() for s in joined.to_pylist()]
+
+
+def add_row_ids(chunk, color: str):
+    """Return the chunk with unique_row_id as its first column."""
+    ids = unique_row_ids(chunk, color)
+    if is_arrow(chunk):
+        return chunk.add_column(0, ROW_ID_COLUMN, pa.array(ids, pa.string()))
+    chunk.insert(0, ROW_ID_COLUMN, pd.array(ids, dtype="string"))
+    return chunk
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Pickup / dropoff zone names for `ingest_data --enrich-zones`.
+
+taxi_zone_lookup is read once per load into dense code arrays indexed by
+LocationID: borough_codes[id] and zone_codes[id] hold positions in the sorted
+borough and zone names (-1 for IDs not in the lookup). Enriching a chunk is
+then one NumPy take per location column. The codes and the name list become a
+pandas Categorical (or an Arrow DictionaryArray for --parser arrow chunks),
+so no strings are built per row and there is no merge. The columns are
+written as TEXT and match what a join with the taxi_zone_lookup table loaded
+by ingest_zones.py returns, NULL included for unknown IDs.
+
+    PULocationID -> pickup_borough, pickup_zone
+    DOLocationID -> dropoff_borough, dropoff_zone
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from sqlalchemy.types import Text
+
+from download_cache import DownloadCache
+from ingest_zones import PANDAS_DTYPE as ZONE_DTYPE, URL as ZONES_URL
+from pg_binary_copy import is_arrow
+
+# location column -> prefix of the columns added for it
+LOCATION_COLUMNS = {"PULocationID": "pickup", "DOLocationID": "dropoff"}
+# lookup column -> suffix of the added column
+NAME_COLUMNS = {"Borough": "borough", "Zone": "zone"}
+
+ZONE_SQL_TYPES = {
+    f"{prefix}_{suffix}": Text() for prefix in LOCATION_COLUMNS.values() for suffix in NAME_COLUMNS.values()
+}
+
+
+class ZoneLookup:
+    """Dense LocationID -> (borough, zone) code arrays, built once and shared by every chunk."""
+
+    def __init__(self, lookup: pd.DataFrame):
+        ids = lookup["LocationID"].to_numpy(dtype="int64", na_value=-1)
+        known = ids >= 0
+        size = int(ids.max()) + 1 if known.any() else 1
+
+        # name column -> (categories, codes indexed by LocationID)
+        self.tables = {}
+        for col in NAME_COLUMNS:
+            names = lookup[col].astype("string")
+            categories = pd.Index(sorted(names.dropna().unique()), dtype="string")
+            codes = np.full(size, -1, dtype=np.int16)
+            # NULL names get -1 from get_indexer, as does anything missing from the lookup
+            codes[ids[known]] = categories.get_indexer(names[known])
+            self.tables[col] = (categories, codes)
+        self.size = size
+
+    @classmethod
+    def load(cls, url: str = ZONES_URL, cache: DownloadCache | None = None) -> "ZoneLookup":
+        # Read the same way as ingest_zones.py, so 'N/A' names become NULL in both
+        source = cache.fetch(url) if cache and "://" in url else url
+        return cls(pd.read_csv(source, dtype=ZONE_DTYPE))
+
+    def _location_ids(self, values) -> np.ndarray:
+        if isinstance(values, (pa.ChunkedArray, pa.Array)):
+            ids = pc.fill_null(values.cast(pa.int64()), -1).to_numpy()
+        else:
+            ids = values.to_numpy(dtype="int64", na_value=-1)
+        # Out-of-range IDs (and NULLs) look up index 0, which no zone uses
+        return np.where((ids > 0) & (ids < self.size), ids, 0)
+
+    def enrich(self, chunk):
+        """Return the chunk with the pickup/dropoff borough and zone columns appended."""
+        for location_col, prefix in LOCATION_COLUMNS.items():
+            ids = self._location_ids(chunk[location_col])
+            for name_col, suffix in NAME_COLUMNS.items():
+                categories, table = self.tables[name_col]
+                codes = table.take(ids)
+                column = f"{prefix}_{suffix}"
+                if is_arrow(chunk):
+                    values = pa.DictionaryArray.from_arrays(
+                        pa.array(codes, pa.int16(), mask=codes < 0), pa.array(categories, pa.string())
+                    )
+                    chunk = chunk.append_column(column, values)
+                else:
+                    chunk[column] = pd.Categorical.from_codes(codes, dtype=pd.CategoricalDtype(categories))
+        return chunk
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The ingest modules import each other by plain name, as when ingest_data.py runs
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts_ingest"))
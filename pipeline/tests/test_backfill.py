@@ -0,0 +1,40 @@
+import functools
+import http.server
+import threading
+import urllib.request
+
+import click
+import pytest
+
+from ingest_data import run_backfill
+
+
+def fetch_month(base_url, url, table_name, year, month, metrics, progress):
+    """Month writer that only downloads the month from a local server and counts its lines."""
+    with urllib.request.urlopen(f"{base_url}/{year}-{month:02d}.csv", timeout=10) as resp:
+        return len(resp.read().splitlines())
+
+
+@pytest.fixture
+def server(tmp_path):
+    (tmp_path / "2021-01.csv").write_text("a\n1\n")
+    (tmp_path / "2021-02.csv").write_text("a\n1\n2\n")
+    handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=str(tmp_path))
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    thread.join()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_missing_month_reports_the_http_error(server, workers, capsys):
+    write = functools.partial(fetch_month, server)
+    months = [(2021, 1), (2021, 2), (2021, 3)]
+    with pytest.raises(click.ClickException, match="Failed months: 2021-03"):
+        run_backfill(write, "yellow", months, "yellow_taxi_data", "public", workers)
+    out = capsys.readouterr().out
+    assert "FAILED 2021-03: HTTPError: HTTP Error 404" in out
+    assert "Loaded yellow_taxi_data_2021_02: 3 rows" in out
+    assert "Months: 2/3. Rows: 5." in out
@@ -0,0 +1,87 @@
+import pyarrow as pa
+import pytest
+
+import chunk_sizing
+from chunk_sizing import AdaptiveChunkSizer, check_memory_budget, parse_size, rebatch
+
+GB = 1024**3
+
+
+@pytest.mark.parametrize(
+    "value, size",
+    [("512MB", 512 * 1024**2), ("2G", 2 * GB), ("1.5GiB", int(1.5 * GB)), ("4096", 4096), (" 64 kb ", 64 * 1024)],
+)
+def test_parse_size(value, size):
+    assert parse_size(value) == size
+
+
+@pytest.mark.parametrize("value", ["", "lots", "-1G", "2 PB"])
+def test_parse_size_rejects(value):
+    with pytest.raises(ValueError):
+        parse_size(value)
+
+
+@pytest.fixture
+def rss(monkeypatch):
+    """Pin the process RSS the sizer sees; set rss.value to change it."""
+
+    class Fake:
+        value = 100 * 1024**2
+
+    monkeypatch.setattr(chunk_sizing, "current_rss", lambda: Fake.value)
+    return Fake
+
+
+def test_budget_must_exceed_rss(rss):
+    with pytest.raises(ValueError, match="below"):
+        check_memory_budget(rss.value)
+    assert check_memory_budget(rss.value + 1) == rss.value
+
+
+def test_grows_while_copy_gets_faster_then_holds(rss):
+    sizer = AdaptiveChunkSizer(GB, initial_rows=10_000)
+    assert sizer.observe(10_000, 1_000_000, 500_000, seconds=1.0) == 20_000
+    assert sizer.observe(20_000, 2_000_000, 1_000_000, seconds=1.0) == 40_000
+    # Under 5% better: stop growing, keep the size
+    assert sizer.observe(40_000, 4_000_000, 2_000_000, seconds=1.95) == 40_000
+    assert sizer.observe(40_000, 4_000_000, 2_000_000, seconds=1.0) == 40_000
+
+
+def test_returns_to_the_best_size_when_copy_slows_down(rss):
+    sizer = AdaptiveChunkSizer(GB, initial_rows=10_000)
+    sizer.observe(10_000, 1_000_000, 0, seconds=1.0)  # 10k rows/s
+    sizer.observe(20_000, 2_000_000, 0, seconds=1.0)  # 20k rows/s, best
+    assert sizer.observe(40_000, 4_000_000, 0, seconds=4.0) == 20_000  # 10k rows/s
+
+
+def test_memory_caps_the_chunk(rss):
+    # 1000 bytes per row, safety factor 2, two chunks in flight
+    sizer = AdaptiveChunkSizer(GB, initial_rows=500_000, inflight=2)
+    size = sizer.observe(500_000, 400_000_000, 100_000_000, seconds=1.0)
+    assert size == (GB - rss.value) // (1000 * 2 * 2)
+
+
+def test_halves_near_the_budget(rss):
+    sizer = AdaptiveChunkSizer(GB, initial_rows=40_000)
+    rss.value = int(0.95 * GB)
+    assert sizer.observe(40_000, 40_000, 0, seconds=1.0) == 20_000
+    assert not sizer.growing
+
+
+def test_partial_chunks_do_not_steer(rss):
+    sizer = AdaptiveChunkSizer(GB, initial_rows=10_000)
+    assert sizer.observe(3_000, 300_000, 0, seconds=10.0) == 10_000
+    assert sizer.best is None
+
+
+def test_rebatch_follows_the_sizer(rss):
+    batches = [pa.record_batch({"x": list(range(i, i + 7))}) for i in range(0, 70, 7)]
+    sizer = AdaptiveChunkSizer(GB, initial_rows=10, min_rows=1)
+    sizes = []
+    for table in rebatch(iter(batches), 0, sizer):
+        sizes.append(table.num_rows)
+        sizer.chunk_size = 25 if len(sizes) == 1 else sizer.chunk_size
+    assert sizes == [10, 25, 25, 10]
+    tables = list(rebatch(iter(batches), 30))
+    assert [t.num_rows for t in tables] == [30, 30, 10]
+    assert pa.concat_tables(tables)["x"].to_pylist() == list(range(70))
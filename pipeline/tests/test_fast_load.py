@@ -0,0 +1,21 @@
+from fast_load import MAX_IDENTIFIER_BYTES, index_name, staging_table_name
+
+
+def test_short_names_are_unchanged():
+    assert index_name("yellow_taxi_data_2021_01", "PULocationID") == "idx_yellow_taxi_data_2021_01_pulocationid"
+
+
+def test_long_names_fit_and_stay_distinct():
+    table = staging_table_name("yellow_taxi_data_partitioned_backfill_2021_01")
+    names = {index_name(table, column) for column in ("tpep_pickup_datetime", "tpep_dropoff_datetime")}
+    assert len(names) == 2
+    assert all(len(name.encode()) <= MAX_IDENTIFIER_BYTES for name in names)
+    # Stable from run to run: the staging names are renamed to the target names by name
+    assert names == {index_name(table, column) for column in ("tpep_pickup_datetime", "tpep_dropoff_datetime")}
+
+
+def test_multibyte_names_are_cut_on_a_character_boundary():
+    name = index_name("taxi_données_" + "é" * 40, "zone")
+    assert len(name.encode()) <= MAX_IDENTIFIER_BYTES
+    assert name.startswith("idx_taxi_données_éé")
+    assert name[-9] == "_" and name[-10] == "é"
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+from click.testing import CliRunner
+from sqlalchemy import create_engine, text
+
+import ingest_data
+from generate_trips import write_trips
+
+pytestmark = pytest.mark.skipif(
+    not os.environ.get("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL (a Postgres URL) is not set"
+)
+
+
+@pytest.fixture
+def load(tmp_path, monkeypatch):
+    """Run ingest_data on 200 synthetic trips against TEST_DATABASE_URL; drops the tables it names."""
+    source = str(tmp_path / "trips.csv.gz")
+    write_trips(source, "yellow", 200, 2021, 1)
+    url = os.environ["TEST_DATABASE_URL"]
+    monkeypatch.setattr(ingest_data, "create_engine", lambda *args, **kwargs: create_engine(url))
+    tables = set()
+
+    def run(target_table: str, *args: str):
+        tables.add(target_table)
+        return CliRunner().invoke(ingest_data.run, ["--source", source, "--target-table", target_table, *args])
+
+    yield run
+    with create_engine(url).begin() as conn:
+        for table in tables:
+            conn.execute(text(f'DROP TABLE IF EXISTS "{table}_2021_01", "{table}" CASCADE'))
+
+
+@pytest.mark.parametrize("extra", [[], ["--fast-load"]])
+def test_existing_table_is_a_usage_error(load, extra):
+    assert load("if_exists_fail").exit_code == 0
+    result = load("if_exists_fail", "--if-exists", "fail", *extra)
+    assert result.exit_code == 1
+    assert isinstance(result.exception, SystemExit)
+    assert "already exists" in result.output
+
+
+def test_existing_partition_is_a_usage_error(load):
+    assert load("if_exists_fail_parent", "--partitioned").exit_code == 0
+    result = load("if_exists_fail_parent", "--partitioned", "--if-exists", "fail")
+    assert result.exit_code == 1
+    assert isinstance(result.exception, SystemExit)
+    assert "Partition public.if_exists_fail_parent_2021_01 already exists" in result.output
@@ -0,0 +1,96 @@
+import threading
+
+import pytest
+
+from parallel_copy import copy_parallel
+
+
+class FakeEngine:
+    """Hands out connections that record what they wrote and how their transaction ended."""
+
+    def __init__(self):
+        self.connections = []
+        self._lock = threading.Lock()
+
+    def connect(self):
+        conn = FakeConnection()
+        with self._lock:
+            self.connections.append(conn)
+        return conn
+
+    def outcomes(self) -> list[str]:
+        return sorted(conn.outcome for conn in self.connections)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.rows = []
+        self.outcome = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # Like SQLAlchemy, closing a connection rolls back a transaction still open
+        if self.outcome is None:
+            self.outcome = "rollback"
+        return False
+
+    def begin(self):
+        return self
+
+    def commit(self):
+        self.outcome = "commit"
+
+    def rollback(self):
+        self.outcome = "rollback"
+
+
+def write(conn, chunk):
+    if chunk == "bad":
+        raise RuntimeError("COPY failed")
+    conn.rows.append(chunk)
+
+
+def test_commits_every_worker_when_all_chunks_load():
+    engine = FakeEngine()
+    written = copy_parallel(engine, iter(range(50)), write, workers=4)
+    assert sum(written) == 50
+    assert engine.outcomes() == ["commit"] * 4
+    assert sorted(row for conn in engine.connections for row in conn.rows) == list(range(50))
+
+
+def test_write_error_rolls_back_every_worker():
+    engine = FakeEngine()
+    chunks = [*range(20), "bad", *range(20, 200)]
+    with pytest.raises(RuntimeError, match="COPY failed"):
+        copy_parallel(engine, iter(chunks), write, workers=3, max_queued=1)
+    assert engine.outcomes() == ["rollback"] * 3
+
+
+def test_first_write_error_is_raised():
+    engine = FakeEngine()
+    errors = iter([ValueError("first"), KeyError("second")])
+
+    def failing(conn, chunk):
+        raise next(errors)
+
+    with pytest.raises(ValueError, match="first"):
+        copy_parallel(engine, iter(range(10)), failing, workers=1)
+
+
+def test_reader_error_rolls_back_every_worker():
+    engine = FakeEngine()
+
+    def chunks():
+        yield from range(10)
+        raise OSError("truncated file")
+
+    with pytest.raises(OSError, match="truncated"):
+        copy_parallel(engine, chunks(), write, workers=3)
+    assert engine.outcomes() == ["rollback"] * 3
+
+
+def test_workers_must_be_positive():
+    with pytest.raises(ValueError):
+        copy_parallel(FakeEngine(), iter([]), write, workers=0)
@@ -0,0 +1,106 @@
+import datetime
+import struct
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+from sqlalchemy.types import BigInteger, Integer, SmallInteger, Text
+
+from pg_binary_copy import HEADER, PG_EPOCH_US, BinaryCopyEncoder
+
+PG_EPOCH = datetime.datetime(2000, 1, 1)
+_FIXED = {"int2": ">h", "int4": ">i", "int8": ">q", "float8": ">d", "bool": ">?", "timestamp": ">q"}
+
+
+def decode(payload: memoryview, wires: list[str]) -> list[tuple]:
+    """Parse a binary COPY payload back into rows, the way Postgres reads it."""
+    data = bytes(payload)
+    assert data[: len(HEADER)] == HEADER
+    pos = len(HEADER)
+    rows = []
+    while True:
+        (nfields,) = struct.unpack_from(">h", data, pos)
+        pos += 2
+        if nfields == -1:
+            assert pos == len(data)
+            return rows
+        assert nfields == len(wires)
+        row = []
+        for wire in wires:
+            (length,) = struct.unpack_from(">i", data, pos)
+            pos += 4
+            if length == -1:
+                row.append(None)
+                continue
+            raw = data[pos : pos + length]
+            pos += length
+            if wire == "text":
+                row.append(raw.decode("utf-8"))
+                continue
+            assert length == struct.calcsize(_FIXED[wire])
+            (value,) = struct.unpack(_FIXED[wire], raw)
+            if wire == "timestamp":
+                value = PG_EPOCH + datetime.timedelta(microseconds=value)
+            row.append(value)
+        rows.append(tuple(row))
+
+
+def sample_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "VendorID": pd.array([1, None, 2], dtype="Int64"),
+            "pickup": pd.to_datetime(["2021-01-01 00:30:10", None, "1999-12-31 23:59:59.000001"], format="ISO8601"),
+            "fare": [8.0, np.nan, -0.5],
+            "flag": ["N", None, "Ünïcode ✓"],
+            "paid": [True, False, True],
+        }
+    )
+
+
+EXPECTED = [
+    (1, datetime.datetime(2021, 1, 1, 0, 30, 10), 8.0, "N", True),
+    (None, None, None, None, False),
+    (2, datetime.datetime(1999, 12, 31, 23, 59, 59, 1), -0.5, "Ünïcode ✓", True),
+]
+WIRES = ["int8", "timestamp", "float8", "text", "bool"]
+
+
+def test_pandas_round_trip():
+    assert decode(BinaryCopyEncoder().encode(sample_frame()), WIRES) == EXPECTED
+
+
+def test_arrow_round_trip_matches_pandas():
+    table = pa.Table.from_pandas(sample_frame(), preserve_index=False)
+    assert decode(BinaryCopyEncoder().encode(table), WIRES) == EXPECTED
+
+
+def test_timestamps_count_from_the_postgres_epoch():
+    df = pd.DataFrame({"t": pd.to_datetime(["2000-01-01"])})
+    payload = bytes(BinaryCopyEncoder().encode(df))
+    assert struct.unpack_from(">q", payload, len(HEADER) + 2 + 4) == (0,)
+    assert PG_EPOCH_US == int(PG_EPOCH.replace(tzinfo=datetime.timezone.utc).timestamp()) * 1_000_000
+
+
+def test_sql_types_set_the_integer_width():
+    df = pd.DataFrame({"a": [1, -2], "b": [3, 4], "c": [5, 6], "d": [7, 8]})
+    sql_types = {"a": SmallInteger(), "b": Integer(), "c": BigInteger(), "d": Text()}
+    rows = decode(BinaryCopyEncoder(sql_types).encode(df), ["int2", "int4", "int8", "text"])
+    assert rows == [(1, 3, 5, "7"), (-2, 4, 6, "8")]
+
+
+def test_unsupported_sql_type_is_rejected():
+    with pytest.raises(TypeError):
+        BinaryCopyEncoder({"a": object()}).encode(pd.DataFrame({"a": [1]}))
+
+
+def test_buffer_is_reused_across_chunks():
+    encoder = BinaryCopyEncoder()
+    encoder.encode(pd.DataFrame({"s": ["x" * 1000] * 100}))
+    small = pd.DataFrame({"s": ["a", None]})
+    assert decode(encoder.encode(small), ["text"]) == [("a",), (None,)]
+
+
+def test_empty_chunk_is_header_and_trailer():
+    df = pd.DataFrame({"a": pd.Series([], dtype="int64")})
+    assert decode(BinaryCopyEncoder().encode(df), ["int8"]) == []
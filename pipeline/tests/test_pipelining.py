@@ -0,0 +1,50 @@
+import threading
+import time
+
+import pytest
+
+from pipelining import pipelined
+
+
+def test_pairs_every_chunk_with_its_payload_in_order():
+    stats = {}
+    pairs = list(pipelined(iter(range(20)), lambda chunk: chunk * 10, max_inflight=3, stats=stats))
+    assert pairs == [(i, i * 10) for i in range(20)]
+    assert [stats[name].items for name in ("read", "serialize", "load")] == [20, 20, 20]
+
+
+@pytest.mark.parametrize("stage", ["read", "serialize"])
+def test_errors_reach_the_caller(stage):
+    def source():
+        yield 1
+        if stage == "read":
+            raise OSError("truncated")
+        yield 2
+
+    def serialize(chunk):
+        if chunk == 2:
+            raise OSError("truncated")
+        return chunk
+
+    with pytest.raises(OSError, match="truncated"):
+        list(pipelined(source(), serialize))
+
+
+def test_close_waits_for_a_read_in_progress():
+    reading = threading.Event()
+    finished = []
+
+    def source():
+        yield 0
+        reading.set()
+        time.sleep(0.5)
+        finished.append(True)
+        yield 1
+
+    chunks = pipelined(source(), lambda chunk: chunk, max_inflight=2)
+    assert next(chunks) == (0, 0)
+    assert reading.wait(5)
+    chunks.close()
+    # The source is done with by the time close() returns, so its handles can be closed
+    assert finished == [True]
+    assert not any(t.name in ("ingest-reader", "ingest-serializer") for t in threading.enumerate())
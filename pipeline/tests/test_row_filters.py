@@ -0,0 +1,112 @@
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from row_filters import Condition, RowFilter, parse_columns, select_columns
+
+
+def test_parse_conjunction():
+    f = RowFilter.parse("fare_amount > 0 and payment_type in (1, 2) AND store_and_fwd_flag is not null")
+    assert f.conditions == [
+        Condition("fare_amount", ">", 0),
+        Condition("payment_type", "in", (1, 2)),
+        Condition("store_and_fwd_flag", "is not null"),
+    ]
+    assert f.columns == ["fare_amount", "payment_type", "store_and_fwd_flag"]
+
+
+@pytest.mark.parametrize(
+    "text, condition",
+    [
+        ("a = 1.5", Condition("a", "=", 1.5)),
+        ("a == -2", Condition("a", "=", -2)),
+        ("a <> 1e3", Condition("a", "!=", 1000.0)),
+        ("a <= 'x''y'", Condition("a", "<=", "x'y")),
+        ('"Weird Name" >= 3', Condition("Weird Name", ">=", 3)),
+        ("a not in ('N', 'Y')", Condition("a", "not in", ("N", "Y"))),
+        ("a is null", Condition("a", "is null")),
+    ],
+)
+def test_parse_one_condition(text, condition):
+    assert RowFilter.parse(text).conditions == [condition]
+
+
+@pytest.mark.parametrize(
+    "text, message",
+    [
+        ("fare_amount >", "filter ends early"),
+        ("fare_amount 1", "expected op"),
+        ("a = 1 or b = 2", "expected and"),
+        ("a in (1, 2", "filter ends early"),
+        ("a = 1 ;", "cannot parse filter"),
+    ],
+)
+def test_parse_errors(text, message):
+    with pytest.raises(ValueError, match=message):
+        RowFilter.parse(text)
+
+
+def test_parse_columns():
+    assert parse_columns(" a, b,,a ,c ") == ["a", "b", "c"]
+    with pytest.raises(ValueError):
+        parse_columns(" , ")
+
+
+def trips() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "fare": [5.0, None, 12.5, 0.0, 20.0],
+            "kind": ["N", "Y", None, "N", "Y"],
+            "pickup": pd.to_datetime(["2021-01-01", "2021-01-10", "2021-01-15 08:30:00", None, "2021-02-01"], format="ISO8601"),
+        }
+    )
+
+
+@pytest.mark.parametrize(
+    "text, rows",
+    [
+        ("fare > 4", [0, 2, 4]),
+        # NULLs never satisfy a comparison, including !=
+        ("fare != 5", [2, 3, 4]),
+        ("kind not in ('Y')", [0, 3]),
+        ("kind is null", [2]),
+        ("pickup >= '2021-01-10' and pickup < '2021-02-01'", [1, 2]),
+        ("fare >= 0 and kind = 'N'", [0, 3]),
+    ],
+)
+def test_pandas_and_arrow_select_the_same_rows(text, rows):
+    f = RowFilter.parse(text)
+    df = trips()
+    assert f.apply(df).index.tolist() == rows
+    table = pa.Table.from_pandas(df, preserve_index=False).append_column("row", pa.array(range(len(df))))
+    assert f.apply(table)["row"].to_pylist() == rows
+
+
+def test_rename_maps_columns():
+    f = RowFilter.parse("a > 1 and b is null").rename({"a": "A"})
+    assert f.columns == ["A", "b"]
+
+
+def test_row_group_matches_uses_statistics(tmp_path):
+    path = tmp_path / "trips.parquet"
+    table = pa.table({"fare": [1.0, 2.0, 3.0, 10.0, 11.0, 12.0], "kind": ["N", "N", "N", None, None, None]})
+    pq.write_table(table, path, row_group_size=3)
+    meta = pq.ParquetFile(path).metadata
+    groups = [meta.row_group(i) for i in range(meta.num_row_groups)]
+
+    def matches(text):
+        return [RowFilter.parse(text).row_group_matches(g) for g in groups]
+
+    assert matches("fare > 5") == [False, True]
+    assert matches("fare in (2, 20)") == [True, False]
+    assert matches("kind != 'N'") == [False, False]
+    assert matches("kind is null") == [False, True]
+    assert matches("missing_column = 1") == [True, True]
+
+
+def test_select_columns_keeps_order():
+    df = trips()
+    assert list(select_columns(df, ["pickup", "fare"]).columns) == ["pickup", "fare"]
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    assert select_columns(table, ["kind", "fare"]).column_names == ["kind", "fare"]
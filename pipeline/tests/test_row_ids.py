@@ -0,0 +1,115 @@
+import hashlib
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from row_ids import ROW_ID_COLUMN, add_row_ids, pg_float8_text, unique_row_ids
+
+
+@pytest.mark.parametrize(
+    "value, text",
+    [
+        (8.0, "8"),
+        (2.1, "2.1"),
+        (-0.5, "-0.5"),
+        (0.0, "0"),
+        (-0.0, "-0"),
+        (0.0001, "0.0001"),
+        (0.00001, "1e-05"),
+        (123456789012345.0, "123456789012345"),
+        (1e15, "1e+15"),
+        (1.5e-07, "1.5e-07"),
+        (0.1 + 0.2, "0.30000000000000004"),
+        (float("nan"), "NaN"),
+        (float("inf"), "Infinity"),
+        (float("-inf"), "-Infinity"),
+    ],
+)
+def test_pg_float8_text(value, text):
+    assert pg_float8_text(value) == text
+
+
+def yellow_frame() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "VendorID": pd.array([1, None, 2], dtype="Int64"),
+            "tpep_pickup_datetime": pd.to_datetime(
+                ["2021-01-01 00:30:10", "2021-01-01 00:00:00.5", None], format="ISO8601"
+            ),
+            "tpep_dropoff_datetime": pd.to_datetime(
+                ["2021-01-01 00:36:12", "2021-01-01 00:10:00.123456", "2021-01-02"], format="ISO8601"
+            ),
+            "PULocationID": [142, 1, 264],
+            "DOLocationID": [43, 2, 265],
+            "fare_amount": [8.0, 0.00001, None],
+            "trip_distance": [2.1, 1e15, 0.0],
+        }
+    )
+
+
+# The text each row concatenates in the flows' md5(COALESCE(CAST(... AS text), '') || ...)
+FLOW_TEXT = [
+    "1" "2021-01-01 00:30:10" "2021-01-01 00:36:12" "142" "43" "8" "2.1",
+    "" "2021-01-01 00:00:00.5" "2021-01-01 00:10:00.123456" "1" "2" "1e-05" "1e+15",
+    "2" "" "2021-01-02 00:00:00" "264" "265" "" "0",
+]
+
+
+def test_ids_hash_the_flows_text():
+    expected = [hashlib.md5(text.encode()).hexdigest() for text in FLOW_TEXT]
+    assert unique_row_ids(yellow_frame(), "yellow") == expected
+
+
+def test_arrow_chunks_get_the_same_ids():
+    table = pa.Table.from_pandas(yellow_frame(), preserve_index=False)
+    assert unique_row_ids(table, "yellow") == unique_row_ids(yellow_frame(), "yellow")
+
+
+def test_green_uses_lpep_columns():
+    green = yellow_frame().rename(columns=lambda c: c.replace("tpep_", "lpep_"))
+    assert unique_row_ids(green, "green") == unique_row_ids(yellow_frame(), "yellow")
+
+
+def test_add_row_ids_puts_the_id_first():
+    df = add_row_ids(yellow_frame(), "yellow")
+    table = add_row_ids(pa.Table.from_pandas(yellow_frame(), preserve_index=False), "yellow")
+    assert list(df.columns)[0] == ROW_ID_COLUMN
+    assert table.column_names[0] == ROW_ID_COLUMN
+    assert df[ROW_ID_COLUMN].tolist() == table[ROW_ID_COLUMN].to_pylist()
+
+
+@pytest.mark.skipif(not os.environ.get("TEST_DATABASE_URL"), reason="TEST_DATABASE_URL (a Postgres URL) is not set")
+def test_ids_match_the_flows_update_in_postgres():
+    from sqlalchemy import create_engine, text
+
+    engine = create_engine(os.environ["TEST_DATABASE_URL"])
+    df = yellow_frame()
+    # Staging table of 04_postgres_taxi.yaml: the location ids are text there
+    df = df.astype({"PULocationID": "string", "DOLocationID": "string"})
+    try:
+        with engine.begin() as conn:
+            df.to_sql("row_ids_parity", conn, if_exists="replace", index=False)
+            conn.execute(text("ALTER TABLE row_ids_parity ADD COLUMN unique_row_id text"))
+            conn.execute(
+                text(
+                    """
+                    UPDATE row_ids_parity SET unique_row_id = md5(
+                        COALESCE(CAST("VendorID" AS text), '') ||
+                        COALESCE(CAST(tpep_pickup_datetime AS text), '') ||
+                        COALESCE(CAST(tpep_dropoff_datetime AS text), '') ||
+                        COALESCE("PULocationID", '') ||
+                        COALESCE("DOLocationID", '') ||
+                        COALESCE(CAST(fare_amount AS text), '') ||
+                        COALESCE(CAST(trip_distance AS text), ''))
+                    """
+                )
+            )
+            query = text('SELECT unique_row_id FROM row_ids_parity ORDER BY "PULocationID"')
+            from_postgres = conn.execute(query).scalars().all()
+            conn.execute(text("DROP TABLE row_ids_parity"))
+    finally:
+        engine.dispose()
+    by_location = sorted(zip(yellow_frame()["PULocationID"].astype(str), unique_row_ids(yellow_frame(), "yellow")))
+    assert from_postgres == [row_id for _, row_id in by_location]